@@ -24,6 +24,24 @@ class InterpreterConfig(BaseConfig):
         default=SI("${solver.execution_timeout}"),
         metadata={"help": "Timeout for the interpreter."},
     )
+    data_cache_dir: str | None = field(
+        default=None,
+        metadata={
+            "help": "Node-local directory (e.g. local SSD or tmpfs) where the task data is staged once and shared "
+            "read-only by all the runs on the host. None disables the cache.",
+            "exclude_from_hash": True,
+        },
+    )
+    data_cache_max_size_mb: int = field(
+        default=200_000,
+        metadata={
+            "help": "Size limit of the data cache, in MB. Least recently used datasets that are not in use are "
+            "evicted beyond it.",
+            "exclude_from_hash": True,
+        },
+    )
 
     def validate(self) -> None:
         super().validate()
+        if self.data_cache_max_size_mb <= 0:
+            raise ValueError(f"data_cache_max_size_mb must be positive, got {self.data_cache_max_size_mb}")
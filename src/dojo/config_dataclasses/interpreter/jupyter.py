@@ -11,6 +11,8 @@ from omegaconf import SI
 from dojo.config_dataclasses.interpreter.base import InterpreterConfig
 from dojo.utils.environment import get_superimage_dir
 
+JUPYTER_SERVERS = ("apptainer", "local")
+
 
 @dataclass
 class JupyterInterpreterConfig(InterpreterConfig):
@@ -44,6 +46,100 @@ class JupyterInterpreterConfig(InterpreterConfig):
             "help": "Environment variables to set in the container. Example: {'HF_HUB_OFFLINE': '1', 'NLTK_DATA': '/root/.nltk_data'}"
         },
     )
+    server: str = field(
+        default="apptainer",
+        metadata={
+            "help": f"Where the kernel gateway runs, one of {JUPYTER_SERVERS}. 'local' runs it directly on the host, "
+            "in the current Python environment and without isolation: meant for tests and benchmarks.",
+            "exclude_from_hash": True,
+        },
+    )
+    reuse_gateway: bool = field(
+        default=True,
+        metadata={
+            "help": "Keep a single container and kernel gateway for the whole run and only replace the kernel when "
+            "the session is reset. If False, the container is torn down and booted again at every step."
+        },
+    )
+    spare_kernel: bool = field(
+        default=True,
+        metadata={"help": "Start the next kernel in the background, so that session resets do not wait for it."},
+    )
+    warmup_packages: list[str] = field(
+        default_factory=list,
+        metadata={
+            "help": "Packages imported in every new kernel before it is handed out (e.g. ['torch', 'timm', 'lightgbm']). "
+            "With `spare_kernel`, the warm-up of the next kernel runs in the background, during LLM generation."
+        },
+    )
+    warmup_cuda: bool = field(
+        default=False,
+        metadata={"help": "Also initialize the CUDA context of every visible GPU (through torch) during the warm-up."},
+    )
+    warmup_timeout: int = field(
+        default=600,
+        metadata={"help": "Maximum time of the kernel warm-up, in seconds."},
+    )
+    mount_working_dir: bool = field(
+        default=False,
+        metadata={
+            "help": "Bind the working dir read-write into the container (with the data inside it) and run the kernel "
+            "there, so that the host can read and delete the files written by the code without kernel round-trips."
+        },
+    )
+    memory_limit_mb: int | None = field(
+        default=None,
+        metadata={
+            "help": "Address-space limit (RLIMIT_AS) of every kernel (and of the processes it starts), in MB. "
+            "None disables it.",
+        },
+    )
+    cpu_affinity: list[int] | None = field(
+        default=None,
+        metadata={"help": "CPU ids every kernel is pinned to. None disables pinning."},
+    )
+    shared_gateway: bool = field(
+        default=False,
+        metadata={
+            "help": "Share a single container and kernel gateway between the runs of the host that use the same "
+            "workspace root, superimage, overlays, binds and env. Every run gets its own kernels, working in its own "
+            "directory.",
+            "exclude_from_hash": True,
+        },
+    )
+    shared_gateway_dir: str = field(
+        default="/tmp/dojo-jupyter-gateways",
+        metadata={
+            "help": "Host-local directory with the lock files, registries and logs of the shared gateways.",
+            "exclude_from_hash": True,
+        },
+    )
+    shared_workspace_root: str | None = field(
+        default=None,
+        metadata={
+            "help": "Directory bound read-write into the shared gateway, under which the working dirs of the runs "
+            "sharing it must live. The code of any of these runs can read and write the working dirs of the others, "
+            "so it must only hold runs that may see each other. Defaults to the working dir of the run, which then "
+            "only shares its gateway with its own interpreters.",
+            "exclude_from_hash": True,
+        },
+    )
+    shared_data_root: str | None = field(
+        default=None,
+        metadata={
+            "help": "Directory bound read-only into the shared gateway. The data dirs of all the runs must be inside "
+            "of it. Defaults to `data_cache_dir`.",
+            "exclude_from_hash": True,
+        },
+    )
 
     def validate(self) -> None:
         super().validate()
+        if self.server not in JUPYTER_SERVERS:
+            raise ValueError(f"Unknown Jupyter server {self.server}, expected one of {JUPYTER_SERVERS}")
+        if self.server == "local" and self.shared_gateway:
+            raise ValueError("shared_gateway is only supported with the apptainer server.")
+        if self.memory_limit_mb is not None and self.memory_limit_mb <= 0:
+            raise ValueError(f"memory_limit_mb must be positive, got {self.memory_limit_mb}")
+        if self.shared_gateway and self.shared_data_root is None and self.data_cache_dir is None:
+            raise ValueError("shared_gateway requires shared_data_root or data_cache_dir to be set.")
@@ -24,6 +24,104 @@ class PythonInterpreterConfig(InterpreterConfig):
             "exclude_from_hash": True,
         },
     )
+    memory_limit_mb: int | None = field(
+        default=None,
+        metadata={
+            "help": "Address-space limit (RLIMIT_AS) for the child process executing the code, in MB. None disables it.",
+        },
+    )
+    cpu_affinity: list[int] | None = field(
+        default=None,
+        metadata={"help": "CPU ids the child process executing the code is pinned to. None disables pinning."},
+    )
+    cgroup_memory_limit_mb: int | None = field(
+        default=None,
+        metadata={
+            "help": "cgroup v2 memory.max for the child process executing the code, in MB. Only applied if a "
+            "delegated cgroup with the memory controller is available. None disables it.",
+        },
+    )
+    cgroup_parent: str | None = field(
+        default=None,
+        metadata={
+            "help": "Delegated cgroup v2 directory under which the interpreter cgroup is created. It must have the "
+            "memory controller enabled and hold no processes. Required by cgroup_memory_limit_mb.",
+            "exclude_from_hash": True,
+        },
+    )
+    snapshot_workspaces: bool = field(
+        default=False,
+        metadata={
+            "help": "Run every node in its own copy-on-write workspace, seeded from the workspace of its parent node.",
+        },
+    )
+    snapshot_strategy: str = field(
+        default="auto",
+        metadata={
+            "help": "How node workspaces are created: auto (reflink, falling back to copy), reflink, hardlink or copy.",
+        },
+    )
+    snapshot_dir: str | None = field(
+        default=None,
+        metadata={
+            "help": "Directory holding the node workspaces. Defaults to `node_workspaces` next to the working dir.",
+            "exclude_from_hash": True,
+        },
+    )
+    snapshot_max_size_mb: int | None = field(
+        default=50_000,
+        metadata={
+            "help": "Disk quota of the node workspaces, in MB. Least recently used workspaces are evicted beyond it "
+            "(their children are seeded from the base working dir). None disables eviction.",
+            "exclude_from_hash": True,
+        },
+    )
+    artifact_cache: bool = field(
+        default=False,
+        metadata={
+            "help": "Expose a persistent memoization cache to the executed code as `dojo_cache`, so that expensive "
+            "intermediate results can be reused across nodes.",
+        },
+    )
+    artifact_cache_dir: str | None = field(
+        default=None,
+        metadata={
+            "help": "Directory of the artifact cache. Defaults to `artifact_cache` next to the working dir.",
+            "exclude_from_hash": True,
+        },
+    )
+    artifact_cache_max_size_mb: int = field(
+        default=20_000,
+        metadata={"help": "Disk quota of the artifact cache, in MB. Least recently used entries are evicted beyond it."},
+    )
+    incremental: bool = field(
+        default=False,
+        metadata={
+            "help": "Notebook-style execution: the state of the top-level statements a script shares with previously "
+            "executed scripts is kept alive in a checkpoint process, and only the remaining statements are executed, "
+            "in a fork of it. Falls back to full runs if the state does not survive a fork (e.g. CUDA).",
+        },
+    )
+    incremental_max_checkpoints: int = field(
+        default=2,
+        metadata={"help": "Maximum number of checkpoint processes kept alive in incremental mode."},
+    )
+    incremental_min_prefix_cells: int = field(
+        default=2,
+        metadata={"help": "Minimum number of shared top-level statements for a prefix to be checkpointed."},
+    )
 
     def validate(self) -> None:
         super().validate()
+        if self.memory_limit_mb is not None and self.memory_limit_mb <= 0:
+            raise ValueError(f"memory_limit_mb must be positive, got {self.memory_limit_mb}")
+        if self.cgroup_memory_limit_mb is not None and self.cgroup_memory_limit_mb <= 0:
+            raise ValueError(f"cgroup_memory_limit_mb must be positive, got {self.cgroup_memory_limit_mb}")
+        if self.snapshot_strategy not in ("auto", "reflink", "hardlink", "copy"):
+            raise ValueError(f"Unknown snapshot_strategy {self.snapshot_strategy}")
+        if self.snapshot_max_size_mb is not None and self.snapshot_max_size_mb <= 0:
+            raise ValueError(f"snapshot_max_size_mb must be positive, got {self.snapshot_max_size_mb}")
+        if self.artifact_cache_max_size_mb <= 0:
+            raise ValueError(f"artifact_cache_max_size_mb must be positive, got {self.artifact_cache_max_size_mb}")
+        if self.incremental_max_checkpoints < 1:
+            raise ValueError(f"incremental_max_checkpoints must be at least 1, got {self.incremental_max_checkpoints}")
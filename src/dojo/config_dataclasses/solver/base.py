@@ -132,5 +132,15 @@ class SolverConfig(BaseConfig):
         },
     )
 
+    max_pending_node_retries: int = field(
+        default=1,
+        metadata={
+            "description": "Number of times a node whose execution was interrupted (e.g. by a preemption) is "
+            "re-executed on restart before it is dropped.",
+            "example": 0,
+            "exclude_from_hash": True,
+        },
+    )
+
     def validate(self) -> None:
         super().validate()
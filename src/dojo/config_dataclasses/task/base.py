@@ -5,6 +5,7 @@
 # LICENSE file in the root directory of this source tree.
 
 from dataclasses import dataclass, field
+from typing import Optional
 
 from omegaconf import SI, MISSING
 
@@ -33,5 +34,69 @@ class TaskConfig(BaseConfig):
         },
     )
 
+    grading_workers: int = field(
+        default=0,
+        metadata={
+            "help": "Number of worker processes grading the submissions, overlapping with the analysis of the "
+            "execution. 0 grades inline, in the solver process.",
+            "exclude_from_hash": True,
+        },
+    )
+    grading_timeout: int = field(
+        default=1800,
+        metadata={
+            "help": "Maximum time a grading worker may spend on a submission, in seconds.",
+            "exclude_from_hash": True,
+        },
+    )
+    grading_memory_limit_mb: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": "Address-space limit of every grading worker, in MB. None means no limit.",
+            "exclude_from_hash": True,
+        },
+    )
+
+    screen_code: bool = field(
+        default=False,
+        metadata={
+            "help": "Statically check the solutions before executing them (syntax, imports, data paths). Solutions "
+            "that would certainly fail are reported as buggy without being executed and analyzed.",
+        },
+    )
+
+    execution_cache: bool = field(
+        default=False,
+        metadata={
+            "help": "Reuse the execution (and grading) of a solution identical to one executed before, on the same "
+            "data, environment and configuration, possibly by another run. Assumes the solutions are deterministic. "
+            "Not supported with per-node workspaces.",
+            "exclude_from_hash": True,
+        },
+    )
+    execution_cache_dir: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Directory of the execution cache, shared by the runs. Defaults to $DOJO_EXECUTION_CACHE or "
+            "~/.cache/dojo/execution_cache.",
+            "exclude_from_hash": True,
+        },
+    )
+    execution_cache_max_size_mb: int = field(
+        default=20_000,
+        metadata={
+            "help": "Size limit of the execution cache, in MB. Least recently used entries are evicted beyond it.",
+            "exclude_from_hash": True,
+        },
+    )
+
     def validate(self) -> None:
         super().validate()
+        if self.grading_workers < 0:
+            raise ValueError(f"grading_workers must be non-negative, got {self.grading_workers}")
+        if self.grading_timeout <= 0:
+            raise ValueError(f"grading_timeout must be positive, got {self.grading_timeout}")
+        if self.grading_memory_limit_mb is not None and self.grading_memory_limit_mb <= 0:
+            raise ValueError(f"grading_memory_limit_mb must be positive, got {self.grading_memory_limit_mb}")
+        if self.execution_cache_max_size_mb <= 0:
+            raise ValueError(f"execution_cache_max_size_mb must be positive, got {self.execution_cache_max_size_mb}")
@@ -124,5 +124,36 @@ class MLEBenchTaskConfig(TaskConfig):
         },
     )
 
+    smoke_run: bool = field(
+        default=False,
+        metadata={
+            "help": "Run every solution on a down-sampled copy of the data, under a short timeout, before the full "
+            "run. Solutions that crash or write no submission there are reported as failed without the full run. "
+            "Only supported with local interpreters.",
+        },
+    )
+    smoke_run_rows: int = field(
+        default=1000,
+        metadata={"help": "Number of rows the large tables of the data are cut to for the smoke run."},
+    )
+    smoke_run_timeout: int = field(
+        default=300,
+        metadata={
+            "help": "Timeout of the smoke run, in seconds. A smoke run timing out is inconclusive, the full run "
+            "proceeds.",
+        },
+    )
+    smoke_run_data_dir: str = field(
+        default=SI("${task.cache_dir}/${task.name}/smoke_public"),
+        metadata={
+            "help": "The directory where the down-sampled data of the smoke run is cached.",
+            "exclude_from_hash": True,
+        },
+    )
+
     def validate(self) -> None:
         super().validate()
+        if self.smoke_run_rows <= 0:
+            raise ValueError(f"smoke_run_rows must be positive, got {self.smoke_run_rows}")
+        if self.smoke_run_timeout <= 0:
+            raise ValueError(f"smoke_run_timeout must be positive, got {self.smoke_run_timeout}")
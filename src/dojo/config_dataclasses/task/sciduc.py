@@ -1,5 +1,6 @@
 # dataclasses is a built-in Python module for creating data classes
 from dataclasses import dataclass, field
+from typing import List, Optional
 
 # omegaconf is a YAML configuration system for Python
 # SI = Structured Interpolation, MISSING = sentinel value for required fields
@@ -40,6 +41,34 @@ class SciDUCTaskConfig(TaskConfig):
             "exclude_from_hash": True,
         },
     )
+    cache_dir: str = field(
+        default=get_sciduc_data_dir(),
+        metadata={
+            "help": "The directory where the task data is cached.",
+            "exclude_from_hash": True,
+        },
+    )
+    public_dir: str = field(
+        default=SI("${task.cache_dir}/${task.name}/prepared/public"),
+        metadata={
+            "help": "The directory where the public data is stored.",
+            "exclude_from_hash": True,
+        },
+    )
+    private_dir: str = field(
+        default=SI("${task.cache_dir}/${task.name}/prepared/private"),
+        metadata={
+            "help": "The directory where the private data is stored.",
+            "exclude_from_hash": True,
+        },
+    )
+    answers_path: str = field(
+        default=SI("${task.private_dir}/answers.json"),
+        metadata={
+            "help": "The ground-truth annotations the submissions are graded against, a JSON file in COCO format.",
+            "exclude_from_hash": True,
+        },
+    )
     results_output_dir: str = field(
         default=SI("${logger.output_dir}/results"),
         metadata={
@@ -47,5 +76,21 @@ class SciDUCTaskConfig(TaskConfig):
             "exclude_from_hash": True,
         },
     )
+    coco_iou_thresholds: Optional[List[float]] = field(
+        default=None,
+        metadata={
+            "help": (
+                "IoU thresholds evaluated when grading during the search. None evaluates the ten COCO thresholds "
+                "(.5:.95), needed for all twelve stats; [0.5] is enough for the fitness (AP@0.5) and much faster. "
+                "The final grading always evaluates all of them."
+            ),
+        },
+    )
+
     def validate(self) -> None:
-        super().validate()
\ No newline at end of file
+        super().validate()
+        if self.coco_iou_thresholds is not None:
+            if not self.coco_iou_thresholds:
+                raise ValueError("coco_iou_thresholds must not be empty, use None to evaluate all of them")
+            if any(not 0 < t < 1 for t in self.coco_iou_thresholds):
+                raise ValueError(f"coco_iou_thresholds must be in (0, 1), got {self.coco_iou_thresholds}")
\ No newline at end of file
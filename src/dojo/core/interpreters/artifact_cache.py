@@ -0,0 +1,182 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Per-run artifact cache exposed to the generated code as `dojo_cache`.
+
+It memoizes expensive, deterministic intermediate results (feature matrices, fitted preprocessors, ...)
+so that children of a node (improve / debug steps) do not have to recompute them. Entries are keyed by
+the source of the memoized function, its arguments and a fingerprint of the task data, pickled to disk,
+and evicted in least-recently-used order once the cache exceeds its disk quota.
+"""
+
+import hashlib
+import inspect
+import os
+import pickle
+import uuid
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable
+
+from dojo.utils.logger import get_logger
+
+logger = get_logger()
+
+# Appended to the task description when the cache is enabled, so that the agent knows it can use it.
+USAGE_INSTRUCTIONS = """
+ARTIFACT CACHE
+------
+A persistent cache is available in the global scope of your script as `dojo_cache`. Use it to avoid recomputing expensive, deterministic intermediate results (e.g. feature matrices, fitted preprocessors) across your attempts:
+
+```python
+@dojo_cache.memoize
+def build_features(train_path, test_path):
+    ...
+    return X_train, X_test
+```
+
+The result is reused whenever the source code of the function, its arguments and the data are unchanged. The function must only depend on its arguments and the data, and its result must be picklable.
+"""
+
+_MISSING = object()
+
+
+def _function_source(fn: Callable) -> str:
+    try:
+        return inspect.getsource(fn)
+    except (OSError, TypeError):
+        # e.g. functions defined in an interactive session: fall back to the compiled code
+        code = fn.__code__
+        return repr((code.co_code, code.co_consts, code.co_names))
+
+
+def _hash_arguments(args: tuple, kwargs: dict) -> str | None:
+    """Hash of the arguments, or None if they cannot be pickled (and so hashed deterministically)."""
+    try:
+        payload = pickle.dumps((args, sorted(kwargs.items())), protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        # not repr: it truncates large arrays and frames, so different arguments could share a key
+        return None
+    return hashlib.sha256(payload).hexdigest()
+
+
+class ArtifactCache:
+    """
+    A disk-backed memoization cache with an LRU disk quota.
+
+    Args:
+        root (Path | str): Directory holding the cached entries.
+        max_size_mb (int): Disk quota of the cache. Least recently used entries are evicted beyond it.
+        data_fingerprint (str): Fingerprint of the task data, mixed into every key so that entries are
+            never reused across different datasets.
+    """
+
+    def __init__(self, root: Path | str, max_size_mb: int = 20_000, data_fingerprint: str = "") -> None:
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = int(max_size_mb) * 1024 * 1024
+        self.data_fingerprint = data_fingerprint
+
+    def key(self, name: str, source: str = "", args: tuple = (), kwargs: dict | None = None) -> str | None:
+        """
+        Build the cache key of a result from its name, the code producing it and its inputs. Returns None if the
+        inputs cannot be hashed, in which case the result must not be cached.
+        """
+        arguments_hash = _hash_arguments(args, kwargs or {})
+        if arguments_hash is None:
+            return None
+        h = hashlib.sha256()
+        for part in (name, source, arguments_hash, self.data_fingerprint):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.pkl"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return default
+        except Exception as e:
+            logger.warning(f"Dropping unreadable artifact cache entry {path}: {e}")
+            path.unlink(missing_ok=True)
+            return default
+
+        # the modification time doubles as the last access time for the LRU eviction
+        os.utime(path)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so that concurrent readers never see a partial entry
+        tmp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        self.evict()
+
+    def memoize(self, fn: Callable | None = None, *, name: str | None = None) -> Callable:
+        """
+        Decorator memoizing `fn` on disk. Can be used as `@dojo_cache.memoize` or `@dojo_cache.memoize(name=...)`.
+        """
+        if fn is None:
+            return lambda f: self.memoize(f, name=name)
+
+        source = _function_source(fn)
+        cache_name = name or fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = self.key(cache_name, source, args, kwargs)
+            if key is None:
+                print(f"[dojo_cache] The arguments of {cache_name} cannot be pickled, not caching its result")
+                return fn(*args, **kwargs)
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                print(f"[dojo_cache] Reusing cached result of {cache_name}")
+                return value
+            value = fn(*args, **kwargs)
+            try:
+                self.set(key, value)
+            except Exception as e:
+                print(f"[dojo_cache] Could not cache the result of {cache_name}: {e}")
+            return value
+
+        return wrapper
+
+    def size_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.root.glob("*/*.pkl"))
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in its quota."""
+        entries = []
+        for path in self.root.glob("*/*.pkl"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            logger.debug(f"Evicted artifact cache entry {path}")
+
+    def clear(self) -> None:
+        for path in self.root.glob("*/*.pkl"):
+            path.unlink(missing_ok=True)
@@ -16,6 +16,12 @@ from typing import Any
 
 from dataclasses_json import DataClassJsonMixin
 
+from dojo.core.interpreters.resource_limits import MEMORY_LIMIT_EXCEEDED
+from dojo.utils.deadline import Deadline
+
+# name of the structured error reported when the process (or kernel) executing the code died under it
+PROCESS_DIED = "ProcessDied"
+
 
 @dataclass
 class ExecutionResult(DataClassJsonMixin):
@@ -29,6 +35,19 @@ class ExecutionResult(DataClassJsonMixin):
     exit_code: int | None = None
     eval_return: Any | None = None
     timed_out: bool = False
+    # structured description of the error that ended the execution (e.g. "MemoryError", "MemoryLimitExceeded")
+    exc_type: str | None = None
+    exc_info: dict | None = None
+
+    def ended_by_environment(self) -> bool:
+        """
+        Whether the execution was cut short by its environment (time limit, memory limit, death of the process or
+        kernel, signal) rather than ending with the code: running the same code again may end differently.
+        """
+        if self.timed_out or self.exc_type in (MEMORY_LIMIT_EXCEEDED, PROCESS_DIED):
+            return True
+        # negative exit codes are the signals that killed the process
+        return self.exit_code is not None and self.exit_code < 0
 
     @staticmethod
     def get_empty():
@@ -75,6 +94,7 @@ class Interpreter(ABC):
         persist_file: bool = False,
         file_name: str = "runfile.py",
         execute_code: bool = True,
+        deadline: Deadline | None = None,
     ) -> ExecutionResult:
         """
         Execute the provided code in the environment managed by this interpreter.
@@ -89,6 +109,8 @@ class Interpreter(ABC):
                 execution.
             execute_code (bool): Whether to execute the code or not. If False, this
                 function simply writes the code to a file.
+            deadline (Deadline, optional): Deadline of the search. The timeout of this
+                execution is clipped to the time remaining before it.
 
         Returns:
             ExecutionResult: The result of execution, including stdout, stderr, exceptions,
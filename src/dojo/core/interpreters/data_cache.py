@@ -0,0 +1,222 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Shared, read-only, node-local cache of task data directories.
+
+The first run on a host stages a data directory once (under a lock file) into a local cache directory,
+typically on local SSD or tmpfs. Every later run on the same host reuses the staged copy, by symlinking,
+hardlinking or bind-mounting it, instead of copying the data from the (network) filesystem again.
+
+Every entry has two lock files: a staging lock, held exclusively while the entry is staged or evicted, and
+a usage lock, on which runs hold a shared lock for as long as they use the entry. Entries are evicted in
+least-recently-used order, skipping the ones in use, once the cache exceeds its size limit.
+
+Entries are named after the full fingerprint of their source, which stats every file of it. To spare the (network)
+filesystem that walk on every run, a small reference file maps a cheap identity of the source (its path and the
+modification times of its top-level entries) to the entry: the source is only fingerprinted in full on a miss.
+"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+import stat
+import time
+from pathlib import Path
+
+from dojo.core.interpreters.utils import directory_fingerprint
+from dojo.utils.logger import get_logger
+
+logger = get_logger()
+
+COMPLETED_MARKER = ".completed"
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _make_read_only(path: Path) -> None:
+    read_only = ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            os.chmod(file_path, os.stat(file_path).st_mode & read_only)
+
+
+class DataCacheLease:
+    """A staged data directory, kept safe from eviction until `release` is called."""
+
+    def __init__(self, path: Path, lock_fd: int) -> None:
+        self.path = path
+        self._lock_fd = lock_fd
+
+    def release(self) -> None:
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def __del__(self):
+        self.release()
+
+
+class DataCache:
+    """
+    Node-local cache of read-only data directories.
+
+    Args:
+        root (Path | str): Directory of the cache, ideally on local SSD or tmpfs.
+        max_size_mb (int): Size limit of the cache. Least recently used entries that are not in use are
+            evicted beyond it.
+    """
+
+    def __init__(self, root: Path | str, max_size_mb: int = 200_000) -> None:
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = int(max_size_mb) * 1024 * 1024
+
+    def _entry_name(self, source: Path) -> str:
+        key = hashlib.sha256(f"{source}\0{directory_fingerprint(source)}".encode()).hexdigest()[:16]
+        return f"{source.name}-{key}"
+
+    def _ref_path(self, source: Path) -> Path:
+        """Reference file mapping the cheap identity of `source` to the name of its entry."""
+        h = hashlib.sha256(str(source).encode())
+        for item in sorted(source.iterdir()):
+            st = item.stat()
+            h.update(f"\0{item.name}\0{st.st_size}\0{st.st_mtime_ns}".encode())
+        return self.root / f".{source.name}-{h.hexdigest()[:16]}.ref"
+
+    def _lookup(self, source: Path) -> str:
+        """Name of the entry of `source`, only fingerprinting it in full if its cheap identity is unknown."""
+        ref = self._ref_path(source)
+        try:
+            name = ref.read_text().strip()
+            if (self.root / name / COMPLETED_MARKER).exists():
+                return name
+        except FileNotFoundError:
+            pass
+
+        name = self._entry_name(source)
+        tmp = ref.with_name(f"{ref.name}.{os.getpid()}.tmp")
+        tmp.write_text(name)
+        os.replace(tmp, ref)
+        return name
+
+    def _lock_path(self, name: str, kind: str) -> Path:
+        return self.root / f".{name}.{kind}.lock"
+
+    def _open_lock(self, name: str, kind: str) -> int:
+        return os.open(self._lock_path(name, kind), os.O_RDWR | os.O_CREAT, 0o666)
+
+    def stage(self, source: Path | str) -> DataCacheLease:
+        """
+        Return a lease on the staged copy of `source`, staging it first if needed.
+        The lease must be kept alive for as long as the staged data is in use.
+        """
+        source = Path(source).resolve()
+        name = self._lookup(source)
+        entry = self.root / name
+
+        stage_fd = self._open_lock(name, "stage")
+        use_fd = self._open_lock(name, "use")
+        try:
+            # exclusive while (maybe) staging, so that only one run per host copies the data
+            fcntl.flock(stage_fd, fcntl.LOCK_EX)
+            # shared usage lock, held for as long as the lease is alive
+            fcntl.flock(use_fd, fcntl.LOCK_SH)
+            if not (entry / COMPLETED_MARKER).exists():
+                self._copy(source, entry)
+            else:
+                logger.info(f"Reusing staged data {entry} for {source}")
+            # last access time used for the LRU eviction
+            os.utime(entry / COMPLETED_MARKER)
+        except BaseException:
+            os.close(use_fd)
+            raise
+        finally:
+            os.close(stage_fd)
+
+        lease = DataCacheLease(entry, use_fd)
+        self.evict(keep=name)
+        return lease
+
+    def _copy(self, source: Path, entry: Path) -> None:
+        start = time.time()
+        logger.info(f"Staging data {source} into the local data cache {entry}")
+        if entry.exists():
+            # leftover from an interrupted staging
+            shutil.rmtree(entry, ignore_errors=True)
+
+        tmp = entry.with_name(f".{entry.name}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        shutil.copytree(source, tmp, symlinks=False)
+        _make_read_only(tmp)
+        (tmp / COMPLETED_MARKER).touch()
+        tmp.rename(entry)
+        logger.info(f"Staged {source} in {time.time() - start:.1f}s")
+
+    def evict(self, keep: str | None = None) -> None:
+        """Evict least recently used entries that are not in use until the cache fits in its size limit."""
+        entries = []
+        for entry in self.root.iterdir():
+            marker = entry / COMPLETED_MARKER
+            if entry.name.startswith(".") or entry.name == keep or not marker.exists():
+                continue
+            entries.append((marker.stat().st_mtime, entry))
+
+        total = sum(_dir_size(entry) for entry in self.root.iterdir() if not entry.name.startswith("."))
+        for _, entry in sorted(entries):
+            if total <= self.max_size_bytes:
+                break
+
+            stage_fd = self._open_lock(entry.name, "stage")
+            use_fd = self._open_lock(entry.name, "use")
+            try:
+                fcntl.flock(stage_fd, fcntl.LOCK_EX)
+                try:
+                    fcntl.flock(use_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # in use by another run
+                    continue
+
+                size = _dir_size(entry)
+                (entry / COMPLETED_MARKER).unlink(missing_ok=True)
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                logger.info(f"Evicted {entry} from the local data cache")
+            finally:
+                os.close(use_fd)
+                os.close(stage_fd)
+
+
+def link_data_tree(source: Path, destination: Path) -> None:
+    """
+    Populate `destination` with hardlinks to the files of `source` (directories are recreated).
+    Falls back to copying when hardlinks are not possible (e.g. across filesystems).
+    """
+    destination.mkdir(parents=True, exist_ok=True)
+    for item in source.iterdir():
+        if item.name == COMPLETED_MARKER:
+            continue
+        target = destination / item.name
+        if target.exists() or target.is_symlink():
+            continue
+        if item.is_dir():
+            link_data_tree(item, target)
+            continue
+        try:
+            os.link(item, target)
+        except OSError:
+            shutil.copy2(item, target)
@@ -0,0 +1,416 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Incremental (notebook-style) execution for the local Python interpreter.
+
+Scripts are split into cells, one per top-level statement. When a new script shares a prefix of cells with
+a previously executed script (e.g. an improve step that only changes the model), the prefix is executed once
+in a long-lived checkpoint process that keeps the resulting Python state alive. Only the remaining cells are
+executed, in a fork of that checkpoint process. The output of the prefix is replayed in front of the output
+of the remaining cells, so that the result reads like the one of a full run.
+
+Forking is not safe for every library (most notably CUDA): callers are expected to fall back to a full run
+when `is_fork_unsafe_error` matches the output of a forked run.
+
+A prefix that fails or times out while creating a checkpoint is reported as the result of the script: the full
+script would fail the same way, and running it again would double the time spent on it.
+"""
+
+import ast
+import hashlib
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from dojo.core.interpreters.base import PROCESS_DIED
+from dojo.utils.logger import get_logger
+
+logger = get_logger()
+
+_fork_ctx = multiprocessing.get_context("fork")
+
+# markers of errors raised when a library initialized in the checkpoint process does not survive a fork
+FORK_UNSAFE_MARKERS = (
+    "Cannot re-initialize CUDA in forked subprocess",
+    "CUDA initialization error",
+    "forked process",
+)
+
+# markers of a forked run that crashed or never started, e.g. because of a broken checkpoint
+FORK_FAILURE_MARKERS = (
+    "REPL child process died unexpectedly",
+    "REPL child process failed to start execution",
+)
+
+
+def is_fork_unsafe_error(term_out: list[str]) -> bool:
+    output = "".join(term_out)
+    return any(marker in output for marker in FORK_UNSAFE_MARKERS)
+
+
+def is_fork_failure(term_out: list[str]) -> bool:
+    output = "".join(term_out)
+    return any(marker in output for marker in FORK_FAILURE_MARKERS)
+
+
+@dataclass
+class ScriptCells:
+    """A script split into cells, one per top-level statement."""
+
+    # normalized statements, insensitive to comments and formatting
+    dumps: list[str]
+    # 1-based line on which every cell starts (including decorators)
+    start_lines: list[int]
+    lines: list[str]
+
+    @classmethod
+    def parse(cls, code: str) -> "ScriptCells | None":
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return None
+
+        dumps, start_lines = [], []
+        for stmt in tree.body:
+            decorators = getattr(stmt, "decorator_list", [])
+            start_lines.append(min([stmt.lineno] + [d.lineno for d in decorators]))
+            dumps.append(ast.dump(stmt))
+        return cls(dumps=dumps, start_lines=start_lines, lines=code.splitlines(keepends=True))
+
+    def __len__(self) -> int:
+        return len(self.dumps)
+
+    def prefix_key(self, n_cells: int) -> str:
+        return hashlib.sha256("\0".join(self.dumps[:n_cells]).encode()).hexdigest()
+
+    def prefix_code(self, n_cells: int) -> str:
+        return "".join(self.lines[: self.start_lines[n_cells] - 1])
+
+    def suffix_code(self, n_cells: int) -> str:
+        # pad with empty lines so that line numbers in tracebacks match the full script
+        start = self.start_lines[n_cells] - 1
+        return "\n" * start + "".join(self.lines[start:])
+
+
+def common_prefix_length(a: list[str], b: list[str]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+@dataclass
+class PrefixFailure:
+    """A script prefix that failed, timed out or crashed while creating a checkpoint."""
+
+    output: list[str]
+    exec_time: float
+    exc_type: str | None
+    exc_info: dict | None = None
+    timed_out: bool = False
+
+
+class _CaptureOutput:
+    """A file-like object collecting everything written to it."""
+
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+
+    def write(self, msg: str) -> None:
+        self.lines.append(msg)
+
+    def flush(self) -> None:
+        pass
+
+
+class CheckpointServer:
+    """
+    A process holding the Python state obtained by executing a script prefix, from which runs are forked.
+
+    The forked runs execute `PythonInterpreter._run_session` on a copy of the checkpointed global scope and
+    communicate through the queues of the server, exactly like a regular REPL child process.
+    """
+
+    def __init__(self, key: str, interpreter: Any, prefix_code: str, file_name: str, working_dir: str) -> None:
+        self.key = key
+        self.code_inq = _fork_ctx.Queue()
+        self.result_outq = _fork_ctx.Queue()
+        self.event_outq = _fork_ctx.Queue()
+        self.ctrl_q = _fork_ctx.Queue()
+        self.reply_q = _fork_ctx.Queue()
+
+        self.prefix_output: list[str] = []
+        self.prefix_time = 0.0
+        self.prefix_exc_type: str | None = None
+        self.prefix_exc_info: dict | None = None
+        # set when a forked run had to be killed: its queues may have been left in an inconsistent state
+        self.broken = False
+
+        self.process = _fork_ctx.Process(
+            target=self._serve,
+            args=(interpreter, prefix_code, file_name, working_dir),
+        )
+        self.process.start()
+
+    def _serve(self, interpreter: Any, prefix_code: str, file_name: str, working_dir: str) -> None:
+        interpreter.child_proc_setup(self.result_outq)
+        os.chdir(working_dir)
+
+        # imported here, the interpreter module imports this one
+        from dojo.core.interpreters.python import exception_summary
+
+        captured = _CaptureOutput()
+        sys.stdout = sys.stderr = captured
+        global_scope = interpreter.new_global_scope()
+        # written like a full run, so that tracebacks show the source lines
+        with open(file_name, "w") as f:
+            f.write(prefix_code)
+        start = time.time()
+        try:
+            exec(compile(prefix_code, file_name, "exec"), global_scope)
+        except BaseException as e:
+            tb_str, e_cls_name, exc_info, _ = exception_summary(
+                e, Path(working_dir), file_name, interpreter.format_tb_ipython
+            )
+            self.reply_q.put(("failed", captured.lines + [tb_str], time.time() - start, e_cls_name, exc_info))
+            return
+        finally:
+            Path(file_name).unlink(missing_ok=True)
+        self.reply_q.put(("ready", captured.lines, time.time() - start, None, None))
+
+        while True:
+            if self.ctrl_q.get() == "stop":
+                break
+            child = _fork_ctx.Process(
+                target=interpreter._run_session,
+                args=(self.code_inq, self.result_outq, self.event_outq, global_scope),
+            )
+            child.start()
+            self.reply_q.put(("forked", child.pid))
+            child.join()
+            self.reply_q.put(("exited", child.exitcode))
+
+    def _get_reply(self, timeout: float) -> str | None:
+        try:
+            reply = self.reply_q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        status, self.prefix_output, self.prefix_time, self.prefix_exc_type, self.prefix_exc_info = reply
+        return status
+
+    def wait_ready(self, timeout: float | None) -> str:
+        """
+        Wait until the prefix has been executed, interrupting it after `timeout` seconds.
+
+        Returns:
+            str: "ready", "failed", "timeout" or "died". The output, time and error of the prefix are set.
+        """
+        start = time.time()
+        interrupted = False
+        while True:
+            status = self._get_reply(timeout=0.5)
+            elapsed = time.time() - start
+            if status is not None:
+                if interrupted:
+                    self.prefix_time = elapsed
+                    return "timeout"
+                return status
+            if not self.process.is_alive():
+                # the reply may have been sent right before the process exited
+                status = self._get_reply(timeout=0.5)
+                if status is not None:
+                    return status
+                self.prefix_output, self.prefix_time = ["REPL child process died unexpectedly"], elapsed
+                self.prefix_exc_type, self.prefix_exc_info = PROCESS_DIED, {"exitcode": self.process.exitcode}
+                return "died"
+            if timeout is None or elapsed <= timeout:
+                continue
+            if not interrupted:
+                # like a regular run: the prefix gets a KeyboardInterrupt, and reports what it printed
+                os.kill(self.process.pid, signal.SIGINT)
+                interrupted = True
+            elif elapsed > timeout + 10:
+                self.prefix_time = elapsed
+                return "timeout"
+
+    def fork(self) -> "ForkedRun":
+        self.ctrl_q.put("run")
+        status, pid = self.reply_q.get(timeout=30)
+        assert status == "forked", status
+        return ForkedRun(self, pid)
+
+    def stop(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+
+
+class ForkedRun:
+    """A process-like handle on a run forked from a `CheckpointServer`, as used by `PythonInterpreter`."""
+
+    def __init__(self, server: CheckpointServer, pid: int) -> None:
+        self.server = server
+        self.pid = pid
+        self.exitcode: int | None = None
+
+    def _poll(self, timeout: float | None) -> None:
+        deadline = None if timeout is None else time.time() + timeout
+        while self.exitcode is None:
+            try:
+                status, exitcode = self.server.reply_q.get(timeout=0.1)
+            except queue.Empty:
+                if not self.server.process.is_alive():
+                    # the checkpoint process is gone, and the run with it
+                    self.exitcode = -signal.SIGKILL
+                elif deadline is not None and time.time() >= deadline:
+                    return
+                continue
+            if status == "exited":
+                self.exitcode = exitcode
+
+    def _signal(self, sig: int) -> None:
+        try:
+            os.kill(self.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def is_alive(self) -> bool:
+        self._poll(timeout=0)
+        return self.exitcode is None
+
+    def terminate(self) -> None:
+        # ask the session loop to exit first: killing a process blocked on the shared queues leaves them locked
+        self.server.code_inq.put(None)
+        self._poll(timeout=1)
+        if self.exitcode is None:
+            self.server.broken = True
+            self._signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self.server.broken = True
+        self._signal(signal.SIGKILL)
+
+    def join(self, timeout: float | None = None) -> None:
+        self._poll(timeout)
+
+    def close(self) -> None:
+        pass
+
+
+class IncrementalExecutor:
+    """
+    Keeps track of the executed scripts and of a small LRU of checkpoint processes.
+
+    Args:
+        interpreter: The `PythonInterpreter` whose session setup and loop are used in the checkpoint processes.
+        max_checkpoints (int): Maximum number of checkpoint processes kept alive.
+        min_prefix_cells (int): Minimum number of shared cells for a prefix to be worth checkpointing.
+        history_size (int): Number of previously executed scripts searched for shared prefixes.
+    """
+
+    def __init__(self, interpreter: Any, max_checkpoints: int = 2, min_prefix_cells: int = 2, history_size: int = 16):
+        self.interpreter = interpreter
+        self.max_checkpoints = max_checkpoints
+        self.min_prefix_cells = min_prefix_cells
+        self.history_size = history_size
+        self.history: list[list[str]] = []
+        self.checkpoints: OrderedDict[str, CheckpointServer] = OrderedDict()
+        self.disabled = False
+
+    def _find_checkpoint(self, cells: ScriptCells) -> tuple[int, CheckpointServer] | None:
+        for n_cells in range(len(cells) - 1, self.min_prefix_cells - 1, -1):
+            key = cells.prefix_key(n_cells)
+            server = self.checkpoints.get(key)
+            if server is None:
+                continue
+            if server.broken or not server.process.is_alive():
+                self.drop(key)
+                continue
+            return n_cells, server
+        return None
+
+    def _create_checkpoint(
+        self, cells: ScriptCells, file_name: str, working_dir: str, timeout: float | None
+    ) -> tuple[int, CheckpointServer] | PrefixFailure | None:
+        n_cells = max((common_prefix_length(cells.dumps, h) for h in self.history), default=0)
+        # always leave at least one cell to execute in the fork
+        n_cells = min(n_cells, len(cells) - 1)
+        if n_cells < self.min_prefix_cells:
+            return None
+
+        key = cells.prefix_key(n_cells)
+        logger.info(f"Creating an execution checkpoint after {n_cells} cells")
+        server = CheckpointServer(key, self.interpreter, cells.prefix_code(n_cells), file_name, working_dir)
+
+        status = server.wait_ready(timeout)
+        if status != "ready":
+            logger.info(f"The script prefix did not complete ({status}), reporting it as the result of the script")
+            server.stop()
+            return PrefixFailure(
+                output=server.prefix_output,
+                exec_time=server.prefix_time,
+                exc_type="TimeoutError" if status == "timeout" else server.prefix_exc_type,
+                exc_info=server.prefix_exc_info,
+                timed_out=status == "timeout",
+            )
+
+        self.checkpoints[key] = server
+        while len(self.checkpoints) > self.max_checkpoints:
+            _, evicted = self.checkpoints.popitem(last=False)
+            evicted.stop()
+        return n_cells, server
+
+    def start(
+        self, code: str, file_name: str, working_dir: Path | str, timeout: float | None
+    ) -> tuple[ForkedRun, CheckpointServer, str, bool] | PrefixFailure | None:
+        """
+        Fork a run of `code` from a checkpoint sharing a prefix with it, creating the checkpoint if needed.
+
+        Returns:
+            (run handle, checkpoint, code left to execute, whether the checkpoint was just created),
+            a `PrefixFailure` if creating the checkpoint failed in the code of the prefix,
+            or None if the script has to be executed in full.
+        """
+        if self.disabled:
+            return None
+        cells = ScriptCells.parse(code)
+        if cells is None or len(cells) < 2:
+            return None
+
+        found = self._find_checkpoint(cells)
+        created = False
+        if found is None:
+            found = self._create_checkpoint(cells, file_name, str(working_dir), timeout)
+            created = found is not None
+
+        self.history = (self.history + [cells.dumps])[-self.history_size :]
+        if found is None or isinstance(found, PrefixFailure):
+            return found
+
+        n_cells, server = found
+        self.checkpoints.move_to_end(server.key)
+        logger.info(f"Reusing the state of the first {n_cells}/{len(cells)} cells of the script")
+        return server.fork(), server, cells.suffix_code(n_cells), created
+
+    def drop(self, key: str) -> None:
+        server = self.checkpoints.pop(key, None)
+        if server is not None:
+            server.stop()
+
+    def close(self) -> None:
+        for server in self.checkpoints.values():
+            server.stop()
+        self.checkpoints.clear()
@@ -30,8 +30,52 @@ import logging
 
 log = logging.getLogger(__name__)
 
+# printed by the kernel gateway once it accepts connections
+GATEWAY_READY_PATTERN = re.compile(r"is available at http://([^:]+):(\d+)")
+
+
+def gateway_command(token: str) -> List[str]:
+    """Command starting the kernel gateway inside the container, through the `sand` wrapper."""
+    return [
+        str(Path(__file__).parent / "sand"),
+        "python",
+        "-m",
+        "jupyter",
+        "kernelgateway",
+        "--KernelGatewayApp.auth_token",
+        token,
+        "--JupyterApp.answer_yes=True",
+        "--JupyterWebsocketPersonality.list_kernels=True",
+        "--KernelGatewayApp.answer_yes=True",
+        "--KernelManager.cache_ports=False",
+    ]
+
+
+def container_env(
+    bind_configs: List[str],
+    superimage_directory: str | None,
+    superimage_version: str | None,
+    read_only_overlays: List[Path],
+    env: Dict[str, str],
+) -> Dict[str, str]:
+    """Environment of the `sand` wrapper: binds, superimage, overlays and the variables forwarded to the container."""
+    wrapper_env = os.environ.copy()
+    for k, v in env.items():
+        wrapper_env[f"RAD_{k}"] = v
+    if bind_configs:
+        wrapper_env["APPTAINER_BIND"] = ",".join(bind_configs)
+    if superimage_directory is not None:
+        wrapper_env["SUPERIMAGE_DIR"] = superimage_directory
+    if superimage_version is not None:
+        wrapper_env["SUPERIMAGE_VERSION"] = superimage_version
+    wrapper_env["BASE_OVERLAYS"] = " ".join(f"--overlay {overlay}:ro" for overlay in read_only_overlays)
+    return wrapper_env
+
 
 class ApptainerJupyterServer(JupyterConnectable):
+    # where the host working dir is mounted when `bind_working_dir` is set
+    CONTAINER_WORKING_DIR = "/root/workspace"
+
     def __init__(
         self,
         token: str = ...,
@@ -41,6 +85,7 @@ class ApptainerJupyterServer(JupyterConnectable):
         read_only_overlays: List[str] = None,
         read_only_binds: Dict[str, str] = None,
         env: Dict[str, str] = None,
+        bind_working_dir: Path | str | None = None,
     ):
         self.read_only_overlays = read_only_overlays or []
         self.read_only_overlays = [Path(path).resolve() for path in self.read_only_overlays]
@@ -60,39 +105,23 @@ class ApptainerJupyterServer(JupyterConnectable):
         self.path_to_superimage = superimage_directory
         self.superimage_version = superimage_version
 
-        args = [
-            str(Path(__file__).parent / "sand"),
-            "python",
-            "-m",
-            "jupyter",
-            "kernelgateway",
-            "--KernelGatewayApp.auth_token",
-            token,
-            "--JupyterApp.answer_yes=True",
-            "--JupyterWebsocketPersonality.list_kernels=True",
-            "--KernelGatewayApp.answer_yes=True",
-            "--KernelManager.cache_ports=False",
-        ]
-
-        env = os.environ.copy()
-        for k, v in self.env.items():
-            env[f"RAD_{k}"] = v
+        args = gateway_command(token)
 
         bind_configs = []
         if bind_inputs_dir is not None:
             bind_configs.append(f"{bind_inputs_dir}:/root/data:ro")
+        if bind_working_dir is not None:
+            # the working dir is shared read-write with the host, with the data mounted (read-only) inside of it
+            bind_working_dir = Path(bind_working_dir).resolve()
+            bind_configs.append(f"{bind_working_dir}:{self.CONTAINER_WORKING_DIR}:rw")
+            if bind_inputs_dir is not None:
+                (bind_working_dir / "data").mkdir(exist_ok=True)
+                bind_configs.append(f"{bind_inputs_dir}:{self.CONTAINER_WORKING_DIR}/data:ro")
+        self.bind_working_dir = bind_working_dir
         for k, v in self.read_only_binds.items():
             k = os.path.abspath(k)
             bind_configs.append(f"{k}:{v}:ro")
-        if bind_configs:
-            env["APPTAINER_BIND"] = ",".join(bind_configs)
-
-        if superimage_directory is not None:
-            env["SUPERIMAGE_DIR"] = superimage_directory
-        if superimage_version is not None:
-            env["SUPERIMAGE_VERSION"] = superimage_version
-
-        env["BASE_OVERLAYS"] = " ".join(f"--overlay {overlay}:ro" for overlay in self.read_only_overlays)
+        env = container_env(bind_configs, superimage_directory, superimage_version, self.read_only_overlays, self.env)
         log.warning(f"Starting `Sand` wrapper server with env:")
         log.warning(f"  APPTAINER_BIND: {env['APPTAINER_BIND']}")
         log.warning(f"  SUPERIMAGE_DIR: {env['SUPERIMAGE_DIR']}")
@@ -126,7 +155,7 @@ class ApptainerJupyterServer(JupyterConnectable):
                 error_info = line.split("ERROR:")[1]
                 raise ValueError(f"Jupyter gateway server failed to start. {error_info}")
 
-            match = re.search(r"is available at http://([^:]+):(\d+)", line)
+            match = GATEWAY_READY_PATTERN.search(line)
             if match:
                 self.ip = match.group(1)
                 self.port = int(match.group(2))
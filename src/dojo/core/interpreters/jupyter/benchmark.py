@@ -0,0 +1,128 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Benchmark of the Jupyter interpreter stack against a `LocalJupyterServer`, without Apptainer.
+
+Measures the per-execution overhead, the throughput of `fetch_file` and the latency of kernel starts and restarts.
+
+Usage:
+    python -m dojo.core.interpreters.jupyter.benchmark --executions 200 --file-size-mb 256
+"""
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from .jupyter_code_executor import JupyterCodeExecutor
+from .local_jupyter_server import LocalJupyterServer
+
+
+def _summary(samples: list[float]) -> dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": 1000 * statistics.fmean(samples),
+        "p50_ms": 1000 * samples[len(samples) // 2],
+        "p95_ms": 1000 * samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "max_ms": 1000 * samples[-1],
+    }
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_execution(executor: JupyterCodeExecutor, n: int) -> dict[str, float]:
+    """Round-trip time of trivial executions, i.e. the overhead added to every execution."""
+    executor.execute_code("pass")
+    samples = []
+    for _ in range(n):
+        samples.append(_timed(lambda: executor.execute_code("pass")))
+    return _summary(samples)
+
+
+def bench_output(executor: JupyterCodeExecutor, n: int, lines: int) -> dict[str, float]:
+    """Time of executions printing many lines, i.e. the cost of collecting output."""
+    code = f"for i in range({lines}):\n    print(i)"
+    return _summary([_timed(lambda: executor.execute_code(code)) for _ in range(n)])
+
+
+def bench_fetch_file(executor: JupyterCodeExecutor, working_dir: Path, size_mb: int, n: int) -> dict[str, float]:
+    """Throughput of fetching a file written by the kernel."""
+    executor.execute_code(f"import os\nwith open('bench.bin', 'wb') as f:\n    f.write(os.urandom({size_mb} * 2**20))")
+    samples = []
+    for i in range(n):
+        destination = working_dir / f"fetched-{i}.bin"
+        samples.append(_timed(lambda: executor.fetch_file("bench.bin", destination=destination)))
+        destination.unlink()
+    result = _summary(samples)
+    result["throughput_mb_s"] = size_mb / statistics.fmean(samples)
+    return result
+
+
+def bench_kernel_start(server: LocalJupyterServer, n: int) -> dict[str, float]:
+    """Latency of starting a new kernel and running a first execution on it."""
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        executor = JupyterCodeExecutor(server)
+        executor.execute_code("pass")
+        samples.append(time.perf_counter() - start)
+        executor.stop()
+    return _summary(samples)
+
+
+def bench_restart(executor: JupyterCodeExecutor, n: int) -> dict[str, float]:
+    """Latency of restarting the kernel until it runs a first execution."""
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        executor.restart()
+        executor.execute_code("pass")
+        samples.append(time.perf_counter() - start)
+    return _summary(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--executions", type=int, default=100, help="Number of timed trivial executions.")
+    parser.add_argument("--output-lines", type=int, default=10_000, help="Lines printed by the output benchmark.")
+    parser.add_argument("--file-size-mb", type=int, default=64, help="Size of the fetched file.")
+    parser.add_argument("--repeats", type=int, default=5, help="Repetitions of the slower benchmarks.")
+    parser.add_argument("--working-dir", type=str, default=None, help="Working dir, a temporary dir by default.")
+    parser.add_argument("--output", type=str, default=None, help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="jupyter-bench-") as tmp_dir:
+        working_dir = Path(args.working_dir or tmp_dir).resolve()
+        results = {}
+        with LocalJupyterServer(working_dir=working_dir) as server:
+            results["gateway"] = {"host": server.ip, "port": server.port}
+            results["kernel_start"] = bench_kernel_start(server, args.repeats)
+            executor = JupyterCodeExecutor(server, timeout=600)
+            try:
+                results["execution"] = bench_execution(executor, args.executions)
+                results["output"] = bench_output(executor, args.repeats, args.output_lines)
+                results["fetch_file"] = bench_fetch_file(executor, working_dir, args.file_size_mb, args.repeats)
+                results["restart"] = bench_restart(executor, args.repeats)
+            finally:
+                executor.stop()
+
+    for name, result in results.items():
+        values = ", ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items())
+        print(f"{name:>14}: {values}")
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,11 +15,10 @@ import time
 import datetime
 import json
 import sys
-from textwrap import indent
 import uuid
 from dataclasses import dataclass
 from types import TracebackType
-from typing import Any, List, cast
+from typing import Any, Callable, List, cast
 
 # from ...doc_utils import export_module
 
@@ -104,6 +103,16 @@ class JupyterClient:
         )
         response.raise_for_status()
 
+    def get_kernel(self, kernel_id: str) -> dict[str, Any] | None:
+        """Return the model of the kernel (with its `execution_state`), or None if it does not exist anymore."""
+        response = self._session.get(
+            f"{self._get_api_base_url()}/api/kernels/{kernel_id}", headers=self._get_headers(), timeout=30
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return cast(dict[str, Any], response.json())
+
     def restart_kernel(self, kernel_id: str) -> None:
         response = self._session.post(
             f"{self._get_api_base_url()}/api/kernels/{kernel_id}/restart", headers=self._get_headers()
@@ -122,7 +131,7 @@ class JupyterClient:
     def get_kernel_client(self, kernel_id: str) -> JupyterKernelClient:
         ws_url = f"{self._get_ws_base_url()}/api/kernels/{kernel_id}/channels"
         headers = self._get_headers()
-        return JupyterKernelClient(ws_url, headers)
+        return JupyterKernelClient(ws_url, headers, kernel_status=lambda: self.get_kernel(kernel_id))
 
 
 class JupyterKernelClient:
@@ -139,41 +148,153 @@ class JupyterKernelClient:
         output: List[str]
         data_items: list[DataItem]
         timed_out: bool = False
-
-    def __init__(self, url: str, headers: dict[str, str]):
+        # the kernel died, or the connection to it was lost, during the execution
+        kernel_lost: bool = False
+
+    # synthetic messages put in the queues of running executions by the connection thread
+    _RESUMED = "dojo_resumed"
+    _KERNEL_DEAD = "dojo_kernel_dead"
+    _CONNECTION_LOST = "dojo_connection_lost"
+
+    def __init__(
+        self,
+        url: str,
+        headers: dict[str, str],
+        kernel_status: Callable[[], dict[str, Any] | None] | None = None,
+    ):
+        """
+        Args:
+            url (str): Websocket URL of the kernel channels.
+            headers (dict[str, str]): Headers of the websocket handshake.
+            kernel_status (Callable | None): Returns the REST model of the kernel, or None if it is gone. Used to
+                find out what happened to running executions after a reconnection.
+        """
         self._session_id: str = uuid.uuid4().hex
-
-        self._message_queue: queue.Queue[str] = queue.Queue()
+        # with the same session id, the server replays the messages buffered while we were disconnected
+        self._url = f"{url}?session_id={self._session_id}"
+        self._header_list = [f"{k}: {v}" for k, v in headers.items()]
+        self._kernel_status = kernel_status
+
+        # messages are routed by the id of the request they answer to, as soon as they are received
+        self._pending: dict[str, queue.Queue[dict[str, Any]]] = {}
+        self._pending_lock = threading.Lock()
+        # ids of the execute requests that did not complete yet
+        self._executing: set[str] = set()
         self._connected_event = threading.Event()
-
-        header_list = [f"{k}: {v}" for k, v in headers.items()]
-
-        self._ws_app = WebSocketApp(
-            url,
-            header=header_list,
-            on_open=self._on_open,
-            on_message=self._on_message,
-            on_error=self._on_error,
-            on_close=self._on_close,
-        )
-
-        self._thread = threading.Thread(target=self._ws_app.run_forever, daemon=True)
+        # whether the kernel answered a kernel_info_request since it (re)started
+        self._ready = False
+
+        self._stopped = False
+        self._ws_app: WebSocketApp | None = None
+        self._has_connected = False
+        self._disconnected_since: float | None = None
+        self._connect_timeout = 300
+        # how long to keep trying to reconnect before giving up on the running executions
+        self._reconnect_timeout = 600
+        # grace period for the server to replay buffered messages after a reconnection
+        self._replay_grace = 2
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
         self._thread.start()
 
-        self._time_cycle = 300
-        self._connected_event.wait(timeout=self._time_cycle)
+        self._connected_event.wait(timeout=self._connect_timeout)
+
+    def _run(self) -> None:
+        attempt = 0
+        while not self._stopped:
+            self._ws_app = WebSocketApp(
+                self._url,
+                header=self._header_list,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+            )
+            # pings detect half-open connections, which would otherwise look like a silent execution.
+            # The messages are parsed as JSON anyway: the pure-Python UTF-8 validation only caps the throughput
+            self._ws_app.run_forever(ping_interval=30, ping_timeout=10, skip_utf8_validation=True)
+            self._connected_event.clear()
+            if self._stopped:
+                break
+
+            if self._disconnected_since is None:
+                self._disconnected_since = time.monotonic()
+                attempt = 0
+            if time.monotonic() - self._disconnected_since > self._reconnect_timeout:
+                log.error(f"Could not reconnect to the kernel within {self._reconnect_timeout}s, giving up.")
+                self._notify_executing(self._CONNECTION_LOST)
+                break
+
+            delay = min(2**attempt, 30)
+            attempt += 1
+            log.warning(f"Kernel websocket disconnected, reconnecting in {delay}s (attempt {attempt})")
+            time.sleep(delay)
 
     def _on_open(self, ws: WebSocketApp) -> None:
+        self._disconnected_since = None
         self._connected_event.set()
+        if self._has_connected:
+            log.warning("Kernel websocket reconnected.")
+            threading.Thread(target=self._resume, daemon=True).start()
+        self._has_connected = True
+
+    def _resume(self) -> None:
+        """Check what happened to the running executions while the connection was down."""
+        time.sleep(self._replay_grace)
+        with self._pending_lock:
+            executing = bool(self._executing)
+        if not executing or self._kernel_status is None:
+            return
+        try:
+            kernel = self._kernel_status()
+        except requests.RequestException as e:
+            log.warning(f"Could not query the kernel status after reconnecting: {e}")
+            return
+        except Exception:
+            # the running executions keep waiting for their output through the new connection
+            log.exception("Unexpected error while querying the kernel status after reconnecting")
+            return
+
+        if kernel is None or kernel.get("execution_state") == "dead":
+            log.error("The kernel died while the connection was down.")
+            self._notify_executing(self._KERNEL_DEAD)
+        else:
+            self._notify_executing(self._RESUMED, execution_state=kernel.get("execution_state"))
+
+    def _notify_executing(self, msg_type: str, **content: Any) -> None:
+        with self._pending_lock:
+            for message_id in self._executing:
+                self._pending[message_id].put(
+                    {"msg_type": msg_type, "parent_header": {"msg_id": message_id}, "content": content}
+                )
 
-    def _on_message(self, ws: WebSocketApp, message: str) -> None:
-        self._message_queue.put(message)
+    def _on_message(self, ws: WebSocketApp, message: str | bytes) -> None:
+        if isinstance(message, bytes):
+            message = message.decode("utf-8")
+        data = cast(dict[str, Any], json.loads(message))
+
+        if data.get("msg_type") == "status":
+            execution_state = data.get("content", {}).get("execution_state")
+            if execution_state in ("starting", "restarting", "dead"):
+                self._ready = False
+            if execution_state in ("restarting", "dead"):
+                # sent by the server when the kernel died (e.g. OOM-killed): running executions will never complete
+                self._notify_executing(self._KERNEL_DEAD)
+
+        parent_id = data.get("parent_header", {}).get("msg_id")
+        with self._pending_lock:
+            pending = self._pending.get(parent_id)
+        if pending is not None:
+            pending.put(data)
+        else:
+            log.debug(f"Dropping message {data.get('msg_type')} for unknown request {parent_id}")
 
     def _on_error(self, ws: WebSocketApp, error: Any) -> None:
-        print(f"WebSocket error: {error}")
+        log.warning(f"WebSocket error: {error}")
 
     def _on_close(self, ws: WebSocketApp, close_status_code: int, close_msg: str) -> None:
-        pass
+        if not self._stopped:
+            log.warning(f"Kernel websocket closed ({close_status_code}: {close_msg})")
 
     def __enter__(self) -> Self:
         return self
@@ -184,6 +305,7 @@ class JupyterKernelClient:
         self.stop()
 
     def stop(self) -> None:
+        self._stopped = True
         if self._ws_app:
             _ws_app = self._ws_app
             self._ws_app = None
@@ -207,37 +329,92 @@ class JupyterKernelClient:
             "metadata": {},
             "buffers": {},
         }
-        # self._websocket.send_text(json.dumps(message))
+        # register before sending, so that no reply can be missed
+        with self._pending_lock:
+            self._pending[message_id] = queue.Queue()
+            if message_type == "execute_request":
+                self._executing.add(message_id)
+        if not self._connected_event.wait(timeout=self._connect_timeout) or self._ws_app is None:
+            self._release(message_id)
+            raise ConnectionError("Not connected to the kernel.")
         self._ws_app.send(json.dumps(message))
         return message_id
 
-    def _receive_message(self, timeout_seconds: float | None) -> dict[str, Any] | None:
+    def _receive_message(self, message_id: str, deadline: float) -> dict[str, Any] | None:
+        """Wait for the next message answering `message_id`, until the `deadline` (monotonic clock)."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
         try:
-            data = self._message_queue.get(timeout=timeout_seconds)
-            if isinstance(data, bytes):
-                data = data.decode("utf-8")
-            return cast(dict[str, Any], json.loads(data))
+            return self._pending[message_id].get(timeout=remaining)
         except queue.Empty:
             return None
 
+    def _release(self, message_id: str) -> None:
+        with self._pending_lock:
+            self._pending.pop(message_id, None)
+            self._executing.discard(message_id)
+
     def wait_for_ready(self, timeout_seconds: float | None = None) -> bool:
+        if self._ready:
+            return True
+        if timeout_seconds is None:
+            timeout_seconds = self._connect_timeout
+        deadline = time.monotonic() + timeout_seconds
+
         message_id = self._send_message(content={}, channel="shell", message_type="kernel_info_request")
-        while True:
-            message = self._receive_message(timeout_seconds)
-            # This means we timed out with no new messages.
-            if message is None:
-                return False
-            if (
-                message.get("parent_header", {}).get("msg_id") == message_id
-                and message["msg_type"] == "kernel_info_reply"
-            ):
-                return True
-
-    def execute(self, code: str, timeout_seconds: float | None = None) -> ExecutionResult:
+        try:
+            while True:
+                message = self._receive_message(message_id, deadline)
+                # This means we timed out with no new messages.
+                if message is None:
+                    return False
+                if message["msg_type"] == "kernel_info_reply":
+                    self._ready = True
+                    return True
+        finally:
+            self._release(message_id)
+
+    def _recover_last_output(self, deadline: float) -> list[str]:
+        """Output (result only, the kernel does not record streams) of the last execution, from the kernel history."""
+        message_id = self._send_message(
+            content={"output": True, "raw": True, "hist_access_type": "tail", "n": 1},
+            channel="shell",
+            message_type="history_request",
+        )
+        try:
+            while True:
+                message = self._receive_message(message_id, min(deadline, time.monotonic() + 60))
+                if message is None:
+                    return []
+                if message["msg_type"] == "history_reply":
+                    output = []
+                    for _, _, (_, result) in message["content"].get("history", []):
+                        if result is not None:
+                            output.append(result)
+                    return output
+        finally:
+            self._release(message_id)
+
+    def execute(
+        self,
+        code: str,
+        timeout_seconds: float | None = None,
+        on_data: Callable[[ExecutionResult.DataItem], None] | None = None,
+    ) -> ExecutionResult:
+        """
+        Execute `code` in the kernel and collect its output.
+
+        Args:
+            code (str): The code to execute.
+            timeout_seconds (float | None): Maximum execution time. Defaults to 7 days.
+            on_data (Callable | None): If given, non-text display data is passed to this callback as soon as it is
+                received instead of being accumulated in the result. Used to stream large payloads.
+        """
         if timeout_seconds is None:
             # Default to 7 days
             timeout_seconds = 7 * 24 * 60 * 60
-        time_cycle = max(7, min(self._time_cycle, timeout_seconds / 5))
+        deadline = time.monotonic() + timeout_seconds
 
         message_id = self._send_message(
             content={
@@ -251,48 +428,69 @@ class JupyterKernelClient:
             channel="shell",
             message_type="execute_request",
         )
-
-        start_time = time.monotonic()
-
+        try:
+            return self._collect_execution(message_id, deadline, on_data)
+        finally:
+            self._release(message_id)
+
+    def _collect_execution(
+        self,
+        message_id: str,
+        deadline: float,
+        on_data: Callable[[ExecutionResult.DataItem], None] | None,
+    ) -> ExecutionResult:
         text_output = []
         data_output = []
         while True:
-            # check if we timed out
-            message = self._receive_message(time_cycle)
+            message = self._receive_message(message_id, deadline)
 
-            if time.monotonic() - start_time > timeout_seconds:
-                log.info(f"\033[90m Timeout waiting for output from code block. \033[0m")
-                result = JupyterKernelClient.ExecutionResult(
+            if message is None:
+                log.info("Timeout waiting for output from code block.")
+                return JupyterKernelClient.ExecutionResult(
                     is_ok=False,
                     output=["ERROR: Timeout waiting for output from code block."],
                     data_items=[],
                     timed_out=True,
                 )
-                return result
 
-            if message is None:
-                log.info(f"\033[90m No stream received for {time_cycle} \033[0m")
-                continue
+            msg_type = message.get("msg_type")
+            content = message.get("content")
 
-            # Ignore messages that are not for this execution.
-            if message.get("parent_header", {}).get("msg_id") != message_id:
-                log.info(
-                    f"\033[90m Skipping; Message not for this execution: {message.get('parent_header', {}).get('msg_id')} != {message_id} \033[0m"
+            if msg_type == self._KERNEL_DEAD:
+                return JupyterKernelClient.ExecutionResult(
+                    is_ok=False,
+                    output=[
+                        "ERROR: The kernel died during the execution (e.g. it ran out of memory).\n",
+                        *text_output,
+                    ],
+                    data_items=[],
+                    kernel_lost=True,
                 )
-                continue
 
-            msg_type = message.get("msg_type")
-            content = message.get("content")
+            if msg_type == self._CONNECTION_LOST:
+                return JupyterKernelClient.ExecutionResult(
+                    is_ok=False,
+                    output=["ERROR: The connection to the kernel was lost during the execution.\n", *text_output],
+                    data_items=[],
+                    kernel_lost=True,
+                )
 
-            log.info(f"\033[90m Received message: {msg_type} \033[0m")
+            if msg_type == self._RESUMED:
+                if content.get("execution_state") != "idle":
+                    # still running: its remaining output comes through the new connection
+                    continue
+                # the execution completed while we were disconnected and its end was not replayed
+                log.warning("The execution completed while disconnected, recovering its result from the history.")
+                text_output.extend(self._recover_last_output(deadline))
+                text_output.append(
+                    "\nWARNING: the connection to the kernel was interrupted, the output may be incomplete.\n"
+                )
+                break
 
             if msg_type == "status":
                 if content["execution_state"] == "idle":
-                    log.info(f"\033[90m Stopping the loop; Execution_state is idle \033[0m")
                     break
-                if content["execution_state"] == "busy":
-                    log.info(f"\033[90m Kernel became busy with work\033[0m")
-                    continue
+                continue
 
             if msg_type == "error":
                 # Output is an error.
@@ -306,20 +504,17 @@ class JupyterKernelClient:
                 for data_type, data in content["data"].items():
                     if data_type == "text/plain":
                         text_output.append(data)
+                    elif on_data is not None:
+                        on_data(self.ExecutionResult.DataItem(mime_type=data_type, data=data))
                     else:
                         data_output.append(self.ExecutionResult.DataItem(mime_type=data_type, data=data))
                 continue
 
             if msg_type == "stream":
-                chunk = content["text"]
-                text_output.append(chunk)
-                indented_chunk = indent(chunk, "... ", lambda line: True).strip()
-                log.info(f"\033[90m Stream output (length={len(chunk)} chars):\n{indented_chunk}\033[0m")
+                text_output.append(content["text"])
                 continue
 
-            if msg_type == "execute_input":
-                pass  # skip this one
-
-            log.info(f"\033[90m Unknown message type, will not handle: {msg_type}\033[0m")
+            if msg_type not in ("execute_input", "execute_reply"):
+                log.debug(f"Unknown message type, will not handle: {msg_type}")
 
         return JupyterKernelClient.ExecutionResult(is_ok=True, output=text_output, data_items=data_output)
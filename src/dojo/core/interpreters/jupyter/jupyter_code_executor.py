@@ -10,6 +10,8 @@
 # https://github.com/microsoft/autogen/blob/main/LICENSE-CODE
 
 import base64
+import hashlib
+import io
 import json
 import os
 import sys
@@ -33,12 +35,119 @@ from .base import CodeBlock, CodeExecutor, CodeExtractor, IPythonCodeResult, Cod
 # from ..utils import silence_pip
 from .base import JupyterConnectable, JupyterConnectionInfo
 from .jupyter_client import JupyterClient
-from ..base import ExecutionResult
+from ..base import PROCESS_DIED, ExecutionResult
 
 import logging
 
 log = logging.getLogger(__name__)
 
+# mime types of the display data used to stream files out of the kernel
+FILE_CHUNK_MIME = "application/vnd.dojo.file-chunk+json"
+FILE_END_MIME = "application/vnd.dojo.file-end+json"
+
+# executed in the kernel: streams the file in base64-encoded chunks, each with its own checksum
+_STREAM_FILE_CODE = """
+def _dojo_stream_file(filename, chunk_size):
+    import base64
+    import hashlib
+    from IPython.display import publish_display_data
+
+    total = hashlib.sha256()
+    index = size = 0
+    with open(filename, "rb") as f:
+        while chunk := f.read(chunk_size):
+            total.update(chunk)
+            size += len(chunk)
+            publish_display_data(
+                data={
+                    "%(chunk_mime)s": {
+                        "index": index,
+                        "sha256": hashlib.sha256(chunk).hexdigest(),
+                        "data": base64.b64encode(chunk).decode("ascii"),
+                    }
+                }
+            )
+            index += 1
+    publish_display_data(data={"%(end_mime)s": {"chunks": index, "size": size, "sha256": total.hexdigest()}})
+""" % {"chunk_mime": FILE_CHUNK_MIME, "end_mime": FILE_END_MIME}
+
+
+# executed in the kernel: imports packages ahead of the agent code and initializes CUDA, without leaking names
+_WARM_UP_CODE = """
+def _dojo_warm_up(packages, cuda):
+    import importlib
+    import time
+
+    for name in packages:
+        start = time.monotonic()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"[warm-up] could not import {name}: {type(e).__name__}: {e}")
+            continue
+        print(f"[warm-up] imported {name} in {time.monotonic() - start:.1f}s")
+    if cuda:
+        try:
+            import torch
+
+            if torch.cuda.is_available():
+                for device in range(torch.cuda.device_count()):
+                    torch.zeros(1, device=f"cuda:{device}")
+                print(f"[warm-up] initialized {torch.cuda.device_count()} CUDA device(s)")
+        except Exception as e:
+            print(f"[warm-up] could not initialize CUDA: {type(e).__name__}: {e}")
+"""
+
+
+# executed in the kernel: same limits as `resource_limits.apply_process_limits`, applied to the kernel process
+_LIMITS_CODE = """
+def _dojo_apply_limits(memory_limit_mb, cpu_affinity):
+    import os
+    import resource
+
+    if memory_limit_mb is not None:
+        limit = int(memory_limit_mb) * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    if cpu_affinity:
+        os.sched_setaffinity(0, set(cpu_affinity))
+"""
+
+
+class _FileReceiver:
+    """Writes the chunks streamed by `_dojo_stream_file` to a file object, verifying their checksums."""
+
+    def __init__(self, f) -> None:
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.chunks = 0
+        self.end: dict | None = None
+
+    def __call__(self, item) -> None:
+        if item.mime_type == FILE_CHUNK_MIME:
+            chunk = base64.b64decode(item.data["data"])
+            if item.data["index"] != self.chunks or hashlib.sha256(chunk).hexdigest() != item.data["sha256"]:
+                raise IOError(f"Corrupted or out-of-order chunk {item.data['index']} (expected {self.chunks}).")
+            self.f.write(chunk)
+            self.sha256.update(chunk)
+            self.size += len(chunk)
+            self.chunks += 1
+        elif item.mime_type == FILE_END_MIME:
+            self.end = item.data
+
+    def verify(self) -> None:
+        if self.end is None:
+            raise IOError("The file transfer did not complete.")
+        if (self.end["chunks"], self.end["size"], self.end["sha256"]) != (
+            self.chunks,
+            self.size,
+            self.sha256.hexdigest(),
+        ):
+            raise IOError(f"Checksum mismatch after receiving {self.size} bytes.")
+
 
 class JupyterCodeExecutor(CodeExecutor):
     def __init__(
@@ -47,6 +156,9 @@ class JupyterCodeExecutor(CodeExecutor):
         kernel_name: str | None = None,
         timeout: int = 60,
         output_dir: Union[Path, str] = Path(),
+        cwd: str | None = None,
+        memory_limit_mb: int | None = None,
+        cpu_affinity: list[int] | None = None,
     ):
         """(Experimental) A code executor class that executes code statefully using
         a Jupyter server supplied to this class.
@@ -60,6 +172,9 @@ class JupyterCodeExecutor(CodeExecutor):
             kernel_name (str | None): The kernel name to use. Make sure it is installed.
                 By default, it choses default from kernelspecs.
             output_dir (str): The directory to save output files, by default ".".
+            cwd (str | None): Directory the kernel changes into after starting, by default the kernel's own.
+            memory_limit_mb (int | None): Address-space limit (RLIMIT_AS) of the kernel and its children, in MB.
+            cpu_affinity (list[int] | None): CPU ids the kernel is pinned to.
         """
         if timeout < 1:
             raise ValueError("Timeout must be greater than or equal to 1.")
@@ -94,12 +209,55 @@ class JupyterCodeExecutor(CodeExecutor):
         self._timeout = timeout
         self._wait_timeout = 120
         self._fetch_file_timeout = 1800
+        self._fetch_chunk_size = 8 * 1024 * 1024
         self._output_dir = output_dir
+        self._cwd = cwd
+        self._memory_limit_mb = memory_limit_mb
+        self._cpu_affinity = cpu_affinity
+        self._change_dir()
+        self._apply_limits()
+
+    def _change_dir(self) -> None:
+        if self._cwd is None:
+            return
+        result = self._jupyter_kernel_client.execute(f"import os; os.chdir({self._cwd!r})", timeout_seconds=60)
+        if not result.is_ok:
+            raise RuntimeError(f"Failed to change the kernel directory to {self._cwd}: {result.output}")
+
+    def _apply_limits(self) -> None:
+        # applied from inside the kernel, as kernels sharing a gateway cannot be limited from the outside
+        if self._memory_limit_mb is None and not self._cpu_affinity:
+            return
+        code = _LIMITS_CODE + f"\n_dojo_apply_limits({self._memory_limit_mb!r}, {self._cpu_affinity!r})\n"
+        code += "del _dojo_apply_limits\n"
+        result = self._jupyter_kernel_client.execute(code, timeout_seconds=60)
+        if not result.is_ok:
+            raise RuntimeError(f"Failed to apply the resource limits of the kernel: {result.output}")
+
+    def warm_up(self, packages: list[str], cuda: bool = False, timeout: int = 600) -> None:
+        """
+        Import `packages` in the kernel (and initialize the CUDA devices if `cuda`), so that the first imports of the
+        agent code are served from `sys.modules`. Failures are logged, never raised.
+        """
+        if not packages and not cuda:
+            return
+        start_time = time.monotonic()
+        code = _WARM_UP_CODE + f"\n_dojo_warm_up({list(packages)!r}, {bool(cuda)!r})\ndel _dojo_warm_up\n"
+        result = self._jupyter_kernel_client.execute(code, timeout_seconds=timeout)
+        if result.timed_out:
+            self._jupyter_client.interrupt_kernel(self._kernel_id)
+        if not result.is_ok:
+            log.warning(f"Kernel warm-up failed: {''.join(result.output)}")
+            return
+        log.debug("".join(result.output))
+        log.info(f"Kernel {self._kernel_id} warmed up in {time.monotonic() - start_time:.1f}s")
 
-    def execute_code(self, code: str) -> ExecutionResult:
+    def execute_code(self, code: str, timeout: float | None = None) -> ExecutionResult:
         start_time = time.monotonic()
+        if timeout is None:
+            timeout = self._timeout
 
-        log.warning(f"Waiting for ready")
+        log.debug(f"Waiting for ready")
         ready = self._jupyter_kernel_client.wait_for_ready(timeout_seconds=self._wait_timeout)
         if not ready:
             log.warning("Kernel did not become ready in time.")
@@ -109,15 +267,13 @@ class JupyterCodeExecutor(CodeExecutor):
                 exec_time=time.monotonic() - start_time,
                 timed_out=True,
             )
-        log.warning(f"Ready")
         output_lines = []
         # output_file = None
 
-        log.warning(f"Executing code")
-        result = self._jupyter_kernel_client.execute(code, timeout_seconds=self._timeout)
-        log.warning(f"Done Executing code")
+        log.debug(f"Executing code")
+        result = self._jupyter_kernel_client.execute(code, timeout_seconds=timeout)
         elapsed_time = time.monotonic() - start_time
-        log.warning(f"Execution time: {elapsed_time:.2f} seconds")
+        log.debug(f"Execution time: {elapsed_time:.2f} seconds")
 
         if result.timed_out:
             log.warning("Execution timed out. Interrupting the kernel.")
@@ -131,18 +287,18 @@ class JupyterCodeExecutor(CodeExecutor):
                 exit_code=1,
                 exec_time=elapsed_time,
                 timed_out=result.timed_out,
+                exc_type=PROCESS_DIED if result.kernel_lost else None,
             )
 
         output_lines = result.output
 
         for data in result.data_items:
-            log.warning(f"Data item detected: {data.mime_type}")
+            log.debug(f"Data item detected: {data.mime_type}")
             if data.mime_type == "application/octet-stream":
                 output_lines = [data.data]
             else:
                 output_lines.append(json.dumps(data.data))
 
-        log.warning("All good, returning output, with exit code 0")
         return ExecutionResult(
             term_out=output_lines,
             exit_code=0,
@@ -153,56 +309,75 @@ class JupyterCodeExecutor(CodeExecutor):
     def fetch_file(
         self,
         filename: str,
-    ) -> bytes:
-        code = """
-        def publish_blob(filename):
-            import base64
-            from IPython.display import publish_display_data
-
-            with open(filename, "rb") as f:
-                file_data = f.read()
+        destination: Path | None = None,
+    ) -> bytes | Path:
+        """
+        Fetch a file from the kernel's file system. The file is streamed in checksummed chunks, so that memory usage
+        stays bounded by the chunk size when a destination is given.
 
-            b64_data = base64.b64encode(file_data).decode("utf-8")
+        Args:
+            filename (str): Path of the file, relative to the working directory of the kernel.
+            destination (Path | None): Local path the file is written to. If None, the contents are returned.
 
-            publish_display_data(
-                data={"application/octet-stream": b64_data},
-                metadata={"application/octet-stream": {"fileName": filename}}
-            )"""
-        code += f"""
-        publish_blob('{filename}')
+        Returns:
+            bytes | Path: The contents of the file, or `destination` if it was given.
         """
+        # remove the helper from the namespace of the agent, even if the file cannot be read
+        code = _STREAM_FILE_CODE + (
+            f"\ntry:\n    _dojo_stream_file({str(filename)!r}, {self._fetch_chunk_size})\n"
+            "finally:\n    del _dojo_stream_file\n"
+        )
         log.warning(f"Waiting kernel to be ready")
         ready = self._jupyter_kernel_client.wait_for_ready(timeout_seconds=self._wait_timeout)
         if not ready:
             log.warning("Kernel did not become ready in time.")
             raise TimeoutError("Kernel did not become ready in time.")
 
-        log.warning(f"Kernel is ready, executing code")
-        result = self._jupyter_kernel_client.execute(code, timeout_seconds=self._fetch_file_timeout)
-
-        if result.timed_out:
-            log.warning("Execution timed out. Interrupting the kernel.")
-            self._jupyter_client.interrupt_kernel(self._kernel_id)
-            log.warning("Kernel interrupted successfully.")
-            raise TimeoutError("Kernel did not become ready in time.")
+        if destination is not None:
+            destination = Path(destination)
+            tmp_destination = destination.with_name(f".{destination.name}.{uuid.uuid4().hex}.part")
+            f = open(tmp_destination, "wb")
+        else:
+            f = io.BytesIO()
 
-        log.warning(
-            f"Done executing code; result.is_ok: {result.is_ok}, len(result.data_items): {len(result.data_items)}"
-        )
-        if not result.is_ok or len(result.data_items) != 1:
-            raise FileNotFoundError(f"File {filename} not found.")
+        try:
+            receiver = _FileReceiver(f)
+            log.warning(f"Kernel is ready, streaming {filename}")
+            result = self._jupyter_kernel_client.execute(
+                code, timeout_seconds=self._fetch_file_timeout, on_data=receiver
+            )
 
-        data_item = result.data_items[0]
-        buffer = base64.b64decode(data_item.data)
-        log.warning(f"Size of decoded data: {len(buffer)}")
-        return buffer
+            if result.timed_out:
+                log.warning("Execution timed out. Interrupting the kernel.")
+                self._jupyter_client.interrupt_kernel(self._kernel_id)
+                log.warning("Kernel interrupted successfully.")
+                raise TimeoutError("Kernel did not become ready in time.")
+
+            log.warning(f"Done streaming {filename}; result.is_ok: {result.is_ok}, received {receiver.size} bytes")
+            if not result.is_ok:
+                raise FileNotFoundError(f"File {filename} not found.")
+            receiver.verify()
+
+            if destination is None:
+                return f.getvalue()
+            f.close()
+            os.replace(tmp_destination, destination)
+            return destination
+        finally:
+            f.close()
+            if destination is not None and tmp_destination.exists():
+                tmp_destination.unlink()
 
     def restart(self) -> None:
         """(Experimental) Restart a new session."""
         log.warning(f"Restarting kernel {self._kernel_id}")
         self._jupyter_client.restart_kernel(self._kernel_id)
         log.warning(f"Kernel {self._kernel_id} restarted")
+        # the old client would otherwise keep trying to reconnect
+        self._jupyter_kernel_client.stop()
         self._jupyter_kernel_client = self._jupyter_client.get_kernel_client(self._kernel_id)
+        self._change_dir()
+        self._apply_limits()
 
     def stop(self) -> None:
         """Stop the kernel."""
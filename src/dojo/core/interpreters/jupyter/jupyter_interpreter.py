@@ -7,15 +7,20 @@
 import logging
 import os
 import re
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 import humanize
 
 from dojo.config_dataclasses.interpreter.jupyter import JupyterInterpreterConfig
 from dojo.core.interpreters.base import ExecutionResult, Interpreter
+from dojo.core.interpreters.data_cache import DataCache
+from dojo.utils.deadline import Deadline
 
 from .apptainer_jupyter_server import ApptainerJupyterServer
 from .jupyter_code_executor import JupyterCodeExecutor
+from .local_jupyter_server import LocalJupyterServer
+from .shared_gateway import SharedGatewayServer
 
 log = logging.getLogger(__name__)
 
@@ -43,27 +48,115 @@ class JupyterInterpreter(Interpreter):
             log.info(f"Working directory {self.working_dir} does not exist -- creating it")
             self.working_dir.mkdir(parents=True, exist_ok=True)
 
+        self.data_lease = None
         if data_dir is not None:
             # assume the data_dir is ready to be binded to the container
             self.data_dir = Path(data_dir).resolve()
+            if cfg.data_cache_dir is not None:
+                # bind the copy staged on the node-local data cache instead of the original
+                data_cache = DataCache(cfg.data_cache_dir, max_size_mb=cfg.data_cache_max_size_mb)
+                self.data_lease = data_cache.stage(self.data_dir)
+                self.data_dir = self.data_lease.path
         else:
             # otherwise create it within the local folder of the run mimicing the working directory of the agent
             self.data_dir = self.working_dir / "data"
             self.data_dir.mkdir(parents=True, exist_ok=True)
 
-        self.jupyter_server = ApptainerJupyterServer(
-            bind_inputs_dir=self.data_dir,
-            superimage_directory=self.superimage_directory,
-            superimage_version=self.superimage_version,
-            read_only_overlays=self.read_only_overlays,
-            read_only_binds=self.read_only_binds,
-            env=self.env,
-        )
+        # if the working dir is mounted in the container, files can be read and deleted directly on the host
+        self.mounted_workspace = cfg.mount_working_dir
+        self.kernel_cwd = None
+        if cfg.server == "local":
+            # kernels run on the host, directly in the working dir
+            self.mounted_workspace = True
+            self.jupyter_server = LocalJupyterServer(
+                working_dir=self.working_dir,
+                bind_inputs_dir=self.data_dir if data_dir is not None else None,
+                env=self.env,
+            )
+            self.kernel_cwd = self.working_dir.as_posix()
+        elif cfg.shared_gateway:
+            # kernels of a host-wide gateway work in the run's working dir, which is always mounted
+            self.mounted_workspace = True
+            self.jupyter_server = SharedGatewayServer(
+                registry_dir=cfg.shared_gateway_dir,
+                # never a common dir by default: the runs sharing the gateway can access each other's workspaces
+                workspace_root=cfg.shared_workspace_root or self.working_dir,
+                data_root=cfg.shared_data_root or cfg.data_cache_dir,
+                superimage_directory=self.superimage_directory,
+                superimage_version=self.superimage_version,
+                read_only_overlays=self.read_only_overlays,
+                read_only_binds=self.read_only_binds,
+                env=self.env,
+            )
+            self.kernel_cwd = self.jupyter_server.container_path(self.working_dir)
+            if data_dir is not None:
+                self._link_shared_data()
+        else:
+            self.jupyter_server = ApptainerJupyterServer(
+                bind_inputs_dir=self.data_dir,
+                superimage_directory=self.superimage_directory,
+                superimage_version=self.superimage_version,
+                read_only_overlays=self.read_only_overlays,
+                read_only_binds=self.read_only_binds,
+                env=self.env,
+                bind_working_dir=self.working_dir if self.mounted_workspace else None,
+            )
+            if self.mounted_workspace:
+                self.kernel_cwd = ApptainerJupyterServer.CONTAINER_WORKING_DIR
+        self.memory_limit_mb = cfg.memory_limit_mb
+        self.cpu_affinity = cfg.cpu_affinity
         self.code_executor = None
 
+        # imports done in every new kernel before it is handed out; on the spare kernel, this overlaps with the LLM
+        self.warmup_packages = list(cfg.warmup_packages or [])
+        self.warmup_cuda = cfg.warmup_cuda
+        self.warmup_timeout = cfg.warmup_timeout
+
+        # a spare kernel is started in the background so that resetting the session does not wait for a kernel
+        self.spare_kernel = cfg.spare_kernel
+        self._spare: Future | None = None
+        self._spare_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spare-kernel")
+
+    def _link_shared_data(self) -> None:
+        # the link points to the data as seen from the container: it is only meant to be followed in there
+        link = self.working_dir / "data"
+        target = self.jupyter_server.container_path(self.data_dir)
+        if link.is_symlink():
+            link.unlink()
+        elif link.is_dir() and not any(link.iterdir()):
+            link.rmdir()
+        elif link.exists():
+            log.warning(f"{link} already exists, the data will not be linked into the working directory")
+            return
+        link.symlink_to(target)
+
+    def _new_code_executor(self) -> JupyterCodeExecutor:
+        code_executor = JupyterCodeExecutor(
+            self.jupyter_server,
+            timeout=self.timeout,
+            cwd=self.kernel_cwd,
+            memory_limit_mb=self.memory_limit_mb,
+            cpu_affinity=self.cpu_affinity,
+        )
+        code_executor.warm_up(self.warmup_packages, cuda=self.warmup_cuda, timeout=self.warmup_timeout)
+        return code_executor
+
+    def _take_spare(self) -> JupyterCodeExecutor | None:
+        spare, self._spare = self._spare, None
+        if spare is None:
+            return None
+        try:
+            # waiting for a spare that is still starting is never slower than starting a new kernel
+            return spare.result()
+        except Exception as e:
+            log.warning(f"Spare kernel failed to start: {e}")
+            return None
+
     def create_process(self) -> None:
         self.cleanup_session()
-        self.code_executor = JupyterCodeExecutor(self.jupyter_server, timeout=self.timeout)
+        self.code_executor = self._take_spare() or self._new_code_executor()
+        if self.spare_kernel:
+            self._spare = self._spare_pool.submit(self._new_code_executor)
 
     def fetch_file(
         self,
@@ -72,11 +165,15 @@ class JupyterInterpreter(Interpreter):
         # first we find what would be the relative path to the file
         # from the working directory
         ppath = Path(path).resolve()
+        if self.mounted_workspace:
+            # the container writes directly into the working dir on the host
+            return ppath.as_posix() if ppath.exists() else None
+
         relative_path = ppath.relative_to(self.working_dir)
         try:
             log.info(f"Fetching the file {ppath}")
             assert isinstance(self.code_executor, JupyterCodeExecutor)
-            contents = self.code_executor.fetch_file(relative_path)
+            self.code_executor.fetch_file(relative_path, destination=ppath)
             log.info("File successfully fetched.")
         except FileNotFoundError:
             log.warning(f"File {ppath} not found in the working directory.")
@@ -84,9 +181,9 @@ class JupyterInterpreter(Interpreter):
         except TimeoutError:
             log.warning(f"Kernel timed out while fetching the file.")
             return None
-
-        with open(ppath, "wb") as f:
-            f.write(contents)
+        except IOError as e:
+            log.warning(f"Failed to transfer the file: {e}")
+            return None
 
         return ppath.as_posix()
 
@@ -103,7 +200,9 @@ class JupyterInterpreter(Interpreter):
         file_name: str = "runfile.py",
         execute_code: bool = True,
         include_exec_time: bool = True,
+        deadline: Deadline | None = None,
     ) -> ExecutionResult:
+        timeout = self.timeout if deadline is None else deadline.clip(self.timeout)
         if reset_session or self.code_executor is None:
             self.create_process()
 
@@ -116,16 +215,16 @@ class JupyterInterpreter(Interpreter):
             return results
 
         log.info(f"Executing code:\n```\npython\n{code}\n```")
-        results = self.code_executor.execute_code(code)
+        results = self.code_executor.execute_code(code, timeout=timeout)
         log.info(f"Code execution finished.")
 
         outputs = [self.cleanup_line(line) for line in results.term_out.copy()]
         # if we timed out, show that in the output
         if results.timed_out:
-            outputs.append(f"TimeoutError: Execution exceeded the time limit of {humanize.naturaldelta(self.timeout)}")
+            outputs.append(f"TimeoutError: Execution exceeded the time limit of {humanize.naturaldelta(timeout)}")
         elif include_exec_time:
             outputs.append(
-                f"Execution time: {humanize.naturaldelta(results.exec_time)} (time limit is {humanize.naturaldelta(self.timeout)})."
+                f"Execution time: {humanize.naturaldelta(results.exec_time)} (time limit is {humanize.naturaldelta(timeout)})."
             )
 
         return ExecutionResult(
@@ -134,6 +233,8 @@ class JupyterInterpreter(Interpreter):
             exec_time=results.exec_time,
             eval_return=results.eval_return,
             timed_out=results.timed_out,
+            exc_type=results.exc_type,
+            exc_info=results.exc_info,
         )
 
     def cleanup_session(self) -> None:
@@ -145,10 +246,23 @@ class JupyterInterpreter(Interpreter):
 
     def close(self):
         self.cleanup_session()
+        spare = self._take_spare()
+        if spare is not None:
+            spare.stop()
+        self._spare_pool.shutdown(wait=False)
         self.jupyter_server.stop()
+        if self.data_lease is not None:
+            self.data_lease.release()
+            self.data_lease = None
 
 
 class JupyterInterpreterFactory(Interpreter):
+    """
+    Creates the `JupyterInterpreter` lazily. By default (`reuse_gateway`), a single container and kernel gateway is
+    kept for the whole run and resetting the session only replaces the kernel. Otherwise, every session reset tears
+    down the whole container.
+    """
+
     local = False
     factory = True
 
@@ -174,6 +288,10 @@ class JupyterInterpreterFactory(Interpreter):
         self.read_only_overlays = cfg.read_only_overlays
         self.read_only_binds = cfg.read_only_binds
         self.env = cfg.env
+        self.reuse_gateway = cfg.reuse_gateway
+        self.mounted_workspace = cfg.mount_working_dir
+        # with a long-lived gateway, the interpreter is not closed after every step (see `MLEBenchTask.step_task`)
+        self.factory = not self.reuse_gateway
 
         self._instance = None
 
@@ -204,7 +322,20 @@ class JupyterInterpreterFactory(Interpreter):
         file_name: str = "runfile.py",
         execute_code: bool = True,
         include_exec_time: bool = True,
+        deadline: Deadline | None = None,
     ) -> ExecutionResult:
+        if self.reuse_gateway:
+            # only the kernel is reset, the container and the gateway are kept alive
+            return self.instance.run(
+                code,
+                reset_session=reset_session,
+                persist_file=persist_file,
+                file_name=file_name,
+                execute_code=execute_code,
+                include_exec_time=include_exec_time,
+                deadline=deadline,
+            )
+
         if reset_session:
             self.reset_session()
 
@@ -215,9 +346,14 @@ class JupyterInterpreterFactory(Interpreter):
             file_name=file_name,
             execute_code=execute_code,
             include_exec_time=include_exec_time,
+            deadline=deadline,
         )
 
     def cleanup_session(self) -> None:
+        if self.reuse_gateway:
+            if self._instance is not None:
+                self._instance.cleanup_session()
+            return
         self.reset_session()
 
     def close(self):
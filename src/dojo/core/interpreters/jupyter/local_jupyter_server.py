@@ -0,0 +1,164 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+A kernel gateway running directly on the host, without Apptainer or a superimage.
+
+It is a drop-in replacement for `ApptainerJupyterServer` to test and benchmark the Jupyter interpreter stack on a
+plain Linux box: the kernels run in the current Python environment (which needs `jupyter_kernel_gateway` and
+`ipykernel`), in the working dir, with the data linked into it. There is no isolation from the host.
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from types import TracebackType
+from typing import Dict
+
+from .apptainer_jupyter_server import GATEWAY_READY_PATTERN
+from .base import JupyterConnectable, JupyterConnectionInfo
+from .jupyter_client import JupyterClient
+
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalJupyterServer(JupyterConnectable):
+    """
+    Args:
+        working_dir (Path | str): Directory the kernels start in.
+        bind_inputs_dir (Path | str | None): Data directory, symlinked as `data` into the working dir.
+        env (Dict[str, str] | None): Environment variables set for the gateway and its kernels.
+        start_timeout (int): Maximum time to wait for the gateway to accept connections, in seconds.
+    """
+
+    def __init__(
+        self,
+        working_dir: Path | str,
+        bind_inputs_dir: Path | str | None = None,
+        env: Dict[str, str] | None = None,
+        start_timeout: int = 120,
+    ):
+        self._subprocess = None
+        self.working_dir = Path(working_dir).resolve()
+        self.working_dir.mkdir(parents=True, exist_ok=True)
+        if bind_inputs_dir is not None:
+            data_link = self.working_dir / "data"
+            if not data_link.exists() and not data_link.is_symlink():
+                data_link.symlink_to(Path(bind_inputs_dir).resolve(), target_is_directory=True)
+
+        self.token = secrets.token_hex(32)
+        self.ip = "127.0.0.1"
+        self.port = _free_port()
+
+        args = [
+            sys.executable,
+            "-m",
+            "jupyter",
+            "kernelgateway",
+            "--KernelGatewayApp.ip",
+            self.ip,
+            "--KernelGatewayApp.port",
+            str(self.port),
+            "--KernelGatewayApp.auth_token",
+            self.token,
+            "--JupyterApp.answer_yes=True",
+            "--JupyterWebsocketPersonality.list_kernels=True",
+            "--KernelGatewayApp.answer_yes=True",
+            "--KernelManager.cache_ports=False",
+        ]
+        process_env = os.environ.copy()
+        process_env.update(env or {})
+
+        log.info(f"Starting a local Jupyter gateway on port {self.port} in {self.working_dir}")
+        self._subprocess = subprocess.Popen(
+            args,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            start_new_session=True,
+            env=process_env,
+            cwd=self.working_dir,
+        )
+
+        assert self._subprocess.stderr is not None
+        deadline = time.monotonic() + start_timeout
+        stderr = ""
+        while True:
+            line = self._subprocess.stderr.readline()
+            stderr += line
+            if GATEWAY_READY_PATTERN.search(line):
+                break
+            if self._subprocess.poll() is not None:
+                stderr += self._subprocess.stderr.read()
+                raise ValueError(f"Local Jupyter gateway failed to start. stderr:\n{stderr}")
+            if time.monotonic() > deadline:
+                self.stop()
+                raise TimeoutError(f"Local Jupyter gateway did not start within {start_timeout}s.")
+
+        # keep draining the logs of the gateway, a full pipe would block it
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+        atexit.register(self.stop)
+
+    def _drain_stderr(self) -> None:
+        process = self._subprocess
+        if process is None or process.stderr is None:
+            return
+        for line in process.stderr:
+            log.debug(line.rstrip("\n"))
+
+    def stop(self) -> None:
+        if self._subprocess is None:
+            return
+        process = self._subprocess
+        self._subprocess = None
+        if process.poll() is None:
+            os.killpg(process.pid, signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+        log.info("Local Jupyter gateway stopped.")
+
+    @property
+    def connection_info(self) -> JupyterConnectionInfo:
+        return JupyterConnectionInfo(
+            host=self.ip,
+            use_https=False,
+            port=self.port,
+            token=self.token,
+        )
+
+    def get_client(self) -> JupyterClient:
+        return JupyterClient(self.connection_info)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc_val: BaseException | None, exc_tb: TracebackType | None
+    ) -> None:
+        self.stop()
+
+    def __del__(self):
+        self.stop()
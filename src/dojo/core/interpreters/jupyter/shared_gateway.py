@@ -0,0 +1,265 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+A kernel gateway shared by all the runs of a host that use the same container setup.
+
+The first run starts the gateway (detached from its own process group, so that it outlives it) and records it
+in a JSON registry next to a lock file. Later runs find it in the registry and only take a lease on it. Every
+run then starts its own kernels on the shared gateway, working in its own directory. The last run releasing
+its lease stops the gateway.
+
+Since binds are fixed when the container starts, the gateway binds two common roots instead of per-run
+directories: a workspace root (read-write), under which the working dirs of all the runs must live, and a data
+root (read-only), under which their data dirs must live. The code run by any of them can access the whole workspace
+root, so only runs with the same workspace root share a gateway, and that root must only hold runs that may see each
+other's workspaces.
+"""
+
+from __future__ import annotations
+
+import atexit
+import fcntl
+import hashlib
+import json
+import os
+import secrets
+import signal
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import requests
+
+from .apptainer_jupyter_server import GATEWAY_READY_PATTERN, container_env, gateway_command
+from .base import JupyterConnectable, JupyterConnectionInfo
+
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedGatewayServer(JupyterConnectable):
+    """
+    A lease on a host-wide kernel gateway, started on first use.
+
+    Args:
+        registry_dir (Path | str): Host-local directory holding the lock, registry and log of the gateways.
+        workspace_root (Path | str): Host directory bound read-write at `CONTAINER_WORKSPACE_ROOT`.
+        data_root (Path | str): Host directory bound read-only at `CONTAINER_DATA_ROOT`.
+        start_timeout (int): Maximum time to wait for a new gateway to accept connections, in seconds.
+    """
+
+    CONTAINER_WORKSPACE_ROOT = "/root/shared/workspaces"
+    CONTAINER_DATA_ROOT = "/root/shared/data"
+
+    def __init__(
+        self,
+        registry_dir: Path | str,
+        workspace_root: Path | str,
+        data_root: Path | str,
+        superimage_directory: str | None = None,
+        superimage_version: str | None = None,
+        read_only_overlays: List[str] | None = None,
+        read_only_binds: Dict[str, str] | None = None,
+        env: Dict[str, str] | None = None,
+        start_timeout: int = 600,
+    ):
+        self.registry_dir = Path(registry_dir).resolve()
+        self.registry_dir.mkdir(parents=True, exist_ok=True)
+        self.workspace_root = Path(workspace_root).resolve()
+        self.data_root = Path(data_root).resolve()
+        self.superimage_directory = superimage_directory
+        self.superimage_version = superimage_version
+        self.read_only_overlays = [Path(path).resolve() for path in read_only_overlays or []]
+        self.read_only_binds = {
+            Path(k).resolve(): Path("/root") / Path(v) for k, v in (read_only_binds or {}).items()
+        }
+        self.env = env or {}
+        self.start_timeout = start_timeout
+
+        # runs can only share a gateway if their containers would be identical
+        key = json.dumps(
+            [
+                str(self.workspace_root),
+                str(self.data_root),
+                superimage_directory,
+                superimage_version,
+                sorted(str(p) for p in self.read_only_overlays),
+                sorted((str(k), str(v)) for k, v in self.read_only_binds.items()),
+                sorted(self.env.items()),
+            ]
+        )
+        self.key = hashlib.sha256(key.encode()).hexdigest()[:16]
+        self._registry_path = self.registry_dir / f"gateway-{self.key}.json"
+        self._log_path = self.registry_dir / f"gateway-{self.key}.log"
+
+        self._leased = False
+        # set if this process started the gateway, to reap it when stopping it
+        self._process: subprocess.Popen | None = None
+        with self._locked():
+            info = self._read_registry()
+            if info is not None and self._is_healthy(info):
+                log.info(f"Joining the shared Jupyter gateway {info['ip']}:{info['port']} (pid {info['pid']})")
+            else:
+                if info is not None:
+                    log.warning(f"Shared Jupyter gateway {self.key} is gone, starting a new one")
+                info = self._start_gateway()
+            info["leases"] = [pid for pid in info.get("leases", []) if _pid_alive(pid) and pid != os.getpid()]
+            info["leases"].append(os.getpid())
+            self._write_registry(info)
+        self._leased = True
+
+        self.ip = info["ip"]
+        self.port = info["port"]
+        self.token = info["token"]
+
+        atexit.register(self.stop)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        fd = os.open(self.registry_dir / f"gateway-{self.key}.lock", os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _read_registry(self) -> dict | None:
+        try:
+            return json.loads(self._registry_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_registry(self, info: dict) -> None:
+        tmp = self._registry_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(info))
+        os.replace(tmp, self._registry_path)
+
+    def _is_healthy(self, info: dict) -> bool:
+        if not _pid_alive(info["pid"]):
+            return False
+        try:
+            response = requests.get(
+                f"http://{info['ip']}:{info['port']}/api/kernelspecs",
+                headers={"Authorization": f"token {info['token']}"},
+                timeout=10,
+            )
+        except requests.RequestException:
+            return False
+        return response.ok
+
+    def _start_gateway(self) -> dict:
+        token = secrets.token_hex(32)
+        self.workspace_root.mkdir(parents=True, exist_ok=True)
+        bind_configs = [
+            f"{self.workspace_root}:{self.CONTAINER_WORKSPACE_ROOT}:rw",
+            f"{self.data_root}:{self.CONTAINER_DATA_ROOT}:ro",
+        ]
+        for k, v in self.read_only_binds.items():
+            bind_configs.append(f"{k}:{v}:ro")
+        env = container_env(
+            bind_configs, self.superimage_directory, self.superimage_version, self.read_only_overlays, self.env
+        )
+
+        log.warning(f"Starting the shared Jupyter gateway {self.key}, logging to {self._log_path}")
+        # the log is a file rather than a pipe: the gateway outlives the run that started it
+        with open(self._log_path, "w") as log_file:
+            process = subprocess.Popen(
+                gateway_command(token),
+                stdout=subprocess.DEVNULL,
+                stderr=log_file,
+                text=True,
+                start_new_session=True,
+                env=env,
+            )
+
+        deadline = time.monotonic() + self.start_timeout
+        while True:
+            output = self._log_path.read_text()
+            match = GATEWAY_READY_PATTERN.search(output)
+            if match:
+                break
+            if process.poll() is not None or "ERROR:" in output:
+                raise ValueError(f"Shared Jupyter gateway failed to start. stderr:\n{output}")
+            if time.monotonic() > deadline:
+                os.killpg(process.pid, signal.SIGKILL)
+                raise TimeoutError(f"Shared Jupyter gateway did not start within {self.start_timeout}s.")
+            time.sleep(0.5)
+
+        self._process = process
+        return {"pid": process.pid, "ip": match.group(1), "port": int(match.group(2)), "token": token, "leases": []}
+
+    def container_path(self, host_path: Path | str) -> str:
+        """Path under which `host_path` (inside the workspace or data root) is visible in the container."""
+        host_path = Path(host_path).resolve()
+        for root, container_root in (
+            (self.workspace_root, self.CONTAINER_WORKSPACE_ROOT),
+            (self.data_root, self.CONTAINER_DATA_ROOT),
+        ):
+            if host_path.is_relative_to(root):
+                return (Path(container_root) / host_path.relative_to(root)).as_posix()
+        raise ValueError(
+            f"{host_path} is not visible in the shared gateway: it must be inside {self.workspace_root} "
+            f"or {self.data_root}."
+        )
+
+    def stop(self) -> None:
+        """Release the lease of this process. The gateway is stopped once no live process holds a lease anymore."""
+        if not self._leased:
+            return
+        self._leased = False
+        with self._locked():
+            info = self._read_registry()
+            if info is None:
+                return
+            info["leases"] = [pid for pid in info.get("leases", []) if _pid_alive(pid) and pid != os.getpid()]
+            if info["leases"]:
+                self._write_registry(info)
+                return
+
+            log.warning(f"Last lease released, stopping the shared Jupyter gateway {self.key}")
+            try:
+                os.killpg(info["pid"], signal.SIGTERM)
+                if self._process is not None and self._process.pid == info["pid"]:
+                    try:
+                        self._process.wait(timeout=120)
+                    except subprocess.TimeoutExpired:
+                        os.killpg(info["pid"], signal.SIGKILL)
+                        self._process.wait()
+                else:
+                    deadline = time.monotonic() + 120
+                    while _pid_alive(info["pid"]) and time.monotonic() < deadline:
+                        time.sleep(0.5)
+                    if _pid_alive(info["pid"]):
+                        os.killpg(info["pid"], signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self._registry_path.unlink(missing_ok=True)
+
+    @property
+    def connection_info(self) -> JupyterConnectionInfo:
+        return JupyterConnectionInfo(
+            host=self.ip,
+            use_https=False,
+            port=self.port,
+            token=self.token,
+        )
+
+    def __del__(self):
+        self.stop()
@@ -15,6 +15,10 @@ Supports:
 - captures stdout and stderr
 - captures exceptions and stack traces
 - limits execution time
+- optionally limits memory (RLIMIT_AS, cgroup v2 memory.max) and CPU affinity
+- optionally runs every node in its own copy-on-write workspace
+- optionally exposes a persistent artifact cache to the code as `dojo_cache`
+- optionally executes scripts incrementally, reusing the state of the cells shared with previous scripts
 """
 
 import os
@@ -30,11 +34,26 @@ from typing import Any
 import humanize
 from omegaconf import OmegaConf
 
-from dojo.core.interpreters.base import ExecutionResult, Interpreter
+from dojo.core.interpreters.base import PROCESS_DIED, ExecutionResult, Interpreter
 from dojo.utils.logger import CollectiveLogger, LogEvent, get_logger
-from dojo.core.interpreters.utils import copy_contents
+from dojo.core.interpreters.utils import copy_contents, directory_fingerprint
+from dojo.core.interpreters.artifact_cache import ArtifactCache
+from dojo.core.interpreters.data_cache import DataCache, link_data_tree
+from dojo.core.interpreters.workspace import WorkspaceManager
+from dojo.core.interpreters.incremental import (
+    IncrementalExecutor,
+    PrefixFailure,
+    is_fork_failure,
+    is_fork_unsafe_error,
+)
+from dojo.core.interpreters.resource_limits import (
+    MEMORY_LIMIT_EXCEEDED,
+    apply_process_limits,
+    create_memory_cgroup,
+)
 
 from dojo.config_dataclasses.interpreter.python import PythonInterpreterConfig
+from dojo.utils.deadline import Deadline
 
 import logging
 
@@ -117,15 +136,25 @@ class PythonInterpreter(Interpreter):
             log.info(f"Working directory {self.working_dir} does not exist -- creating it")
             self.working_dir.mkdir(parents=True, exist_ok=True)
 
+        self.data_lease = None
         if data_dir is not None:
             self.data_dir = Path(data_dir).resolve()
             # assume the data_dir is already created and ready
             data_link = self.working_dir / "data"
 
+            if cfg.data_cache_dir is not None:
+                # stage the data once per host and share it read-only across runs
+                data_cache = DataCache(cfg.data_cache_dir, max_size_mb=cfg.data_cache_max_size_mb)
+                self.data_lease = data_cache.stage(self.data_dir)
+                self.data_dir = self.data_lease.path
+
             if cfg.use_symlinks:
                 if data_link.is_symlink():
                     data_link.unlink()
                 data_link.symlink_to(self.data_dir)
+            elif self.data_lease is not None:
+                # the staged files are read-only, so hardlinks to them are as safe as copies
+                link_data_tree(self.data_dir, data_link)
             else:
                 copy_contents(source=self.data_dir, destination=data_link, use_symlinks=False)
         else:
@@ -137,15 +166,64 @@ class PythonInterpreter(Interpreter):
         self.format_tb_ipython = cfg.format_tb_ipython
         self.process: Process | None = None  # type: ignore
 
+        # Resource limits for the child process
+        self.memory_limit_mb = cfg.memory_limit_mb
+        self.cpu_affinity = cfg.cpu_affinity
+        self.cgroup_memory_limit_mb = cfg.cgroup_memory_limit_mb
+        self.cgroup = create_memory_cgroup(cfg.cgroup_memory_limit_mb, parent=cfg.cgroup_parent)
+
+        # Per-node workspaces, seeded from the base working dir. They link to its data rather than cloning it, which
+        # would copy the whole dataset into every workspace when the data is not a symlink
+        self.base_working_dir = self.working_dir
+        self.workspaces: WorkspaceManager | None = None
+        if cfg.snapshot_workspaces:
+            snapshot_dir = cfg.snapshot_dir or self.working_dir.parent / "node_workspaces"
+            self.workspaces = WorkspaceManager(
+                self.working_dir,
+                snapshot_dir,
+                strategy=cfg.snapshot_strategy,
+                max_size_mb=cfg.snapshot_max_size_mb,
+                shared=("data",),
+            )
+
+        # Memoization cache shared by all the nodes of the run
+        self.artifact_cache: ArtifactCache | None = None
+        if cfg.artifact_cache:
+            self.artifact_cache = ArtifactCache(
+                cfg.artifact_cache_dir or self.working_dir.parent / "artifact_cache",
+                max_size_mb=cfg.artifact_cache_max_size_mb,
+                data_fingerprint=directory_fingerprint(self.data_dir),
+            )
+
+        # Notebook-style execution reusing the state of the cells shared with previously executed scripts
+        self.incremental: IncrementalExecutor | None = None
+        if cfg.incremental:
+            self.incremental = IncrementalExecutor(
+                self,
+                max_checkpoints=cfg.incremental_max_checkpoints,
+                min_prefix_cells=cfg.incremental_min_prefix_cells,
+            )
+
     def child_proc_setup(self, result_outq: Queue) -> None:
         """
         Pre-execution setup in the child process:
+        - Joins the memory cgroup and applies resource limits, before any user code runs
         - Changes directory
         - Disables warnings
         - Redirects stdout/stderr to a queue
         """
         import shutup
 
+        if self.cgroup is not None:
+            try:
+                self.cgroup.add_process(os.getpid())
+            except OSError as e:
+                log.warning(f"Failed to move the REPL child process into {self.cgroup.path}: {e}")
+        try:
+            apply_process_limits(memory_limit_mb=self.memory_limit_mb, cpu_affinity=self.cpu_affinity)
+        except (OSError, ValueError) as e:
+            log.warning(f"Failed to apply resource limits to the REPL child process: {e}")
+
         shutup.mute_warnings()
         os.chdir(str(self.working_dir))
 
@@ -155,29 +233,41 @@ class PythonInterpreter(Interpreter):
         # capture stdout and stderr
         sys.stdout = sys.stderr = RedirectQueue(result_outq)
 
+    def new_global_scope(self) -> dict[str, Any]:
+        """Global scope the code is executed in."""
+        global_scope: dict[str, Any] = {}
+        if self.artifact_cache is not None:
+            global_scope["dojo_cache"] = self.artifact_cache
+        return global_scope
+
     def _run_session(
         self,
         code_inq: Queue,
         result_outq: Queue,
         event_outq: Queue,
+        global_scope: dict[str, Any] | None = None,
     ) -> None:
         """
         Main loop running in the child process.
-        Waits for (code, file_name, persist_file, execute_code) to arrive in `code_inq`,
+        Waits for (code, file_name, persist_file, execute_code, working_dir) to arrive in `code_inq`,
         writes it to `file_name`, executes it, and reports results back.
+        `global_scope` is only passed by runs forked from an incremental execution checkpoint.
         """
         self.child_proc_setup(result_outq)
 
-        global_scope: dict[str, Any] = {}
+        if global_scope is None:
+            global_scope = self.new_global_scope()
         while True:
             # Here, we expect a tuple: (code, file_name, persist_file).
             data = code_inq.get()
-            # If you had a sentinel-based exit, you could do:
-            # if data == "quit":
-            #     break
+            # sentinel used to stop runs forked from an incremental execution checkpoint
+            if data is None:
+                break
 
-            code, agent_file_name, persist_file, execute_code = data
-            os.chdir(str(self.working_dir))
+            code, agent_file_name, persist_file, execute_code, working_dir = data
+            os.chdir(working_dir)
+            if working_dir not in sys.path:
+                sys.path.append(working_dir)
 
             # Write code to the chosen file name
             with open(agent_file_name, "w") as f:
@@ -194,7 +284,7 @@ class PythonInterpreter(Interpreter):
                 except BaseException as e:
                     tb_str, e_cls_name, exc_info, exc_stack = exception_summary(
                         e,
-                        self.working_dir,
+                        Path(working_dir),
                         agent_file_name,
                         self.format_tb_ipython,
                     )
@@ -257,6 +347,57 @@ class PythonInterpreter(Interpreter):
                 self.process.close()
                 self.process = None
 
+    def close(self) -> None:
+        """
+        Terminate the child process and release the resources held by the interpreter.
+        """
+        self.cleanup_session()
+        if self.incremental is not None:
+            self.incremental.close()
+        if self.cgroup is not None:
+            self.cgroup.remove()
+            self.cgroup = None
+        if self.data_lease is not None:
+            self.data_lease.release()
+            self.data_lease = None
+
+    def use_workspace(
+        self,
+        node_id: str | None,
+        parent_node_id: str | None = None,
+        exclude: list[str] | tuple[str, ...] = (),
+    ) -> Path:
+        """
+        Switch the working directory to the workspace of `node_id`, creating it from the workspace of
+        `parent_node_id` if needed. Passing `node_id=None` switches back to the base working directory.
+        A no-op if workspace snapshots are disabled.
+
+        Returns:
+            Path: The working directory code is now executed in.
+        """
+        if self.workspaces is None:
+            return self.working_dir
+
+        if node_id is None:
+            self.working_dir = self.base_working_dir
+        else:
+            self.working_dir = self.workspaces.create(node_id, parent_node_id, exclude=exclude)
+        return self.working_dir
+
+    def _memory_limit_error(self, limit_mb: int, cgroup: bool = False) -> tuple[str, dict]:
+        """
+        Describe a violation of the memory limit `limit_mb` of the child process, for reporting in the
+        `ExecutionResult`: the cgroup limit if `cgroup`, else the address-space limit.
+        """
+        exc_info = {"memory_limit_mb": limit_mb}
+        if cgroup:
+            exc_info["memory_peak_mb"] = self.cgroup.memory_peak_mb()
+        msg = (
+            f"{MEMORY_LIMIT_EXCEEDED}: The process exceeded its memory limit of {exc_info['memory_limit_mb']}MB. "
+            "Reduce the memory footprint of the code (e.g. smaller batches, fewer copies of the data)."
+        )
+        return msg, exc_info
+
     def fetch_file(
         self,
         path: str,
@@ -273,6 +414,7 @@ class PythonInterpreter(Interpreter):
         file_name: str = "runfile.py",
         execute_code: bool = True,
         include_exec_time: bool = True,
+        deadline: Deadline | None = None,
     ) -> ExecutionResult:
         """
         Execute the provided Python code in a separate process and return its output.
@@ -287,12 +429,33 @@ class PythonInterpreter(Interpreter):
                 before execution. Defaults to "runfile.py".
             execute_code: (bool): Whether to execute the code or not. If False, this
                 function simply writes the code to a file.
+            deadline (Deadline, optional): Deadline of the search. The timeout of this execution
+                is clipped to the time remaining before it.
 
         Returns:
             ExecutionResult: Object containing the output, metadata, and any exception info.
         """
+        timeout = self.timeout if deadline is None else deadline.clip(self.timeout)
+        return self._run(code, reset_session, persist_file, file_name, execute_code, include_exec_time, timeout)
 
+    def _run(
+        self,
+        code: str,
+        reset_session: bool,
+        persist_file: bool,
+        file_name: str,
+        execute_code: bool,
+        include_exec_time: bool,
+        timeout: float | None,
+    ) -> ExecutionResult:
+        """`run` with the time limit `timeout` of this execution (None for no limit)."""
         self.logger.debug(f"REPL is executing code (reset_session={reset_session})", LogEvent.INTERPRETER)
+
+        if reset_session and execute_code and self.incremental is not None:
+            result = self._run_incremental(code, persist_file, file_name, include_exec_time, timeout)
+            if result is not None:
+                return result
+
         log.info(f"Executing code:\n```\npython\n{code}\n```")
 
         if reset_session:
@@ -306,8 +469,8 @@ class PythonInterpreter(Interpreter):
 
         assert self.process.is_alive()
 
-        # Send the tuple (code, file_name, persist_file, execute_code) to the child
-        self.code_inq.put((code, file_name, persist_file, execute_code))
+        # Send the tuple (code, file_name, persist_file, execute_code, working_dir) to the child
+        self.code_inq.put((code, file_name, persist_file, execute_code, str(self.working_dir)))
 
         # wait for child to actually start execution
         try:
@@ -320,9 +483,10 @@ class PythonInterpreter(Interpreter):
                 queue_dump = self.result_outq.get()
                 self.logger.error(f"REPL output queue dump: {queue_dump[:1000]}", LogEvent.INTERPRETER)
             self.cleanup_session()
-            return ExecutionResult(term_out=[msg, queue_dump], exec_time=0, exit_code=1)
+            return ExecutionResult(term_out=[msg, queue_dump], exec_time=0, exit_code=1, exc_type=PROCESS_DIED)
         assert state[0] == "state:ready", state
         start_time = time.time()
+        oom_kills_before = self.cgroup.oom_kill_count() if self.cgroup is not None else 0
 
         child_in_overtime = False  # indicates if we've exceeded time limit
 
@@ -337,30 +501,40 @@ class PythonInterpreter(Interpreter):
                 # no message yet, check if child is alive
                 if not child_in_overtime and not self.process.is_alive():
                     msg = "REPL child process died unexpectedly"
+                    exc_type, exc_info = PROCESS_DIED, {"exitcode": self.process.exitcode}
+                    if self.cgroup is not None and self.cgroup.oom_kill_count() > oom_kills_before:
+                        msg, exc_info = self._memory_limit_error(self.cgroup_memory_limit_mb, cgroup=True)
+                        exc_type = MEMORY_LIMIT_EXCEEDED
                     self.logger.critical(msg, LogEvent.INTERPRETER)
                     queue_dump = ""
                     while not self.result_outq.empty():
                         queue_dump = self.result_outq.get()
                         self.logger.error(f"REPL output queue dump: {queue_dump[:1000]}", LogEvent.INTERPRETER)
                     self.cleanup_session()
-                    return ExecutionResult(term_out=[msg, queue_dump], exec_time=0, exit_code=1)
+                    return ExecutionResult(
+                        term_out=[queue_dump, msg] if exc_type == MEMORY_LIMIT_EXCEEDED else [msg, queue_dump],
+                        exec_time=time.time() - start_time,
+                        exit_code=1,
+                        exc_type=exc_type,
+                        exc_info=exc_info,
+                    )
 
                 # child is alive, check timeout
-                if self.timeout is None:
+                if timeout is None:
                     continue
                 running_time = time.time() - start_time
-                if running_time > self.timeout:
-                    self.logger.warning(f"Execution exceeded timeout of {self.timeout}s", LogEvent.INTERPRETER)
+                if running_time > timeout:
+                    self.logger.warning(f"Execution exceeded timeout of {timeout}s", LogEvent.INTERPRETER)
                     os.kill(self.process.pid, signal.SIGINT)
                     child_in_overtime = True
 
                     # terminate if we're overtime by more than 5 seconds
-                    if running_time > self.timeout + 60:
+                    if running_time > timeout + 60:
                         self.logger.warning("Child failed to terminate, killing it..", LogEvent.INTERPRETER)
                         self.cleanup_session()
 
                         state = (None, "TimeoutError", {}, [], None)
-                        exec_time = self.timeout
+                        exec_time = timeout
                         break
 
         # we now unpack a 5-tuple from the child
@@ -382,12 +556,20 @@ class PythonInterpreter(Interpreter):
         if output and output[-1] == "<|EOF|>":
             output.pop()
 
+        # a MemoryError under an address-space limit is a limit violation rather than a bug in the code itself
+        if e_cls_name == "MemoryError" and self.memory_limit_mb is not None:
+            msg, limit_info = self._memory_limit_error(self.memory_limit_mb)
+            exc_info = (exc_info or {}) | limit_info
+            output.append(msg)
+
+        # only the interruption by the time limit is a timeout, not a TimeoutError raised by the code (e.g. a socket's)
+        timed_out = child_in_overtime and e_cls_name == "TimeoutError"
         # if we timed out, show that in the output
-        if e_cls_name == "TimeoutError":
-            output.append(f"TimeoutError: Execution exceeded the time limit of {humanize.naturaldelta(self.timeout)}")
+        if timed_out:
+            output.append(f"TimeoutError: Execution exceeded the time limit of {humanize.naturaldelta(timeout)}")
         elif include_exec_time:
             output.append(
-                f"Execution time: {humanize.naturaldelta(exec_time)} (time limit is {humanize.naturaldelta(self.timeout)})."
+                f"Execution time: {humanize.naturaldelta(exec_time)} (time limit is {humanize.naturaldelta(timeout)})."
             )
 
         log.info(f"Code execution finished.")
@@ -397,8 +579,85 @@ class PythonInterpreter(Interpreter):
             exec_time=exec_time,
             exit_code=0 if e_cls_name is None else 1,
             eval_return=eval_return,
+            timed_out=timed_out,
+            exc_type=e_cls_name,
+            exc_info=exc_info,
+        )
+
+    def _run_incremental(
+        self,
+        code: str,
+        persist_file: bool,
+        file_name: str,
+        include_exec_time: bool,
+        timeout: float | None,
+    ) -> ExecutionResult | None:
+        """
+        Execute `code` in a fork of a checkpoint holding the state of the cells it shares with previously
+        executed scripts. Returns None if the code has to be executed in full instead.
+        """
+        self.cleanup_session()
+        started = self.incremental.start(code, file_name, self.working_dir, timeout=timeout)
+        if started is None:
+            return None
+        if isinstance(started, PrefixFailure):
+            # the full script would fail the same way: running it again would double the time spent on it
+            output = list(started.output)
+            if started.timed_out:
+                output.append(f"TimeoutError: Execution exceeded the time limit of {humanize.naturaldelta(timeout)}")
+            elif include_exec_time:
+                output.append(
+                    f"Execution time: {humanize.naturaldelta(started.exec_time)} (time limit is {humanize.naturaldelta(timeout)})."
+                )
+            return ExecutionResult(
+                term_out=output,
+                exec_time=started.exec_time,
+                exit_code=1,
+                timed_out=started.timed_out,
+                exc_type=started.exc_type,
+                exc_info=started.exc_info,
+            )
+        self.process, server, suffix_code, created = started
+        self.code_inq, self.result_outq, self.event_outq = server.code_inq, server.result_outq, server.event_outq
+
+        # a freshly created checkpoint counts towards the time limit of this execution
+        prefix_time = server.prefix_time if created else 0.0
+        result = self._run(
+            suffix_code,
+            reset_session=False,
+            persist_file=persist_file,
+            file_name=file_name,
+            execute_code=True,
+            include_exec_time=False,
+            timeout=None if timeout is None else max(1, timeout - prefix_time),
         )
 
+        if result.exit_code != 0 and is_fork_unsafe_error(result.term_out):
+            self.logger.warning(
+                "The checkpointed state does not survive a fork, disabling incremental execution", LogEvent.INTERPRETER
+            )
+            self.incremental.disabled = True
+            self.incremental.close()
+            self.cleanup_session()
+            return None
+        if is_fork_failure(result.term_out):
+            self.logger.warning("The forked run failed, dropping its checkpoint", LogEvent.INTERPRETER)
+            self.incremental.drop(server.key)
+            self.cleanup_session()
+            return None
+
+        output = server.prefix_output + result.term_out
+        exec_time = prefix_time + result.exec_time
+        if result.timed_out:
+            output[-1] = f"TimeoutError: Execution exceeded the time limit of {humanize.naturaldelta(timeout)}"
+        elif include_exec_time:
+            output.append(
+                f"Execution time: {humanize.naturaldelta(exec_time)} (time limit is {humanize.naturaldelta(timeout)})."
+            )
+        result.term_out = output
+        result.exec_time = exec_time
+        return result
+
 
 def main():
     # Instantiate our dummy logger.
@@ -0,0 +1,109 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Optional resource limits for the processes that execute agent code.
+Supports:
+- address-space limit (RLIMIT_AS) applied from inside the child process
+- CPU affinity applied from inside the child process
+- cgroup v2 memory.max for the child process, when a delegated cgroup is available
+"""
+
+import logging
+import os
+import resource
+import uuid
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+# name of the structured error reported when the kernel OOM-killed the child inside its cgroup
+MEMORY_LIMIT_EXCEEDED = "MemoryLimitExceeded"
+
+
+def apply_process_limits(memory_limit_mb: int | None = None, cpu_affinity: list[int] | None = None) -> None:
+    """
+    Apply per-process limits to the calling process. Meant to be called at the start of the child process.
+
+    Args:
+        memory_limit_mb (int | None): Maximum size of the virtual address space, in MB.
+        cpu_affinity (list[int] | None): CPU ids the process is allowed to run on.
+    """
+    if memory_limit_mb is not None:
+        limit = int(memory_limit_mb) * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+    if cpu_affinity:
+        os.sched_setaffinity(0, set(cpu_affinity))
+
+
+class MemoryCgroup:
+    """
+    A transient cgroup v2 with a `memory.max` limit that interpreter children are moved into.
+
+    The cgroup is created as a child of `parent`, a cgroup delegated to us with the memory controller enabled in its
+    `cgroup.subtree_control`. Since cgroup v2 only allows processes in leaf cgroups, `parent` cannot be the cgroup
+    the current process runs in: it must be an empty cgroup set aside for the interpreters.
+    """
+
+    def __init__(self, memory_limit_mb: int, parent: Path | str) -> None:
+        parent = Path(parent)
+        subtree_control = parent / "cgroup.subtree_control"
+        if "memory" not in subtree_control.read_text().split():
+            raise RuntimeError(f"The memory controller is not enabled in {subtree_control}.")
+
+        self.path = parent / f"dojo-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.path.mkdir()
+        (self.path / "memory.max").write_text(str(int(memory_limit_mb) * 1024 * 1024))
+        # disable swap so that the limit is an actual limit, when the knob exists
+        swap_max = self.path / "memory.swap.max"
+        if swap_max.exists():
+            swap_max.write_text("0")
+
+        log.info(f"Created cgroup {self.path} with memory.max={memory_limit_mb}MB")
+
+    def add_process(self, pid: int) -> None:
+        (self.path / "cgroup.procs").write_text(str(pid))
+
+    def oom_kill_count(self) -> int:
+        """Number of processes in the cgroup that were killed by the OOM killer."""
+        try:
+            for line in (self.path / "memory.events").read_text().splitlines():
+                key, value = line.split()
+                if key == "oom_kill":
+                    return int(value)
+        except (OSError, ValueError):
+            pass
+        return 0
+
+    def memory_peak_mb(self) -> float | None:
+        try:
+            return int((self.path / "memory.peak").read_text()) / (1024 * 1024)
+        except (OSError, ValueError):
+            return None
+
+    def remove(self) -> None:
+        try:
+            self.path.rmdir()
+        except OSError as e:
+            log.warning(f"Failed to remove cgroup {self.path}: {e}")
+
+
+def create_memory_cgroup(memory_limit_mb: int | None, parent: Path | str | None = None) -> MemoryCgroup | None:
+    """Create a `MemoryCgroup` if a limit is requested and a delegated `parent` is available, else return None."""
+    if memory_limit_mb is None:
+        return None
+    if parent is None:
+        log.warning("cgroup memory limit requires a delegated cgroup_parent, continuing without it")
+        return None
+    try:
+        return MemoryCgroup(memory_limit_mb, parent=parent)
+    except (OSError, RuntimeError) as e:
+        log.warning(f"cgroup memory limit is not available, continuing without it: {e}")
+        return None
@@ -5,11 +5,13 @@
 # LICENSE file in the root directory of this source tree.
 
 import datetime
+import hashlib
 import logging
 import multiprocessing
 import os
 import shutil
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, Hashable, Optional, Union, cast
@@ -119,6 +121,34 @@ def _copy_directory(src: Path, dst_dir: Path, use_symlinks: bool) -> None:
                 logger.debug(f"Force copied directory {item} to {destination}")
 
 
+def directory_fingerprint(path: Path, exclude: tuple[str, ...] = ()) -> str:
+    """
+    Compute a cheap fingerprint of a directory tree from the relative paths, sizes and modification times
+    of its files (symlinks are followed). File contents are not read.
+
+    Args:
+        path (Path): Root directory to fingerprint.
+        exclude (tuple[str, ...]): Relative (posix) paths of files and directories left out of the fingerprint.
+
+    Returns:
+        str: Hex digest identifying the current state of the directory.
+    """
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path, followlinks=True):
+        rel_root = Path(root).relative_to(path)
+        dirs[:] = sorted(d for d in dirs if (rel_root / d).as_posix() not in exclude)
+        for name in sorted(files):
+            if (rel_root / name).as_posix() in exclude:
+                continue
+            file_path = Path(root) / name
+            try:
+                stat = file_path.stat()
+            except OSError:
+                continue
+            h.update(f"{file_path.relative_to(path)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
 def remove_unwanted_items(path: Path, patterns: Optional[list] = None) -> None:
     """
     Remove unwanted files and directories based on specified patterns.
@@ -143,17 +173,42 @@ def remove_unwanted_items(path: Path, patterns: Optional[list] = None) -> None:
                 logger.error(f"Failed to remove {item}: {error}")
 
 
-def extract_zip_file(zip_path: Path, extract_to: Path) -> None:
+def _extract_zip_members(zip_path: Path, extract_to: Path, members: list) -> None:
+    # every thread needs its own handle, a ZipFile can't be read concurrently
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        for member in members:
+            zip_ref.extract(member, extract_to)
+
+
+def extract_zip_file(zip_path: Path, extract_to: Path, num_workers: int = 1) -> None:
     """
     Extract a single zip file to the specified directory.
 
     Args:
         zip_path (Path): Path to the zip file.
         extract_to (Path): Directory to extract contents to.
+        num_workers (int): Number of threads extracting the members in parallel (decompression releases the GIL).
     """
     try:
         with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_ref.extractall(extract_to)
+            members = zip_ref.infolist()
+            if num_workers <= 1 or len(members) < 2 * num_workers:
+                zip_ref.extractall(extract_to)
+                members = []
+        if members:
+            # create the directories upfront, threads creating the same directory would race
+            root = Path(extract_to).resolve()
+            for member in members:
+                target = (root / member.filename).resolve()
+                if target.is_relative_to(root):
+                    (target if member.is_dir() else target.parent).mkdir(parents=True, exist_ok=True)
+            # balance the threads by uncompressed size
+            chunks = [[] for _ in range(num_workers)]
+            for i, member in enumerate(sorted(members, key=lambda m: m.file_size, reverse=True)):
+                chunks[i % num_workers].append(member)
+            with ThreadPoolExecutor(max_workers=num_workers) as pool:
+                for future in [pool.submit(_extract_zip_members, zip_path, extract_to, c) for c in chunks]:
+                    future.result()
         logger.debug(f"Extracted {zip_path} to {extract_to}")
     except zipfile.BadZipFile:
         logger.error(f"Bad zip file: {zip_path}")
@@ -190,12 +245,13 @@ def flatten_directory_structure(zip_output_dir: Path, expected_name: str) -> Non
             logger.debug(f"Renamed {temp_rename} to {zip_output_dir}")
 
 
-def extract_all_archives(path: Path) -> None:
+def extract_all_archives(path: Path, num_workers: int = 1) -> None:
     """
     Extract all zip archives within the specified path and clean up the directories.
 
     Args:
         path (Path): Root directory to search for zip files.
+        num_workers (int): Number of threads extracting the members of each archive.
     """
     for zip_file in path.rglob("*.zip"):
         output_dir = zip_file.with_suffix("")
@@ -213,7 +269,7 @@ def extract_all_archives(path: Path) -> None:
         try:
             logger.info(f"Extracting {zip_file} to {output_dir}")
             output_dir.mkdir(parents=True, exist_ok=True)
-            extract_zip_file(zip_file, output_dir)
+            extract_zip_file(zip_file, output_dir, num_workers=num_workers)
 
             # Clean up unwanted files
             remove_unwanted_items(output_dir)
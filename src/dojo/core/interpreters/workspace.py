@@ -0,0 +1,205 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Cheap per-node workspaces built on top of a base working directory.
+Supports:
+- reflink clones (`cp --reflink=always`) on filesystems that support them (btrfs, xfs, ...)
+- hardlink farms (directories are recreated, files are hardlinked). Files are shared with the parent
+  workspace, so code that rewrites a file in place also changes it for the parent -- opt-in only.
+- plain copies
+Symlinks are recreated as symlinks, never followed. Shared entries of the base working dir (the task data) are never
+cloned: every workspace links to them instead, so that a workspace costs nothing more than the artifacts of its nodes.
+
+Every node gets its own directory under the snapshot root, seeded from the workspace of its parent node
+(or from the base working dir for root nodes), so that artifacts produced by a node (model checkpoints,
+cached features, ...) are available to its children without leaking into unrelated nodes.
+
+Workspaces are evicted in least-recently-used order once they exceed a disk quota. The children of a node whose
+workspace was evicted are seeded from the base working dir, like root nodes.
+"""
+
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Iterable
+
+from dojo.utils.logger import get_logger
+
+logger = get_logger()
+
+SNAPSHOT_STRATEGIES = ("auto", "reflink", "hardlink", "copy")
+
+
+def _reflink_tree(src: Path, dst: Path, exclude: set[str]) -> None:
+    dst.mkdir(parents=True, exist_ok=True)
+    items = [str(item) for item in src.iterdir() if item.name not in exclude]
+    if not items:
+        return
+    # --no-dereference keeps symlinks as symlinks, --reflink=always fails instead of silently copying
+    subprocess.run(
+        ["cp", "-a", "--no-dereference", "--reflink=always", *items, str(dst)],
+        check=True,
+        capture_output=True,
+    )
+
+
+def _link_or_copy_tree(src: Path, dst: Path, hardlink: bool, exclude: set[str]) -> None:
+    dst.mkdir(parents=True, exist_ok=True)
+    for item in src.iterdir():
+        if item.name in exclude:
+            continue
+        target = dst / item.name
+        if item.is_symlink():
+            target.symlink_to(os.readlink(item))
+        elif item.is_dir():
+            # exclusions only apply to the top level of the workspace
+            _link_or_copy_tree(item, target, hardlink, exclude=set())
+        elif hardlink:
+            os.link(item, target)
+        else:
+            shutil.copy2(item, target)
+
+
+class WorkspaceManager:
+    """
+    Creates and tracks per-node copy-on-write workspaces.
+
+    Args:
+        base_dir (Path | str): The base working directory the workspaces are seeded from.
+        root (Path | str): Directory under which the per-node workspaces are created.
+        strategy (str): One of `SNAPSHOT_STRATEGIES`. "auto" tries reflink, then falls back to copy.
+        max_size_mb (int | None): Disk quota of the workspaces. Least recently used workspaces are evicted beyond
+            it. Files shared by reflinks or hardlinks are counted in every workspace. None disables eviction.
+        shared (Iterable[str]): Top-level entries of `base_dir` (e.g. the `data` dir) that are never cloned: every
+            workspace holds a symlink to the entry of `base_dir` instead.
+    """
+
+    def __init__(
+        self,
+        base_dir: Path | str,
+        root: Path | str,
+        strategy: str = "auto",
+        max_size_mb: int | None = None,
+        shared: Iterable[str] = (),
+    ) -> None:
+        if strategy not in SNAPSHOT_STRATEGIES:
+            raise ValueError(f"Unknown snapshot strategy {strategy}, expected one of {SNAPSHOT_STRATEGIES}")
+
+        self.base_dir = Path(base_dir).resolve()
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.strategy = strategy
+        self.max_size_bytes = None if max_size_mb is None else int(max_size_mb) * 1024 * 1024
+        self.shared = set(shared)
+
+        # strategies that failed once are not retried (e.g. reflinks on ext4)
+        self._unsupported: set[str] = set()
+        # sizes of the workspaces, measured once they are not used anymore
+        self._sizes: dict[str, int] = {}
+        self._current: str | None = None
+
+    def path(self, node_id: str) -> Path:
+        return self.root / node_id
+
+    def exists(self, node_id: str | None) -> bool:
+        return node_id is not None and self.path(node_id).is_dir()
+
+    def create(self, node_id: str, parent_node_id: str | None = None, exclude: Iterable[str] = ()) -> Path:
+        """
+        Create (or return the already existing) workspace of `node_id`, seeded from the workspace of
+        `parent_node_id` if it exists, otherwise from the base working directory.
+
+        Args:
+            node_id (str): Id of the node the workspace belongs to.
+            parent_node_id (str | None): Id of the parent node whose artifacts should be carried over.
+            exclude (Iterable[str]): Top-level entries that are not carried over (e.g. the submission file).
+        """
+        workspace = self.path(node_id)
+        # the workspace used last may have grown since it was measured
+        if self._current is not None and self._current != node_id:
+            self._sizes.pop(self._current, None)
+        self._current = node_id
+        if workspace.exists():
+            # the modification time doubles as the last access time for the LRU eviction
+            os.utime(workspace)
+            return workspace
+
+        # make room before cloning, without evicting the parent the workspace is seeded from
+        self.evict(keep={node_id, parent_node_id})
+        source = self.path(parent_node_id) if self.exists(parent_node_id) else self.base_dir
+        tmp = self.root / f".{node_id}.tmp"
+        if tmp.exists():
+            shutil.rmtree(tmp)
+
+        for strategy in self._candidate_strategies():
+            try:
+                self._clone(source, tmp, strategy, set(exclude) | self.shared)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.debug(f"Workspace snapshot with strategy '{strategy}' failed: {e}")
+                self._unsupported.add(strategy)
+                shutil.rmtree(tmp, ignore_errors=True)
+                continue
+
+            for name in self.shared:
+                if (self.base_dir / name).exists():
+                    (tmp / name).symlink_to(self.base_dir / name, target_is_directory=True)
+            tmp.rename(workspace)
+            logger.debug(f"Created workspace {workspace} from {source} ({strategy})")
+            return workspace
+
+        raise RuntimeError(f"Failed to create a workspace for node {node_id} from {source}")
+
+    def remove(self, node_id: str) -> None:
+        shutil.rmtree(self.path(node_id), ignore_errors=True)
+        self._sizes.pop(node_id, None)
+
+    def _size(self, node_id: str) -> int:
+        if node_id not in self._sizes:
+            size = 0
+            for root, _, files in os.walk(self.path(node_id)):
+                for name in files:
+                    try:
+                        size += os.lstat(os.path.join(root, name)).st_size
+                    except OSError:
+                        continue
+            self._sizes[node_id] = size
+        return self._sizes[node_id]
+
+    def evict(self, keep: Iterable[str | None] = ()) -> None:
+        """Remove least recently used workspaces, except those of `keep`, until the workspaces fit in the quota."""
+        if self.max_size_bytes is None:
+            return
+        entries = []
+        for path in self.root.iterdir():
+            if path.name.startswith(".") or not path.is_dir():
+                continue
+            try:
+                entries.append((path.stat().st_mtime, path.name))
+            except FileNotFoundError:
+                continue
+
+        total = sum(self._size(node_id) for _, node_id in entries)
+        for _, node_id in sorted(entries):
+            if total <= self.max_size_bytes:
+                break
+            if node_id in keep:
+                continue
+            total -= self._size(node_id)
+            self.remove(node_id)
+            logger.debug(f"Evicted the workspace of node {node_id}")
+
+    def _candidate_strategies(self) -> list[str]:
+        if self.strategy != "auto":
+            return [self.strategy]
+        return [s for s in ("reflink", "copy") if s not in self._unsupported]
+
+    def _clone(self, source: Path, destination: Path, strategy: str, exclude: set[str]) -> None:
+        if strategy == "reflink":
+            _reflink_tree(source, destination, exclude)
+        else:
+            _link_or_copy_tree(source, destination, hardlink=strategy == "hardlink", exclude=exclude)
@@ -4,6 +4,9 @@
 # This source code is licensed under the license found in the
 # LICENSE file in the root directory of this source tree.
 
+import os
+import signal
+import tempfile
 import time
 from abc import ABC, abstractmethod
 from pathlib import Path
@@ -16,6 +19,9 @@ from dojo.utils.logger import get_logger, LogEvent
 from dojo.config_dataclasses.solver.base import SolverConfig
 from dojo.utils.state import BaseState
 
+# node generated by an operator whose execution is in progress, re-executed if the run is interrupted
+PENDING_NODE_FILE = "pending_node.json"
+
 
 class Solver(ABC):
     def __init__(self, cfg: SolverConfig, task_info=None):
@@ -27,18 +33,42 @@ class Solver(ABC):
         # state
         self.state = BaseState()
 
+        # the node being executed, as persisted in the checkpoint
+        self._pending_node: dict | None = None
+        # the node whose execution was interrupted in a previous run, to be re-executed
+        self.resumable_node: dict | None = None
+        # the context of the execution of the last resumed node (e.g. the debug cycle it belongs to)
+        self.resumed_context: dict = {}
+        self._interrupted_executions: dict[str, int] = {}
+        # start of the step in progress, whose time is not in `state.running_time` yet
+        self._step_started_at: float | None = None
+
     @abstractmethod
     def __call__(self, task, state):
         raise NotImplementedError()
 
+    def _write_atomic(self, path: Path, text: str) -> None:
+        # a preemption signal may flush a checkpoint while another one is being written: never leave a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
     def save_checkpoint(self):
         self.logger.info(f"Saving checkpoint to {self.cfg.checkpoint_path}")
         Path(self.cfg.checkpoint_path).mkdir(parents=True, exist_ok=True)
         state_dict = self.state.state_dict()
-        with open(Path(self.cfg.checkpoint_path) / "state.json", "w") as f:
-            json.dump(state_dict, f)
+        self._write_atomic(Path(self.cfg.checkpoint_path) / "state.json", json.dumps(state_dict))
 
     def load_checkpoint(self):
+        pending_path = Path(self.cfg.checkpoint_path) / PENDING_NODE_FILE
+        if pending_path.exists():
+            with open(pending_path, "r") as f:
+                self.resumable_node = json.load(f)
+            # the marker outlived the run: its execution was interrupted once more
+            self.resumable_node["interrupted_executions"] += 1
+            self.logger.info(f"Found node {self.resumable_node['id']}, whose execution was interrupted.")
+
         state_path = Path(self.cfg.checkpoint_path) / "state.json"
         if not state_path.exists():
             self.logger.warning(f"No checkpoint found at {state_path}. Proceeding without loading.")
@@ -51,3 +81,96 @@ class Solver(ABC):
 
         # Increment the number of starts
         self.state.num_starts += 1
+
+    def begin_execution(self, node, context: dict | None = None) -> None:
+        """
+        Persist a generated node (code, plan, operator metrics) before executing it. The file doubles as the marker of
+        an execution in progress: it is only removed by `end_execution`. `context` is whatever the solver needs to
+        resume the node where it was executed (e.g. the state of a debug cycle), see `resumed_context`.
+        """
+        Path(self.cfg.checkpoint_path).mkdir(parents=True, exist_ok=True)
+        self._pending_node = {
+            "id": node.id,
+            "plan": node.plan,
+            "code": node.code,
+            # the root node is recreated on every start
+            "parent_ids": [
+                None if parent is self.root_node or self.journal.is_root_node(parent) else parent.id
+                for parent in node.parents
+            ],
+            "operators_used": node.operators_used,
+            "operators_metrics": node.operators_metrics,
+            "step": self.state.current_step,
+            "execution_started_at": time.time(),
+            "interrupted_executions": self._interrupted_executions.get(node.id, 0),
+            "context": context or {},
+        }
+        self._write_atomic(Path(self.cfg.checkpoint_path) / PENDING_NODE_FILE, json.dumps(self._pending_node))
+
+    def end_execution(self) -> None:
+        """Mark the execution of the pending node as over, once its result is in the journal."""
+        self._pending_node = None
+        (Path(self.cfg.checkpoint_path) / PENDING_NODE_FILE).unlink(missing_ok=True)
+
+    def pop_resumable_node(self):
+        """
+        The node whose execution was interrupted in a previous run (e.g. by a preemption), to be executed again
+        instead of generating a new one. Relies on the `journal` and `root_node` of the solver.
+
+        Returns:
+            Node | None: The node, attached to its parents in the journal, or None if there is nothing to resume
+        """
+        pending, self.resumable_node = self.resumable_node, None
+        self.resumed_context = {}
+        if pending is None:
+            return None
+        if pending["interrupted_executions"] > self.cfg.max_pending_node_retries:
+            self.logger.warning(
+                f"Execution of node {pending['id']} was interrupted {pending['interrupted_executions']} times, "
+                "dropping it."
+            )
+            self.end_execution()
+            return None
+
+        nodes_by_id = {node.id: node for node in self.journal.nodes}
+        missing = [i for i in pending["parent_ids"] if i is not None and i not in nodes_by_id]
+        if missing:
+            self.logger.warning(f"Parents {missing} of node {pending['id']} are not in the journal, dropping it.")
+            self.end_execution()
+            return None
+        parents = [self.root_node if i is None else nodes_by_id[i] for i in pending["parent_ids"]]
+
+        self._interrupted_executions[pending["id"]] = pending["interrupted_executions"]
+        self.resumed_context = pending.get("context", {})
+        self.logger.info(f"Step {self.state.current_step}: Resuming the interrupted node {pending['id']}")
+        return type(self.root_node)(
+            code=pending["code"],
+            plan=pending["plan"],
+            id=pending["id"],
+            parents=parents,
+            operators_used=pending["operators_used"],
+            operators_metrics=pending["operators_metrics"],
+        )
+
+    def install_preemption_handlers(self) -> None:
+        """
+        Flush a checkpoint when the job is warned of its preemption or requeue (SIGUSR1, e.g. with
+        `sbatch --signal=USR1@120`) and when it is terminated (SIGTERM). The node being executed, if any, is already
+        persisted and is re-executed on restart.
+        """
+        for signum in (signal.SIGUSR1, signal.SIGTERM):
+            signal.signal(signum, self._on_preemption)
+
+    def _on_preemption(self, signum, frame) -> None:
+        self.logger.warning(f"Received {signal.Signals(signum).name}, flushing the checkpoint")
+        # the step in progress is only accounted for once it completes, which it may never do
+        in_flight = 0.0 if self._step_started_at is None else time.monotonic() - self._step_started_at
+        self.state.running_time += in_flight
+        try:
+            self.save_checkpoint()
+        except Exception as e:
+            self.logger.error(f"Failed to flush the checkpoint: {e}")
+        finally:
+            self.state.running_time -= in_flight
+        if signum == signal.SIGTERM:
+            raise SystemExit(128 + signum)
@@ -147,6 +147,9 @@ class GDMClient:
             # `stop` could be a single string or list of strings
             stops = model_kwargs["stop"]
             config_args["stop_sequences"] = stops if isinstance(stops, list) else [stops]
+        if "timeout" in model_kwargs:
+            # the Gemini client takes its request timeout in milliseconds
+            config_args["http_options"] = types.HttpOptions(timeout=int(model_kwargs["timeout"] * 1000))
         # Include function calling config if tools are present
         if tools:
             config_args["tool_config"] = types.ToolConfig(
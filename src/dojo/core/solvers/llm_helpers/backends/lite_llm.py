@@ -176,7 +176,9 @@ class LiteLLMClient:
 
         filtered_kwargs["max_retries"] = NUM_RETRIES
         filtered_kwargs["num_retries"] = NUM_RETRIES
-        filtered_kwargs["request_timeout"] = httpx.Timeout(timeout=TIMEOUT)
+        # a `timeout` in the kwargs (e.g. the remaining time of the step) can only shorten the default one
+        timeout = filtered_kwargs.pop("timeout", None)
+        filtered_kwargs["request_timeout"] = httpx.Timeout(timeout=TIMEOUT if timeout is None else min(TIMEOUT, timeout))
 
         # Record start time for latency measurement
         start_time = time.monotonic()
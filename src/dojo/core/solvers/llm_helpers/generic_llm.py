@@ -12,6 +12,7 @@ from omegaconf import OmegaConf
 from dojo.core.solvers.llm_helpers.backends.utils import get_client
 from dojo.utils.logger import get_logger, LogEvent
 from dojo.core.solvers.llm_helpers.prompt_template import JinjaPrompt
+from dojo.utils.deadline import current_deadline
 
 from dojo.config_dataclasses.operators.base import OperatorConfig
 from dojo.config_dataclasses.client.base import ClientConfig
@@ -63,6 +64,17 @@ class GenericLLM:
         self.init_user_message_prompt_template = JinjaPrompt(self.cfg.init_user_message_prompt_template)
         self.user_message_prompt_template = JinjaPrompt(self.cfg.user_message_prompt_template)
 
+    def _generation_kwargs(self) -> Dict[str, Any]:
+        """Generation arguments of the call, with the request timeout clipped to the deadline of the step, if any."""
+        generation_kwargs = dict(self.generation_kwargs or {})
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check("LLM call")
+            timeout = deadline.clip(generation_kwargs.get("timeout"))
+            if timeout is not None:
+                generation_kwargs["timeout"] = timeout
+        return generation_kwargs
+
     def __call__(
         self,
         query_data: Optional[Dict[str, Any]] = None,
@@ -88,6 +100,7 @@ class GenericLLM:
             AssertionError: If both query_data and messages are None.
         """
         log.warning("sending query to llm")
+        generation_kwargs = self._generation_kwargs()
         self.call_tracker += 1
 
         # Ensure that at least one of query_data or messages is provided
@@ -102,7 +115,7 @@ class GenericLLM:
                 json_schema=json_schema,
                 function_name=function_name,
                 function_description=function_description,
-                **self.generation_kwargs,
+                **generation_kwargs,
             )
             usage_stats["cumulative_num_llm_calls"] = self.call_tracker
             return output, {"usage": usage_stats, "prompt_messages": messages, "completion_text": str(output)}
@@ -123,7 +136,7 @@ class GenericLLM:
                 json_schema=json_schema,
                 function_name=function_name,
                 function_description=function_description,
-                **self.generation_kwargs,
+                **generation_kwargs,
             )
             usage_stats["cumulative_num_llm_calls"] = self.call_tracker
 
@@ -150,7 +163,7 @@ class GenericLLM:
             json_schema=json_schema,
             function_name=function_name,
             function_description=function_description,
-            **self.generation_kwargs,
+            **generation_kwargs,
         )
         usage_stats["cumulative_num_llm_calls"] = self.call_tracker
 
@@ -4,19 +4,26 @@
 # This source code is licensed under the license found in the
 # LICENSE file in the root directory of this source tree.
 
-from typing import Callable
+from typing import Callable, Optional
 
 from dojo.core.solvers.utils.response import extract_code, extract_text_up_to_code, parse_thinking_tags
+from dojo.utils.deadline import Deadline
 
 
 def execute_op_plan_code(
-    operator_fn: Callable, *operator_args, max_operator_tries: int, requires_plan: bool = False
+    operator_fn: Callable,
+    *operator_args,
+    max_operator_tries: int,
+    requires_plan: bool = False,
+    deadline: Optional[Deadline] = None,
 ) -> tuple[str, str, str]:
     """Executes an operator function with the given arguments, attempts to extract the generated plan/code from the output
-    and retries if the extraction fails."""
+    and retries if the extraction fails. No new try is started once `deadline` has passed (`DeadlineExceeded`)."""
     completion_text = None
     text_without_thinking = None
     for _ in range(max_operator_tries):
+        if deadline is not None:
+            deadline.check("operator")
         completion_text, metrics = operator_fn(*operator_args)
         thinking_text, text_without_thinking = parse_thinking_tags(completion_text)
         code = extract_code(text_without_thinking)
@@ -11,9 +11,20 @@
 
 """
 Contains functions to manually generate a textual preview of some common file types (.csv, .json,..) for the agent.
+
+Large files are never read in full: tabular and JSONL files are previewed from a sample of their rows, and the line
+counts of large files are estimated from their size. Previews are cached on disk, keyed by a fingerprint of the data
+dir, so that all the runs on the same data share them.
+
+This module is also shipped as source to remote interpreters, so it must only import third-party packages available
+in the superimage.
 """
 
+import hashlib
+import io
 import json
+import os
+import random
 from pathlib import Path
 
 import humanize
@@ -21,25 +32,100 @@ import pandas as pd
 from genson import SchemaBuilder
 from pandas.api.types import is_numeric_dtype
 
+# bump to invalidate the cached previews when their content changes
+PREVIEW_VERSION = 2
+# maximum length of a preview, in characters
+CHAR_BUDGET = 6_000
+# number of rows (or JSONL objects) the previews are computed from
+SAMPLE_ROWS = 1_000
+# files up to this size are read in full to count their lines and sample them, larger ones are sampled by seeking
+EXACT_SCAN_MAX_BYTES = 32 * 2**20
+# single JSON documents (not JSONL) above this size are not parsed
+JSON_MAX_BYTES = 64 * 2**20
+# at most this many files of the same type are examined per directory
+MAX_PREVIEWS_PER_DIR = 5
+
 # these files are treated as code (e.g. markdown wrapped)
 code_files = {".py", ".sh", ".yaml", ".yml", ".md", ".html", ".xml", ".log", ".rst"}
 # we treat these files as text (rather than binary) files
 plaintext_files = {".txt", ".csv", ".json", ".tsv"} | code_files
 
 
+def count_lines(f: Path) -> tuple[int, bool]:
+    """
+    Count the lines of a file, exactly for files up to `EXACT_SCAN_MAX_BYTES`, otherwise by extrapolating the line
+    density of a few chunks spread over the file. Returns the count and whether it is exact.
+    """
+    size = f.stat().st_size
+    if size == 0:
+        return 0, True
+    with open(f, "rb") as fh:
+        if size <= EXACT_SCAN_MAX_BYTES:
+            num_lines = 0
+            last = b""
+            while chunk := fh.read(2**20):
+                num_lines += chunk.count(b"\n")
+                last = chunk
+            return num_lines + (not last.endswith(b"\n")), True
+
+        chunk_size, num_chunks = 2**18, 8
+        newlines = 0
+        for i in range(num_chunks):
+            fh.seek((size - chunk_size) * i // (num_chunks - 1))
+            newlines += fh.read(chunk_size).count(b"\n")
+    return max(1, round(size * newlines / (chunk_size * num_chunks))), False
+
+
 def get_file_len_size(f: Path) -> tuple[int, str]:
     """
     Calculate the size of a file (#lines for plaintext files, otherwise #bytes)
     Also returns a human-readable string representation of the size.
     """
     if f.suffix in plaintext_files:
-        num_lines = sum(1 for _ in open(f))
-        return num_lines, f"{num_lines} lines"
+        num_lines, exact = count_lines(f)
+        return num_lines, f"{num_lines} lines" if exact else f"~{num_lines} lines"
     else:
         s = f.stat().st_size
         return s, humanize.naturalsize(s)
 
 
+def sample_lines(f: Path, k: int, skip_first: bool = False, seed: int = 0) -> tuple[list[bytes], bool]:
+    """
+    Sample `k` non-empty lines of a file uniformly, with reservoir sampling for files up to `EXACT_SCAN_MAX_BYTES`
+    and by seeking to random offsets for larger ones. Returns the lines and whether they are all the lines.
+    """
+    rng = random.Random(seed)
+    size = f.stat().st_size
+    with open(f, "rb") as fh:
+        if skip_first:
+            fh.readline()
+        start = fh.tell()
+
+        if size <= EXACT_SCAN_MAX_BYTES:
+            sample: list[bytes] = []
+            seen = 0
+            for line in fh:
+                if not line.strip():
+                    continue
+                if seen < k:
+                    sample.append(line)
+                else:
+                    j = rng.randrange(seen + 1)
+                    if j < k:
+                        sample[j] = line
+                seen += 1
+            return sample, seen <= k
+
+        sample = []
+        for offset in sorted(rng.randrange(start, size) for _ in range(k)):
+            fh.seek(offset)
+            fh.readline()  # skip the (partial) line the offset falls in
+            line = fh.readline()
+            if line.strip():
+                sample.append(line)
+    return sample, False
+
+
 def file_tree(path: Path, depth=0, skip_hidden=True) -> str:
     """Generate a tree structure of files in a directory"""
     result = []
@@ -76,33 +162,47 @@ def _walk(path: Path, skip_hidden=True):
         yield p
 
 
-def preview_csv(p: Path, file_name: str, simple=True) -> str:
-    """Generate a textual preview of a csv file
-
-    Args:
-        p (Path): the path to the csv file
-        file_name (str): the file name to use in the preview
-        simple (bool, optional): whether to use a simplified version of the preview. Defaults to True.
-
-    Returns:
-        str: the textual preview
+def _read_csv_sample(p: Path) -> tuple[pd.DataFrame, int, bool, bool]:
     """
-    df = pd.read_csv(p)
-
+    Read a sample of `SAMPLE_ROWS` rows of a csv file.
+    Returns the sample, the (estimated) number of rows, whether it is exact and whether the sample is the whole file.
+    """
+    num_lines, exact = count_lines(p)
+    num_rows = max(0, num_lines - 1)
+    if num_rows <= SAMPLE_ROWS and exact:
+        return pd.read_csv(p), num_rows, exact, True
+
+    with open(p, "rb") as f:
+        header = f.readline()
+    lines, _ = sample_lines(p, SAMPLE_ROWS, skip_first=True)
+    try:
+        rows = b"".join(line if line.endswith(b"\n") else line + b"\n" for line in lines)
+        df = pd.read_csv(io.BytesIO(header + rows))
+    except (pd.errors.ParserError, UnicodeDecodeError):
+        # randomly sampled lines can break rows with quoted newlines, fall back to the first rows
+        df = pd.read_csv(p, nrows=SAMPLE_ROWS)
+    return df, num_rows, exact, False
+
+
+def _describe_csv(df: pd.DataFrame, file_name: str, num_rows: int, exact: bool, complete: bool, simple: bool) -> str:
     out = []
 
-    out.append(f"-> {file_name} has {df.shape[0]} rows and {df.shape[1]} columns.")
+    rows = f"{num_rows}" if exact else f"~{num_rows}"
+    out.append(f"-> {file_name} has {rows} rows and {df.shape[1]} columns.")
 
     if simple:
         cols = df.columns.tolist()
         sel_cols = 15
-        cols_str = ", ".join(cols[:sel_cols])
+        cols_str = ", ".join(str(c) for c in cols[:sel_cols])
         res = f"The columns are: {cols_str}"
         if len(cols) > sel_cols:
             res += f"... and {len(cols) - sel_cols} more columns"
         out.append(res)
     else:
-        out.append("Here is some information about the columns:")
+        if complete:
+            out.append("Here is some information about the columns:")
+        else:
+            out.append(f"Here is some information about the columns, from a random sample of {len(df)} rows:")
         for col in sorted(df.columns):
             dtype = df[col].dtype
             name = f"{col} ({dtype})"
@@ -124,67 +224,178 @@ def preview_csv(p: Path, file_name: str, simple=True) -> str:
     return "\n".join(out)
 
 
+def _csv_previews(p: Path, file_name: str) -> tuple[str, str]:
+    """The detailed and the simple preview of a csv file, from a single read of a sample of its rows."""
+    df, num_rows, exact, complete = _read_csv_sample(p)
+    return (
+        _describe_csv(df, file_name, num_rows, exact, complete, simple=False),
+        _describe_csv(df, file_name, num_rows, exact, complete, simple=True),
+    )
+
+
+def preview_csv(p: Path, file_name: str, simple=True) -> str:
+    """Generate a textual preview of a csv file
+
+    Args:
+        p (Path): the path to the csv file
+        file_name (str): the file name to use in the preview
+        simple (bool, optional): whether to use a simplified version of the preview. Defaults to True.
+
+    Returns:
+        str: the textual preview
+    """
+    df, num_rows, exact, complete = _read_csv_sample(p)
+    return _describe_csv(df, file_name, num_rows, exact, complete, simple=simple)
+
+
 def preview_json(p: Path, file_name: str):
     """Generate a textual preview of a json file using a generated json schema"""
     builder = SchemaBuilder()
     with open(p) as f:
         first_line = f.readline().strip()
 
-        try:
-            first_object = json.loads(first_line)
-
-            if not isinstance(first_object, dict):
-                raise json.JSONDecodeError("The first line isn't JSON", first_line, 0)
-
-            # if the the next line exists and is not empty, then it is a JSONL file
-            second_line = f.readline().strip()
-            if second_line:
-                f.seek(0)  # so reset and read line by line
-                for line in f:
-                    builder.add_object(json.loads(line.strip()))
-            # if it is empty, then it's a single JSON object file
-            else:
-                builder.add_object(first_object)
-
-        except json.JSONDecodeError:
-            # if first line isn't JSON, then it's prettified and we can read whole file
-            f.seek(0)
+    try:
+        first_object = json.loads(first_line)
+
+        if not isinstance(first_object, dict):
+            raise json.JSONDecodeError("The first line isn't JSON", first_line, 0)
+
+        # if the the next line exists and is not empty, then it is a JSONL file: its schema is built from a sample
+        lines, complete = sample_lines(p, SAMPLE_ROWS)
+        if len(lines) > 1:
+            for line in lines:
+                builder.add_object(json.loads(line))
+            if not complete:
+                file_name = f"{file_name} (from a random sample of {len(lines)} lines)"
+        # if it is empty, then it's a single JSON object file
+        else:
+            builder.add_object(first_object)
+
+    except json.JSONDecodeError:
+        # if first line isn't JSON, then it's prettified and we have to read the whole file
+        size = p.stat().st_size
+        if size > JSON_MAX_BYTES:
+            return f"-> {file_name} is a large json file ({humanize.naturalsize(size)}), its schema is not previewed."
+        with open(p) as f:
             builder.add_object(json.load(f))
 
     return f"-> {file_name} has auto-generated json schema:\n" + builder.to_json(indent=2)
 
 
-def generate(base_path, include_file_details=True, simple=False):
+def _preview_files(base_path: Path, simple: bool, char_budget: int) -> list[tuple[str, str]]:
+    """
+    The (detailed, simple) previews of the files of a directory, in order. Files are no longer previewed once the
+    simple previews alone exceed the budget, since they would be truncated anyway.
+    """
+    previews = []
+    examined_per_dir: dict[tuple[Path, str], int] = {}
+    skipped_per_dir: dict[tuple[Path, str], int] = {}
+    schemas_per_dir: dict[tuple[Path, str], set[str]] = {}
+    total = 0
+    for fn in _walk(base_path):
+        if total > char_budget:
+            break
+        key = (fn.parent, fn.suffix)
+        if fn.suffix in plaintext_files and examined_per_dir.get(key, 0) >= MAX_PREVIEWS_PER_DIR:
+            skipped_per_dir[key] = skipped_per_dir.get(key, 0) + 1
+            continue
+        file_name = str(fn.relative_to(base_path))
+        examined_per_dir[key] = examined_per_dir.get(key, 0) + 1
+
+        if fn.suffix == ".csv":
+            detailed, short = _csv_previews(fn, file_name)
+            if simple:
+                detailed = short
+        elif fn.suffix == ".json":
+            detailed = short = preview_json(fn, file_name)
+            # directories of json files usually share a single schema, it is shown once
+            schema = detailed.partition("\n")[2]
+            if schema in schemas_per_dir.setdefault(key, set()):
+                skipped_per_dir[key] = skipped_per_dir.get(key, 0) + 1
+                continue
+            schemas_per_dir[key].add(schema)
+        elif fn.suffix in plaintext_files:
+            if count_lines(fn)[0] >= 30:
+                continue
+            with open(fn) as f:
+                content = f.read()
+                if fn.suffix in code_files:
+                    content = f"```\n{content}\n```"
+                detailed = short = f"-> {file_name} has content:\n\n{content}"
+        else:
+            continue
+        previews.append((detailed, short))
+        total += len(short) + 2
+
+    for (directory, suffix), count in skipped_per_dir.items():
+        where = directory.relative_to(base_path).as_posix()
+        previews.append((f"-> ... and {count} other {suffix} files in {where}/ (not previewed)",) * 2)
+    return previews
+
+
+def _fit(tree: str, previews: list[tuple[str, str]], char_budget: int) -> str:
+    """Assemble the previews, simplifying the longest ones first until they fit the budget, then truncating."""
+    chosen = [detailed for detailed, _ in previews]
+    length = len(tree) + sum(len(p) + 2 for p in chosen)
+    by_saving = sorted(range(len(previews)), key=lambda i: len(previews[i][1]) - len(previews[i][0]))
+    for i in by_saving:
+        if length <= char_budget:
+            break
+        length -= len(chosen[i]) - len(previews[i][1])
+        chosen[i] = previews[i][1]
+
+    result = "\n\n".join([tree] + chosen)
+    # if still too long, we truncate
+    if len(result) > char_budget:
+        return result[:char_budget] + "\n... (truncated)"
+    return result
+
+
+def fingerprint(base_path: Path) -> str:
+    """Fingerprint of the files of a directory (relative paths, sizes and modification times)."""
+    h = hashlib.sha256(f"data-preview-v{PREVIEW_VERSION}".encode())
+    for p in _walk(base_path):
+        st = p.stat()
+        h.update(f"{p.relative_to(base_path).as_posix()}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def default_cache_dir() -> Path:
+    return Path(os.environ.get("DOJO_DATA_PREVIEW_CACHE", Path.home() / ".cache" / "dojo" / "data_preview"))
+
+
+def generate(
+    base_path, include_file_details=True, simple=False, char_budget=CHAR_BUDGET, use_cache=True, cache_dir=None
+):
     """
     Generate a textual preview of a directory, including an overview of the directory
-    structure and previews of individual files
+    structure and previews of individual files.
+
+    The preview is cached in `cache_dir` (`default_cache_dir()` by default) under a fingerprint of the directory,
+    and reused as long as the files are unchanged. Failing to read or write the cache is not an error.
     """
+    base_path = Path(base_path)
+    cache_path = None
+    if use_cache:
+        key = hashlib.sha256(
+            f"{fingerprint(base_path)}-{include_file_details}-{simple}-{char_budget}".encode()
+        ).hexdigest()
+        cache_path = Path(cache_dir or default_cache_dir()) / f"{key}.md"
+        try:
+            return cache_path.read_text()
+        except OSError:
+            pass
+
     tree = f"```\n{file_tree(base_path)}```"
-    out = [tree]
-
-    if include_file_details:
-        for fn in _walk(base_path):
-            file_name = str(fn.relative_to(base_path))
-
-            if fn.suffix == ".csv":
-                out.append(preview_csv(fn, file_name, simple=simple))
-            elif fn.suffix == ".json":
-                out.append(preview_json(fn, file_name))
-            elif fn.suffix in plaintext_files:
-                if get_file_len_size(fn)[0] < 30:
-                    with open(fn) as f:
-                        content = f.read()
-                        if fn.suffix in code_files:
-                            content = f"```\n{content}\n```"
-                        out.append(f"-> {file_name} has content:\n\n{content}")
-
-    result = "\n\n".join(out)
-
-    # if the result is very long we generate a simpler version
-    if len(result) > 6_000 and not simple:
-        return generate(base_path, include_file_details=include_file_details, simple=True)
-    # if still too long, we truncate
-    if len(result) > 6_000 and simple:
-        return result[:6_000] + "\n... (truncated)"
+    previews = _preview_files(base_path, simple, char_budget) if include_file_details else []
+    result = _fit(tree, previews, char_budget)
 
+    if cache_path is not None:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(result)
+            os.replace(tmp, cache_path)
+        except OSError:
+            pass
     return result
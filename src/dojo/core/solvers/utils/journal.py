@@ -98,6 +98,13 @@ class Node(DataClassJsonMixin):
             return "draft"
         return "debug" if list(self.parents)[0].is_buggy else "improve"
 
+    @property
+    def parent_id(self) -> str | None:
+        """Id of the node this node was derived from (its first parent), or None for drafts."""
+        if not self.parents:
+            return None
+        return list(self.parents)[0].id
+
     def absorb_exec_result(self, exec_result: ExecutionResult):
         """Absorb the result of executing the code from this node."""
         if exec_result is None:
@@ -7,11 +7,17 @@
 import os
 import subprocess
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, Optional, Tuple
 
 from omegaconf import OmegaConf
 
+from dojo.core.interpreters.base import ExecutionResult
+from dojo.core.tasks.constants import EXECUTION_OUTPUT, SCREENING_FAILURE, VALID_SOLUTION
+from dojo.core.tasks.execution_cache import ExecutionCache, default_cache_dir, execution_context
+from dojo.core.tasks.grading_service import GradingService
+from dojo.utils.code_screening import CodeScreener
 from dojo.utils.logger import get_logger
+from dojo.utils.deadline import Deadline
 
 from dojo.config_dataclasses.task.base import TaskConfig
 
@@ -39,6 +45,10 @@ class Task(ABC):
         # Convert the provided configuration dictionary into an OmegaConf object for structured access.
         self.cfg = cfg
         self.logger = get_logger()  # Store the logger for use in other methods if needed.
+        # set by `start_code_screening`
+        self.code_screener: Optional[CodeScreener] = None
+        # set by `start_execution_cache`
+        self.execution_cache: Optional[ExecutionCache] = None
 
     @abstractmethod
     def prepare(self, **task_args: Optional[Dict]) -> Dict:
@@ -56,7 +66,15 @@ class Task(ABC):
         pass
 
     @abstractmethod
-    def step_task(self, state: Dict, action: Any) -> Tuple[Dict, Dict]:
+    def step_task(
+        self,
+        state: Dict,
+        action: Any,
+        *,
+        node_id: Optional[str] = None,
+        parent_node_id: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[Dict, Dict]:
         """
         Execute a single step of the task using the provided action.
 
@@ -65,6 +83,11 @@ class Task(ABC):
         Args: sv
             state (Dict): The current state of the task environment
             action (Any): The action to be performed in the task environment.
+            node_id (str, optional): Id of the solver node the action belongs to. Used to isolate the
+                artifacts of each node (e.g. per-node workspaces).
+            parent_node_id (str, optional): Id of the node the action was derived from, whose artifacts
+                may be reused.
+            deadline (Deadline, optional): Deadline of the search, that the step must not overshoot.
 
         Returns:
             Tuple[Dict, Dict]: A tuple containing the new state of the task environment and the outcome of the action.
@@ -93,6 +116,67 @@ class Task(ABC):
         """
         pass
 
+    def start_grading_service(self, loader: Optional[Callable[[], Any]] = None) -> Optional[GradingService]:
+        """
+        Start the grading workers configured by `grading_workers`, or return None to grade inline.
+
+        Args:
+            loader (Callable, optional): Picklable callable loading the grading context, once per worker.
+        """
+        if self.cfg.grading_workers == 0:
+            return None
+        self.logger.info(f"Starting {self.cfg.grading_workers} grading worker(s)")
+        return GradingService(
+            loader,
+            num_workers=self.cfg.grading_workers,
+            timeout=self.cfg.grading_timeout,
+            memory_limit_mb=self.cfg.grading_memory_limit_mb,
+        )
+
+    def start_code_screening(self, interpreter, file_name: str = "runfile.py") -> None:
+        """Set up the screening of the solutions run by `interpreter`, if `screen_code` is enabled."""
+        if not self.cfg.screen_code:
+            return
+        self.code_screener = CodeScreener.for_interpreter(interpreter, file_name=file_name)
+
+    def screen_solution(self, solution: str) -> Optional[Dict[str, Any]]:
+        """
+        Statically check a solution before executing it.
+
+        Returns:
+            Optional[Dict[str, Any]]: None if the solution may run. Otherwise the outcome of the step: a failed
+                execution ending with the traceback the solution would raise, and why under `SCREENING_FAILURE`.
+        """
+        if self.code_screener is None:
+            return None
+        failure = self.code_screener.screen(solution)
+        if failure is None:
+            return None
+        self.logger.info(f"Solution rejected before execution: {failure.summary}")
+        exec_output = ExecutionResult(
+            term_out=[failure.traceback(self.code_screener.file_name)],
+            exec_time=0,
+            exit_code=1,
+            exc_type=failure.exc_type,
+            exc_info={"screened": True},
+        )
+        return {EXECUTION_OUTPUT: exec_output, VALID_SOLUTION: False, SCREENING_FAILURE: failure.summary}
+
+    def start_execution_cache(self, interpreter) -> None:
+        """Set up the cache of the executions of solutions by `interpreter`, if `execution_cache` is enabled."""
+        if not self.cfg.execution_cache:
+            return
+        if getattr(interpreter, "workspaces", None) is not None:
+            # a cache hit would leave the node without the workspace (checkpoints, features, ...) its children build on
+            self.logger.warning("The execution cache is not supported with per-node workspaces, it is disabled.")
+            return
+        context = execution_context(interpreter, self.cfg.data_dir, self.cfg.hash())
+        self.execution_cache = ExecutionCache(
+            self.cfg.execution_cache_dir or default_cache_dir(),
+            max_size_mb=self.cfg.execution_cache_max_size_mb,
+            context=context,
+        )
+
     @abstractmethod
     def close(self, state: Dict) -> None:
         """
@@ -17,3 +17,15 @@ EXECUTION_OUTPUT = "execution_output"
 TASK_DESCRIPTION = "task_description"
 
 VALID_SOLUTION_FEEDBACK = "valid_solution_feedback"
+
+# why the solution was rejected by the pre-execution screening, without being executed
+SCREENING_FAILURE = "screening_failure"
+
+# precomputed preview of the data, used by the solvers instead of generating one at startup
+DATA_PREVIEW = "data_preview"
+
+# file the data preview is precomputed to, next to the public data dir of a prepared task
+DATA_PREVIEW_FNAME = "data_preview.md"
+
+# grading submitted to a grading service, see `dojo.core.tasks.grading_service.resolve_grading`
+PENDING_GRADING = "pending_grading"
@@ -0,0 +1,190 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Cache of the executions of solutions, shared across runs (seeds, resumed runs, ...).
+
+Identical solutions are regularly executed again: the agents regenerate byte-identical baselines, and the debug cycle
+revisits code it has already run. An entry stores the execution result of a solution, its submission file and the
+outcome of its grading, so that executing it again costs nothing. Entries are keyed by the solution (as normalized
+by `extract_code`) and the context of its execution: a fingerprint of the task data, the version of the environment
+the code runs in and the configuration of the task and interpreter. They are evicted in least-recently-used order
+once the cache exceeds its disk quota.
+
+Reusing an entry assumes the solution is deterministic, which is why the cache is opt-in.
+"""
+
+import hashlib
+import importlib.metadata
+import json
+import os
+import shutil
+import sys
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from dojo.core.interpreters.base import ExecutionResult
+from dojo.core.interpreters.utils import directory_fingerprint
+from dojo.utils.logger import get_logger
+
+logger = get_logger()
+
+_EXECUTION_FNAME = "execution.json"
+_GRADING_FNAME = "grading.json"
+_SUBMISSION_STEM = "submission"
+
+
+def default_cache_dir() -> Path:
+    return Path(os.environ.get("DOJO_EXECUTION_CACHE", Path.home() / ".cache" / "dojo" / "execution_cache"))
+
+
+def environment_version(interpreter) -> str:
+    """Version of the environment `interpreter` runs code in: its container image, or the local Python packages."""
+    version = getattr(interpreter, "superimage_version", None)
+    if version is not None:
+        return f"superimage-{version}"
+    h = hashlib.sha256(sys.version.encode())
+    for dist in sorted(f"{d.metadata['Name']}=={d.version}" for d in importlib.metadata.distributions()):
+        h.update(dist.encode())
+        h.update(b"\0")
+    return f"python-{h.hexdigest()}"
+
+
+def execution_context(interpreter, data_dir: Path | str, config_hash: str) -> str:
+    """
+    Everything an execution depends on besides the code: the data, the environment, the resources of the
+    interpreter and the configuration of the task (`config_hash`).
+    """
+    parts = {
+        "data": directory_fingerprint(Path(data_dir)),
+        "environment": environment_version(interpreter),
+        "interpreter": type(interpreter).__name__,
+        "timeout": getattr(interpreter, "timeout", None),
+        "memory_limit_mb": getattr(interpreter, "memory_limit_mb", None),
+        "config": config_hash,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+@dataclass
+class CachedExecution:
+    """A cache entry: the execution result, the submission it wrote (if any) and its grading (if known)."""
+
+    exec_output: ExecutionResult
+    submission_path: Optional[Path] = None
+    grading: Optional[Dict[str, Any]] = None
+
+
+class ExecutionCache:
+    """
+    A disk-backed cache of executions with an LRU disk quota.
+
+    Args:
+        root (Path | str): Directory holding the cached entries.
+        max_size_mb (int): Disk quota of the cache. Least recently used entries are evicted beyond it.
+        context (str): Context of the executions (see `execution_context`), mixed into every key so that entries are
+            never reused across datasets, environments or configurations.
+    """
+
+    def __init__(self, root: Path | str, max_size_mb: int = 20_000, context: str = "") -> None:
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = int(max_size_mb) * 1024 * 1024
+        self.context = context
+
+    def key(self, code: str) -> str:
+        """Build the cache key of the execution of `code`, which must already be normalized by `extract_code`."""
+        h = hashlib.sha256()
+        for part in (code, self.context):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def get(self, key: str) -> Optional[CachedExecution]:
+        path = self._path(key)
+        try:
+            exec_output = ExecutionResult.from_json((path / _EXECUTION_FNAME).read_text())
+            grading_path = path / _GRADING_FNAME
+            grading = json.loads(grading_path.read_text()) if grading_path.exists() else None
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable execution cache entry {path}: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+
+        submission_path = next(path.glob(f"{_SUBMISSION_STEM}*"), None)
+        # the modification time doubles as the last access time for the LRU eviction
+        os.utime(path)
+        return CachedExecution(exec_output, submission_path, grading)
+
+    def put(self, key: str, exec_output: ExecutionResult, submission_path: Optional[Path] = None) -> None:
+        """Store the execution of a solution and a copy of the submission it wrote. Replaces any previous entry."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary directory first so that concurrent readers never see a partial entry
+        tmp = path.with_name(f".{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            tmp.mkdir()
+            (tmp / _EXECUTION_FNAME).write_text(exec_output.to_json())
+            if submission_path is not None:
+                shutil.copyfile(submission_path, tmp / f"{_SUBMISSION_STEM}{Path(submission_path).suffix}")
+            shutil.rmtree(path, ignore_errors=True)
+            try:
+                os.replace(tmp, path)
+            except OSError:
+                # another run stored the same execution first
+                pass
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def put_grading(self, key: str, grading: Dict[str, Any]) -> None:
+        """Store the grading of the submission of an entry, once it is known."""
+        path = self._path(key)
+        if not path.is_dir():
+            return
+        tmp = path / f".{_GRADING_FNAME}.{uuid.uuid4().hex}.tmp"
+        try:
+            tmp.write_text(json.dumps(grading, default=str))
+            os.replace(tmp, path / _GRADING_FNAME)
+        except FileNotFoundError:
+            # evicted in the meantime
+            pass
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def size_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.root.glob("*/*/*"))
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in its quota."""
+        entries = []
+        for path in self.root.glob("*/*"):
+            if path.name.startswith("."):
+                continue
+            try:
+                size = sum(p.stat().st_size for p in path.iterdir())
+                entries.append((path.stat().st_mtime, size, path))
+            except FileNotFoundError:
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logger.debug(f"Evicted execution cache entry {path}")
+
+    def clear(self) -> None:
+        for path in self.root.glob("*/*"):
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,207 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Out-of-process grading of submissions.
+
+Grading runs in persistent worker processes, so that a slow or pathological submission cannot block the search past
+a timeout and a crashing grader cannot take the run down with it. Every worker loads the grading context of the task
+(answers, leaderboard, ground truth, ...) once, when it starts, and is restarted after a timeout or a crash.
+
+Tasks submit grading jobs from `step_task` and return a `PendingGrading` under `PENDING_GRADING` in the evaluation
+result. Solvers call `resolve_grading` once they need the outcome, after the analysis of the execution, so that the
+grading overlaps with the analysis LLM call.
+"""
+
+import multiprocessing
+import queue
+import threading
+import traceback
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from dojo.core.interpreters.resource_limits import apply_process_limits
+from dojo.core.tasks.constants import PENDING_GRADING, VALID_SOLUTION, VALID_SOLUTION_FEEDBACK
+
+import logging
+
+log = logging.getLogger(__name__)
+
+# workers are spawned: forking the solver process would also fork its threads (websockets, log handlers, ...)
+_spawn_ctx = multiprocessing.get_context("spawn")
+
+
+class GradingError(RuntimeError):
+    """Raised when a grading job failed, timed out or lost its worker."""
+
+
+def _worker_main(conn, loader: Optional[Callable[[], Any]], memory_limit_mb: Optional[int]) -> None:
+    apply_process_limits(memory_limit_mb=memory_limit_mb)
+    try:
+        context = loader() if loader is not None else None
+    except BaseException:
+        conn.send(("error", f"Failed to load the grading context:\n{traceback.format_exc()}"))
+        return
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        fn, args = job
+        try:
+            conn.send(("ok", fn(context, *args)))
+        except BaseException:
+            conn.send(("error", traceback.format_exc()))
+
+
+class _Worker:
+    """A grading process, (re)started on demand."""
+
+    def __init__(self, loader: Optional[Callable[[], Any]], memory_limit_mb: Optional[int]) -> None:
+        self.loader = loader
+        self.memory_limit_mb = memory_limit_mb
+        self.process = None
+        self.conn = None
+        self.ready = False
+
+    def start(self) -> None:
+        self.conn, child_conn = _spawn_ctx.Pipe()
+        self.process = _spawn_ctx.Process(
+            target=_worker_main, args=(child_conn, self.loader, self.memory_limit_mb), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def stop(self) -> None:
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+        self.process = None
+
+    def _receive(self, timeout: Optional[float]):
+        if not self.conn.poll(timeout):
+            self.stop()
+            raise GradingError(f"Grading did not finish within {timeout}s.")
+        try:
+            return self.conn.recv()
+        except EOFError:
+            self.process.join(timeout=5)
+            exitcode = self.process.exitcode
+            self.stop()
+            raise GradingError(f"The grading worker died (exit code {exitcode}).")
+
+    def run(self, fn: Callable, args: tuple, timeout: Optional[float]) -> Any:
+        if self.process is None or not self.process.is_alive():
+            self.stop()
+            self.start()
+        if not self.ready:
+            # loading the context is not part of the job, it is not bound by its timeout
+            status, value = self._receive(None)
+            if status == "error":
+                self.stop()
+                raise GradingError(value)
+            self.ready = True
+
+        self.conn.send((fn, args))
+        status, value = self._receive(timeout)
+        if status == "error":
+            raise GradingError(value)
+        return value
+
+
+class GradingService:
+    """
+    A pool of grading workers sharing a queue of jobs.
+
+    Args:
+        loader (Callable | None): Picklable callable returning the grading context, called once in every worker.
+        num_workers (int): Number of worker processes.
+        timeout (float | None): Maximum time a job may take, in seconds.
+        memory_limit_mb (int | None): Address-space limit of every worker, in MB.
+    """
+
+    def __init__(
+        self,
+        loader: Optional[Callable[[], Any]] = None,
+        num_workers: int = 1,
+        timeout: Optional[float] = None,
+        memory_limit_mb: Optional[int] = None,
+    ) -> None:
+        self.timeout = timeout
+        self._jobs: queue.Queue = queue.Queue()
+        self._workers = [_Worker(loader, memory_limit_mb) for _ in range(num_workers)]
+        self._threads = []
+        for worker in self._workers:
+            # start loading the context right away, while the first solution is being generated
+            worker.start()
+            thread = threading.Thread(target=self._dispatch, args=(worker,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _dispatch(self, worker: _Worker) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                worker.stop()
+                return
+            future, fn, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(worker.run(fn, args, self.timeout))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Grade asynchronously: `fn(context, *args)` is called in a worker. `fn` and `args` must be picklable."""
+        future: Future = Future()
+        self._jobs.put((future, fn, args))
+        return future
+
+    def close(self) -> None:
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join(timeout=10)
+        self._threads = []
+
+
+class PendingGrading:
+    """
+    A grading job submitted by `step_task`, whose outcome is merged into the evaluation result by `resolve_grading`.
+
+    Args:
+        future (Future): The job, as returned by `GradingService.submit`.
+        finish (Callable): Turns the result of the job into entries of the evaluation result.
+    """
+
+    def __init__(self, future: Future, finish: Callable[[Any], Dict[str, Any]]) -> None:
+        self.future = future
+        self.finish = finish
+
+    def resolve(self) -> Dict[str, Any]:
+        try:
+            result = self.future.result()
+        except GradingError as e:
+            log.error(f"Grading failed: {e}")
+            return {VALID_SOLUTION: False, VALID_SOLUTION_FEEDBACK: f"The submission could not be graded: {e}"}
+        return self.finish(result)
+
+
+def resolve_grading(eval_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Wait for the grading submitted by `step_task`, if any, and merge its outcome into `eval_result`."""
+    pending = eval_result.pop(PENDING_GRADING, None)
+    if pending is not None:
+        eval_result.update(pending.resolve())
+    return eval_result
@@ -104,6 +104,7 @@ def _main(cfg: RunConfig):
     # Load checkpoint state if it exists
     log.info("Loading checkpoints, if any...")
     solver.load_checkpoint()
+    solver.install_preemption_handlers()
 
     log.info("Starting the solver...")
     state, solution, best_node = solver(task, state)
@@ -42,8 +42,12 @@ from dojo.core.solvers.utils.search_exporter import export_search_results
 from dojo.solvers.utils import get_complextiy_level
 from dojo.utils.logger import CollectiveLogger, LogEvent
 from dojo.utils.code_parsing import parse_json_output
+from dojo.utils.deadline import Deadline, DeadlineExceeded
+from dojo.core.tasks.grading_service import resolve_grading
 from dojo.core.tasks.constants import (
+    DATA_PREVIEW,
     EXECUTION_OUTPUT,
+    SCREENING_FAILURE,
     TASK_DESCRIPTION,
     VALID_SOLUTION_FEEDBACK,
     VALIDATION_FITNESS,
@@ -572,6 +576,7 @@ class Evolutionary(Solver):
         self.setup_operators()
 
         self.state = EvolutionaryState()
+        self.deadline = Deadline(self.cfg.time_limit_secs)
 
     def save_checkpoint(self):
         super().save_checkpoint()
@@ -579,9 +584,7 @@ class Evolutionary(Solver):
         # Write the journal to a jsonl file
         journal_sd = self.journal.node_list()
         journal_path = Path(self.cfg.checkpoint_path) / "journal.jsonl"
-        with open(journal_path, "w") as f:
-            for node in journal_sd:
-                f.write(json.dumps(node) + "\n")
+        self._write_atomic(journal_path, "".join(json.dumps(node) + "\n" for node in journal_sd))
         self.logger.info(f"Checkpoint saved to {journal_path}")
 
     def load_checkpoint(self):
@@ -636,11 +639,12 @@ class Evolutionary(Solver):
             self.task_desc,
             self.journal,
             self.state.current_step,
-            self.cfg.time_limit_secs - self.state.running_time,
+            self.deadline.remaining(),
             self.data_preview,
             get_complextiy_level(self.root_node) if self.cfg.use_complexity else None,
             self.root_node,
             max_operator_tries=self.cfg.max_llm_call_retries,
+            deadline=self.deadline,
         )
         node = Node(
             plan=plan, code=code, parents=[self.root_node], operators_used=["draft"], operators_metrics=[metrics]
@@ -668,10 +672,11 @@ class Evolutionary(Solver):
             self.journal,
             parent_node,
             self.state.current_step,
-            self.cfg.time_limit_secs - self.state.running_time,
+            self.deadline.remaining(),
             get_complextiy_level(parent_node) if self.cfg.use_complexity else None,
             self.data_preview,
             max_operator_tries=self.cfg.max_llm_call_retries,
+            deadline=self.deadline,
         )
         node = Node(
             plan=plan, code=code, parents=[parent_node], operators_used=["improve"], operators_metrics=[metrics]
@@ -699,9 +704,10 @@ class Evolutionary(Solver):
             self.journal,
             parent_node,
             self.state.current_step,
-            self.cfg.time_limit_secs - self.state.running_time,
+            self.deadline.remaining(),
             self.data_preview,
             max_operator_tries=self.cfg.max_llm_call_retries,
+            deadline=self.deadline,
         )
         node = Node(plan=plan, code=code, parents=[parent_node], operators_used=["debug"], operators_metrics=[metrics])
         self.logger.info(f"Debug Node Created - Metrics: {metrics}")
@@ -734,9 +740,10 @@ class Evolutionary(Solver):
             parent_node1,
             parent_node2,
             self.state.current_step,
-            self.cfg.time_limit_secs - self.state.running_time,
+            self.deadline.remaining(),
             self.data_preview,
             max_operator_tries=self.cfg.max_llm_call_retries,
+            deadline=self.deadline,
         )
         node = Node(
             plan=plan,
@@ -755,10 +762,16 @@ class Evolutionary(Solver):
 
         Creates a small preview of the data (head, shapes, etc.) that can be used
         to help the LLM understand the data structure when generating solutions.
+        The preview precomputed by the task, if any, is used instead.
 
         Args:
             state: The current solver state containing the interpreter
         """
+        if self.task_info.get(DATA_PREVIEW) is not None:
+            self.data_preview = self.task_info[DATA_PREVIEW]
+            self.logger.debug("Using the data preview precomputed by the task")
+            return
+
         assert "solver_interpreter" in state, (
             "For generating data previews, the solver needs access to an interpreter."
         )
@@ -783,26 +796,54 @@ class Evolutionary(Solver):
         num_generations = self.cfg.num_generations
         return initial_temp - (initial_temp - final_temp) * iteration / num_generations
 
-    def debug_cycle(self, state, task, buggy_node: Node):
+    def debug_cycle(self, state, task, buggy_node: Node, depth_used: int = 0, time_used: float = 0.0):
+        """
+        Debug `buggy_node`, which must already be in the journal, journaling every attempt. A node resumed from an
+        interrupted debug cycle passes the `depth_used` and `time_used` of that cycle, to continue it.
+        """
         current_debug_node = buggy_node  # Start with the initial buggy node
         debug_path = [current_debug_node]  # Path includes the initial buggy node
         debug_depth = self.cfg.max_debug_depth
         fixed_metric = None
         # We set the initial debug cycle time to the execution time of the first buggy node
-        total_debug_cycle_time = current_debug_node.exec_time if current_debug_node.exec_time is not None else 0
+        total_debug_cycle_time = time_used + (current_debug_node.exec_time or 0)
+        if depth_used > 0 and total_debug_cycle_time >= self.cfg.max_debug_time:
+            return state, debug_path, fixed_metric
 
         # We run the debug cycle for a number of times
         # or until time runs out, whichever comes first
-        for _ in range(debug_depth):
+        for depth in range(depth_used, debug_depth):
             # Create the debugged node
-            fixed_node_attempt = self._debug(current_debug_node)
+            try:
+                fixed_node_attempt = self._debug(current_debug_node)
+            except DeadlineExceeded as e:
+                self.logger.info(f"{e} Ending the debug cycle", LogEvent.SOLVER)
+                break
             # Evaluate the attempt
             try:
-                state, eval_result = task.step_task(state, extract_code(fixed_node_attempt.code))
+                # resumed within its debug cycle if the run is interrupted
+                self.begin_execution(
+                    fixed_node_attempt, context={"debug_depth": depth + 1, "debug_time": total_debug_cycle_time}
+                )
+                state, eval_result = task.step_task(
+                    state,
+                    extract_code(fixed_node_attempt.code),
+                    node_id=fixed_node_attempt.id,
+                    parent_node_id=fixed_node_attempt.parent_id,
+                    deadline=self.deadline,
+                )
                 self.parse_eval_result(node=fixed_node_attempt, eval_result=eval_result)
+                self.journal.append(fixed_node_attempt)
+                self.end_execution()
+                self.log_journal()
+                self.state.current_step += 1
                 debug_path.append(fixed_node_attempt)
                 current_debug_node = fixed_node_attempt  # Update the node for the next iteration
+            except DeadlineExceeded:
+                # the attempt stays pending, to be resumed within this cycle
+                raise
             except Exception as e:
+                self.end_execution()
                 self.logger.error(f"Error during debug step execution/parsing: {e}", LogEvent.SOLVER)
                 break  # Break the debug cycle on execution/parsing error
 
@@ -853,12 +894,22 @@ class Evolutionary(Solver):
         # Absorb the execution output into the node
         node.absorb_exec_result(eval_result[EXECUTION_OUTPUT])
 
-        # Safely perform the analyze operation
-        try:
-            response = self._analyze(node)
-        except Exception as e:
-            self.logger.error(f"Error during analysis operator: {str(e)}")
-            response = {}
+        # A solution rejected before execution is buggy, there is no output to analyze
+        if eval_result.get(SCREENING_FAILURE) is not None:
+            response = {"metric": None, "summary": eval_result[SCREENING_FAILURE], "is_bug": True}
+        else:
+            # Safely perform the analyze operation
+            try:
+                response = self._analyze(node)
+            except DeadlineExceeded:
+                # out of time: the node must not be recorded as analyzed
+                raise
+            except Exception as e:
+                self.logger.error(f"Error during analysis operator: {str(e)}")
+                response = {}
+
+        # Collect the grading of the submission, which ran during the analysis
+        resolve_grading(eval_result)
 
         # Parse response to dictionary
         # If the response is a string, we try to parse it into a dictionary
@@ -955,9 +1006,10 @@ class Evolutionary(Solver):
         # define a schedule for temperature of sampling
         temp_scheduler = self.linear_decay
 
+        out_of_time = False
         for generation_id in range(self.state.current_generation, self.cfg.num_generations):
             # Measure state time of the generation
-            start_time = time.monotonic()
+            start_time = self._step_started_at = time.monotonic()
 
             # fix the temperature for sampling
             temperature = temp_scheduler(iteration=generation_id)
@@ -995,26 +1047,53 @@ class Evolutionary(Solver):
                     f"Creating node for individual {counter_id} in generation {generation_id}", LogEvent.SOLVER
                 )
 
-                child_node = create_node_fn(*in_context_nodes)
-                state, eval_result = task.step_task(state, extract_code(child_node.code))
-                self.parse_eval_result(child_node, eval_result)
+                try:
+                    # Execute again the node whose execution was interrupted in a previous run, if any
+                    child_node = self.pop_resumable_node()
+                    debug_context, self.resumed_context = self.resumed_context, {}
+                    if child_node is None:
+                        child_node = create_node_fn(*in_context_nodes)
+                    self.begin_execution(child_node)
+                    state, eval_result = task.step_task(
+                        state,
+                        extract_code(child_node.code),
+                        node_id=child_node.id,
+                        parent_node_id=child_node.parent_id,
+                        deadline=self.deadline,
+                    )
+                    self.parse_eval_result(child_node, eval_result)
+                except DeadlineExceeded as e:
+                    # keep the individuals of the generation created so far
+                    self.logger.info(f"{e} Stopping search", LogEvent.SOLVER)
+                    island_ids.pop()
+                    out_of_time = True
+                    break
+                # journal the node before debugging it, so that its debug attempts can be resumed after a preemption
+                self.journal.append(child_node)
+                self.end_execution()
+                self.log_journal()
+                self.state.current_step += 1
                 # if the node is buggy, we run a debug cycle
                 # and add the fixed node to the generation
                 # if the node is not buggy, we add it to the generation
                 if not child_node.is_buggy:
-                    self.journal.append(child_node)
-                    self.log_journal()
-                    self.state.current_step += 1
                     solution_nodes.append(child_node)
                     counter_ids.append(counter_id)
                 else:
                     self.logger.info(f"Node {child_node.id} was buggy, entering debug cycle.", LogEvent.SOLVER)
-                    state, debug_path, fixed_metric = self.debug_cycle(state, task, child_node)
-                    # Add the debug path to the journal
-                    for n in debug_path:
-                        self.journal.append(n)
-                        self.log_journal()
-                        self.state.current_step += 1
+                    # a node resumed from an interrupted debug cycle continues that cycle
+                    try:
+                        state, debug_path, fixed_metric = self.debug_cycle(
+                            state,
+                            task,
+                            child_node,
+                            depth_used=debug_context.get("debug_depth", 0),
+                            time_used=debug_context.get("debug_time", 0.0),
+                        )
+                    except DeadlineExceeded as e:
+                        self.logger.info(f"{e} Stopping search", LogEvent.SOLVER)
+                        out_of_time = True
+                        break
                     if fixed_metric is not None:
                         fixed_node = debug_path[-1]  # Get the last node (the fixed one)
                         self.logger.info(
@@ -1045,6 +1124,7 @@ class Evolutionary(Solver):
                 )
 
             self.state.running_time += time.monotonic() - start_time
+            self._step_started_at = None
             self.logger.info(
                 f"Step {self.state.current_step} | Generation {self.state.current_generation}: Time taken for generation: {self.state.running_time:.3f} seconds"
             )
@@ -1055,7 +1135,11 @@ class Evolutionary(Solver):
             self.logger.info(f"Step {self.state.current_step}: Saving checkpoint")
             self.save_checkpoint()
 
-            if self.state.running_time >= self.cfg.time_limit_secs or self.state.current_step >= self.cfg.step_limit:
+            if (
+                out_of_time
+                or self.state.running_time >= self.cfg.time_limit_secs
+                or self.state.current_step >= self.cfg.step_limit
+            ):
                 self.logger.info("Maximum runtime reached, stopping search")
                 break
 
@@ -1077,7 +1161,10 @@ class Evolutionary(Solver):
         if not self.journal.nodes or self.data_preview is None:
             self.update_data_preview(state)
 
-        state, solution = self.search(task, state)
+        # every stage of the search clips its own timeout to the time left
+        self.deadline = Deadline(self.cfg.time_limit_secs - self.state.running_time)
+        with self.deadline.activate():
+            state, solution = self.search(task, state)
 
         # Export results at the end of the search process
         export_search_results(self.cfg, self.journal, self.logger, "EVO")
@@ -30,11 +30,15 @@ from dojo.core.solvers.utils.metric import MetricValue, WorstMetricValue
 from dojo.core.solvers.utils.response import extract_code
 from dojo.solvers.utils import get_complextiy_level
 from dojo.utils.code_parsing import parse_json_output
+from dojo.utils.deadline import Deadline, DeadlineExceeded
 from dojo.core.solvers.utils.search_exporter import (
     export_search_results,
 )
+from dojo.core.tasks.grading_service import resolve_grading
 from dojo.core.tasks.constants import (
+    DATA_PREVIEW,
     EXECUTION_OUTPUT,
+    SCREENING_FAILURE,
     TASK_DESCRIPTION,
     VALID_SOLUTION_FEEDBACK,
     VALIDATION_FITNESS,
@@ -72,6 +76,7 @@ class Greedy(Solver):
         self.setup_operators()
 
         self.state = GreedyState()
+        self.deadline = Deadline(self.cfg.time_limit_secs)
 
     def save_checkpoint(self):
         super().save_checkpoint()
@@ -79,9 +84,7 @@ class Greedy(Solver):
         # Write the journal to a jsonl file
         journal_sd = self.journal.node_list()
         journal_path = Path(self.cfg.checkpoint_path) / "journal.jsonl"
-        with open(journal_path, "w") as f:
-            for node in journal_sd:
-                f.write(json.dumps(node) + "\n")
+        self._write_atomic(journal_path, "".join(json.dumps(node) + "\n" for node in journal_sd))
         self.logger.info(f"Checkpoint saved to {journal_path}")
 
     def load_checkpoint(self):
@@ -160,11 +163,21 @@ class Greedy(Solver):
         # Create a blank root node to start.
         self.create_root_node()
 
-        # Run the search
+        # Run the search, every stage of a step clipping its own timeout to the time left
+        self.deadline = Deadline(self.cfg.time_limit_secs - self.state.running_time)
         for _ in range(self.state.current_step, self.cfg.step_limit):
-            start_time = time.monotonic()
-            state, _ = self.step(task, state)
+            start_time = self._step_started_at = time.monotonic()
+            try:
+                with self.deadline.activate():
+                    state, _ = self.step(task, state)
+            except DeadlineExceeded as e:
+                self.state.running_time += time.monotonic() - start_time
+                self._step_started_at = None
+                self.logger.info(f"{e} Stopping search")
+                self.save_checkpoint()
+                break
             self.state.running_time += time.monotonic() - start_time
+            self._step_started_at = None
             self.logger.info(
                 f"Step {self.state.current_step}: Time taken for step: {self.state.running_time:.3f} seconds"
             )
@@ -184,6 +197,8 @@ class Greedy(Solver):
         # Export the search results
         try:
             export_search_results(self.cfg, self.journal, self.logger, "Greedy")
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.logger.error(f"Error exporting search results: {e}")
 
@@ -255,11 +270,12 @@ class Greedy(Solver):
             self.task_desc,
             self.journal,
             self.state.current_step,
-            self.cfg.time_limit_secs - self.state.running_time,
+            self.deadline.remaining(),
             self.data_preview,
             get_complextiy_level(num=len(self.journal.draft_nodes)) if self.cfg.use_complexity else None,
             self.root_node,
             max_operator_tries=self.cfg.max_llm_call_retries,
+            deadline=self.deadline,
         )
         node = Node(
             plan=plan, code=code, operators_used=["draft"], operators_metrics=[metrics], parents=[self.root_node]
@@ -289,10 +305,11 @@ class Greedy(Solver):
             self.journal,
             parent_node,
             self.state.current_step,
-            self.cfg.time_limit_secs - self.state.running_time,
+            self.deadline.remaining(),
             get_complextiy_level(parent_node) if self.cfg.use_complexity else None,
             self.data_preview,
             max_operator_tries=self.cfg.max_llm_call_retries,
+            deadline=self.deadline,
         )
         node = Node(
             plan=plan, code=code, parents=[parent_node], operators_used=["improve"], operators_metrics=[metrics]
@@ -323,9 +340,10 @@ class Greedy(Solver):
             self.journal,
             parent_node,
             self.state.current_step,
-            self.cfg.time_limit_secs - self.state.running_time,
+            self.deadline.remaining(),
             self.data_preview,
             max_operator_tries=self.cfg.max_llm_call_retries,
+            deadline=self.deadline,
         )
         node = Node(plan=plan, code=code, parents=[parent_node], operators_used=["debug"], operators_metrics=[metrics])
 
@@ -360,10 +378,16 @@ class Greedy(Solver):
 
         Creates a small preview of the data (head, shapes, etc.) that can be used
         to help the LLM understand the data structure when generating solutions.
+        The preview precomputed by the task, if any, is used instead.
 
         Args:
             state: The current solver state containing the interpreter
         """
+        if self.task_info.get(DATA_PREVIEW) is not None:
+            self.data_preview = self.task_info[DATA_PREVIEW]
+            self.logger.debug("Using the data preview precomputed by the task")
+            return
+
         assert "solver_interpreter" in state, (
             "For generating data previews, the solver needs access to an interpreter."
         )
@@ -404,23 +428,33 @@ class Greedy(Solver):
         if not self.journal.nodes or self.data_preview is None:
             self.update_data_preview(state)
 
-        # Select the parent node
-        parent_node = self.search_policy()
-        self.logger.debug(f"Step {self.state.current_step}: Selected parent node: {parent_node}")
-
-        # If no parent node is selected, draft a new solution.
-        # Otherwise, if the parent node is buggy, debug it.
-        # Otherwise, improve the parent node.
-        if parent_node is None:
-            result_node = self._draft()
-        elif parent_node.is_buggy:
-            result_node = self._debug(parent_node)
-        else:
-            result_node = self._improve(parent_node)
+        # Execute again the node whose execution was interrupted in a previous run, if any
+        result_node = self.pop_resumable_node()
+        if result_node is None:
+            # Select the parent node
+            parent_node = self.search_policy()
+            self.logger.debug(f"Step {self.state.current_step}: Selected parent node: {parent_node}")
+
+            # If no parent node is selected, draft a new solution.
+            # Otherwise, if the parent node is buggy, debug it.
+            # Otherwise, improve the parent node.
+            if parent_node is None:
+                result_node = self._draft()
+            elif parent_node.is_buggy:
+                result_node = self._debug(parent_node)
+            else:
+                result_node = self._improve(parent_node)
 
         # Evaluate the code
         self.logger.debug(f"Step {self.state.current_step}: Executing generated code")
-        state, eval_result = task.step_task(state, extract_code(result_node.code))
+        self.begin_execution(result_node)
+        state, eval_result = task.step_task(
+            state,
+            extract_code(result_node.code),
+            node_id=result_node.id,
+            parent_node_id=result_node.parent_id,
+            deadline=self.deadline,
+        )
 
         # Update running time
         # self.state.running_time += eval_result[EXECUTION_OUTPUT].exec_time
@@ -430,6 +464,7 @@ class Greedy(Solver):
 
         # Store in the journal
         self.journal.append(result_node)
+        self.end_execution()
 
         # Log the best node
         best_node = self.journal.get_best_node()
@@ -475,12 +510,22 @@ class Greedy(Solver):
         # Absorb the execution output into the node
         node.absorb_exec_result(eval_result[EXECUTION_OUTPUT])
 
-        # Safely perform the analyze operation
-        try:
-            response = self._analyze(node)
-        except Exception as e:
-            self.logger.error(f"Error during analysis operator: {str(e)}")
-            response = {}
+        # A solution rejected before execution is buggy, there is no output to analyze
+        if eval_result.get(SCREENING_FAILURE) is not None:
+            response = {"metric": None, "summary": eval_result[SCREENING_FAILURE], "is_bug": True}
+        else:
+            # Safely perform the analyze operation
+            try:
+                response = self._analyze(node)
+            except DeadlineExceeded:
+                # out of time: the node must not be recorded as analyzed
+                raise
+            except Exception as e:
+                self.logger.error(f"Error during analysis operator: {str(e)}")
+                response = {}
+
+        # Collect the grading of the submission, which ran during the analysis
+        resolve_grading(eval_result)
 
         # Parse response to dictionary
         # If the response is a string, we try to parse it into a dictionary
@@ -26,11 +26,15 @@ from dojo.core.solvers.utils.response import extract_code
 from dojo.solvers.utils import get_complextiy_level
 from dojo.core.solvers.llm_helpers.generic_llm import GenericLLM
 from dojo.utils.code_parsing import parse_json_output
+from dojo.utils.deadline import Deadline, DeadlineExceeded
 from dojo.core.solvers.utils.search_exporter import (
     export_search_results,
 )
+from dojo.core.tasks.grading_service import resolve_grading
 from dojo.core.tasks.constants import (
+    DATA_PREVIEW,
     EXECUTION_OUTPUT,
+    SCREENING_FAILURE,
     TASK_DESCRIPTION,
     VALID_SOLUTION_FEEDBACK,
     VALIDATION_FITNESS,
@@ -124,6 +128,7 @@ class MCTS(Solver):
         assert self.lower_is_better is not None
 
         self.state = MCTSState()
+        self.deadline = Deadline(self.cfg.time_limit_secs)
 
         self.setup_operators()
 
@@ -136,9 +141,7 @@ class MCTS(Solver):
         # Write the journal to a jsonl file
         journal_sd = self.journal.node_list()
         journal_path = Path(self.cfg.checkpoint_path) / "journal.jsonl"
-        with open(journal_path, "w") as f:
-            for node in journal_sd:
-                f.write(json.dumps(node) + "\n")
+        self._write_atomic(journal_path, "".join(json.dumps(node) + "\n" for node in journal_sd))
         self.logger.info(f"Checkpoint saved to {journal_path}")
 
     def load_checkpoint(self):
@@ -217,11 +220,21 @@ class MCTS(Solver):
         # Create a blank root node to start.
         self.create_root_node()
 
-        # Run the search
+        # Run the search, every stage of a step clipping its own timeout to the time left
+        self.deadline = Deadline(self.cfg.time_limit_secs - self.state.running_time)
         while self.state.current_step <= self.cfg.step_limit:
-            start_time = time.monotonic()
-            state = self.step(task, state)
+            start_time = self._step_started_at = time.monotonic()
+            try:
+                with self.deadline.activate():
+                    state = self.step(task, state)
+            except DeadlineExceeded as e:
+                self.state.running_time += time.monotonic() - start_time
+                self._step_started_at = None
+                self.logger.info(f"{e} Stopping search")
+                self.save_checkpoint()
+                break
             self.state.running_time += time.monotonic() - start_time
+            self._step_started_at = None
             self.logger.info(
                 f"Step {self.state.current_step}: Time taken for step: {self.state.running_time:.3f} seconds"
             )
@@ -239,6 +252,8 @@ class MCTS(Solver):
         # Export the search results
         try:
             export_search_results(self.cfg, self.journal, self.logger, "MCTS")
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.logger.error(f"Error exporting search results: {e}")
 
@@ -295,11 +310,12 @@ class MCTS(Solver):
             self.task_desc,
             self.journal,
             self.state.current_step,
-            self.cfg.time_limit_secs - self.state.running_time,
+            self.deadline.remaining(),
             self.data_preview,
             get_complextiy_level(parent) if self.cfg.use_complexity else None,
             self.root_node,
             max_operator_tries=self.cfg.max_llm_call_retries,
+            deadline=self.deadline,
         )
         node = MCTSNode(plan=plan, code=code, parents=[parent], operators_used=["draft"], operators_metrics=[metrics])
         self.logger.info(f"Draft Node Created - Metrics: {metrics}")
@@ -325,10 +341,11 @@ class MCTS(Solver):
             self.journal,
             parent_node,
             self.state.current_step,
-            self.cfg.time_limit_secs - self.state.running_time,
+            self.deadline.remaining(),
             get_complextiy_level(parent_node) if self.cfg.use_complexity else None,
             self.data_preview,
             max_operator_tries=self.cfg.max_llm_call_retries,
+            deadline=self.deadline,
         )
         node = MCTSNode(
             plan=plan, code=code, parents=[parent_node], operators_used=["improve"], operators_metrics=[metrics]
@@ -356,9 +373,10 @@ class MCTS(Solver):
             self.journal,
             parent_node,
             self.state.current_step,
-            self.cfg.time_limit_secs - self.state.running_time,
+            self.deadline.remaining(),
             self.data_preview,
             max_operator_tries=self.cfg.max_llm_call_retries,
+            deadline=self.deadline,
         )
         node = MCTSNode(
             plan=plan, code=code, parents=[parent_node], operators_used=["debug"], operators_metrics=[metrics]
@@ -392,10 +410,16 @@ class MCTS(Solver):
 
         Creates a small preview of the data (head, shapes, etc.) that can be used
         to help the LLM understand the data structure when generating solutions.
+        The preview precomputed by the task, if any, is used instead.
 
         Args:
             state: The current solver state containing the interpreter
         """
+        if self.task_info.get(DATA_PREVIEW) is not None:
+            self.data_preview = self.task_info[DATA_PREVIEW]
+            self.logger.debug("Using the data preview precomputed by the task")
+            return
+
         assert "solver_interpreter" in state, (
             "For generating data previews, the solver needs access to an interpreter."
         )
@@ -436,6 +460,18 @@ class MCTS(Solver):
         if not self.journal.nodes or self.data_preview is None:
             self.update_data_preview(state)
 
+        # Execute again the node whose execution was interrupted in a previous run, if any, as a child of its parent
+        resumed_node = self.pop_resumable_node()
+        if resumed_node is not None:
+            path = []
+            ancestor = resumed_node.parents[0] if resumed_node.parents else None
+            while ancestor is not None:
+                # nodes restored from the journal carry no visit statistics
+                if isinstance(ancestor, MCTSNode):
+                    path.insert(0, ancestor)
+                ancestor = ancestor.parents[0] if ancestor.parents else None
+            return self._evaluate_child(path, resumed_node, state, task)
+
         # 1) Selection: Find a path from root → leaf using UCT
         path = self.search_policy(self.root_node)
 
@@ -490,27 +526,7 @@ class MCTS(Solver):
             else:
                 child_node = self._improve(leaf_node)
 
-            # Evaluate the code
-            self.logger.debug(f"Step {self.state.current_step}: Executing generated code")
-            state, eval_result = task.step_task(state, extract_code(child_node.code))
-            self.parse_eval_result(node=child_node, eval_result=eval_result)
-
-            # Add the child to the journal
-            self.journal.append(child_node)
-            self.log_journal()
-            self.state.current_step += 1
-
-            # If the child node is not buggy, we backpropagate
-            if not child_node.is_buggy:
-                self._backprop_step(path=path + [child_node], value_estimate=child_node.metric.value)
-                self.set_global_q_values(child_node.metric.value)
-            else:
-                # Execute debug cycle
-                state, debug_path, fixed_metric = self.debug_cycle(state, task, child_node)
-                # We now exclude the child node from the path and backprop the fixed metric up the rest of the tree
-                if fixed_metric is not None:
-                    self._backprop_step(path=path + debug_path, value_estimate=fixed_metric)
-                    self.set_global_q_values(fixed_metric)
+            state = self._evaluate_child(path, child_node, state, task)
 
             # If we have used up all the steps we break
             if self.state.current_step > self.cfg.step_limit:
@@ -519,6 +535,50 @@ class MCTS(Solver):
 
         return state
 
+    def _evaluate_child(self, path: List[MCTSNode], child_node: MCTSNode, state: Any, task: Any) -> Any:
+        """
+        Evaluate a new child of the last node of `path`, debugging it if it is buggy, and backpropagate its value.
+
+        Args:
+            path: List of nodes from root to the parent of the child
+            child_node: The generated child node
+            state: Current state object
+            task: Task object for evaluation
+
+        Returns:
+            The updated state
+        """
+        # Evaluate the code
+        self.logger.debug(f"Step {self.state.current_step}: Executing generated code")
+        self.begin_execution(child_node)
+        state, eval_result = task.step_task(
+            state,
+            extract_code(child_node.code),
+            node_id=child_node.id,
+            parent_node_id=child_node.parent_id,
+            deadline=self.deadline,
+        )
+        self.parse_eval_result(node=child_node, eval_result=eval_result)
+
+        # Add the child to the journal
+        self.journal.append(child_node)
+        self.end_execution()
+        self.log_journal()
+        self.state.current_step += 1
+
+        # If the child node is not buggy, we backpropagate
+        if not child_node.is_buggy:
+            self._backprop_step(path=path + [child_node], value_estimate=child_node.metric.value)
+            self.set_global_q_values(child_node.metric.value)
+        else:
+            # Execute debug cycle
+            state, debug_path, fixed_metric = self.debug_cycle(state, task, child_node)
+            # We now exclude the child node from the path and backprop the fixed metric up the rest of the tree
+            if fixed_metric is not None:
+                self._backprop_step(path=path + debug_path, value_estimate=fixed_metric)
+                self.set_global_q_values(fixed_metric)
+        return state
+
     def debug_cycle(self, state, task, buggy_node: MCTSNode):
         debug_path = [buggy_node]
         debug_depth = min(self.remaining_steps, self.cfg.max_debug_depth)
@@ -529,9 +589,17 @@ class MCTS(Solver):
         # or until time runs out, whichever comes first
         for _ in range(debug_depth):
             buggy_node = self._debug(buggy_node)
-            state, eval_result = task.step_task(state, extract_code(buggy_node.code))
+            self.begin_execution(buggy_node)
+            state, eval_result = task.step_task(
+                state,
+                extract_code(buggy_node.code),
+                node_id=buggy_node.id,
+                parent_node_id=buggy_node.parent_id,
+                deadline=self.deadline,
+            )
             self.parse_eval_result(node=buggy_node, eval_result=eval_result)
             self.journal.append(buggy_node)
+            self.end_execution()
             self.log_journal()
             self.state.current_step += 1
             debug_path.append(buggy_node)
@@ -576,12 +644,22 @@ class MCTS(Solver):
         # Absorb the execution output into the node
         node.absorb_exec_result(eval_result[EXECUTION_OUTPUT])
 
-        # Safely perform the analyze operation
-        try:
-            response = self._analyze(node)
-        except Exception as e:
-            self.logger.error(f"Error during analysis operator: {str(e)}")
-            response = {}
+        # A solution rejected before execution is buggy, there is no output to analyze
+        if eval_result.get(SCREENING_FAILURE) is not None:
+            response = {"metric": None, "summary": eval_result[SCREENING_FAILURE], "is_bug": True}
+        else:
+            # Safely perform the analyze operation
+            try:
+                response = self._analyze(node)
+            except DeadlineExceeded:
+                # out of time: the node must not be recorded as analyzed
+                raise
+            except Exception as e:
+                self.logger.error(f"Error during analysis operator: {str(e)}")
+                response = {}
+
+        # Collect the grading of the submission, which ran during the analysis
+        resolve_grading(eval_result)
 
         # Parse response to dictionary
         # If the response is a string, we try to parse it into a dictionary
@@ -18,6 +18,7 @@ from dojo.core.tasks.constants import (
     VALID_SOLUTION,
 )
 from dojo.utils.code_parsing import extract_code
+from dojo.utils.deadline import Deadline
 
 class DummyTask(Task):
     def __init__(self, cfg: DummyTaskConfig):
@@ -33,9 +34,18 @@ class DummyTask(Task):
         state = task_args
         state["init_obs"] = {}
         self._submission_file_path = Path(task_args["solver_interpreter"].working_dir) / self.cfg.submission_fname
+        self.start_code_screening(task_args["solver_interpreter"], file_name=self._solution_script)
         return state, {TASK_DESCRIPTION: self.task_description}
 
-    def step_task(self, state: Dict, action: Any) -> Tuple[Dict, Dict]:
+    def step_task(
+        self,
+        state: Dict,
+        action: Any,
+        *,
+        node_id: Optional[str] = None,
+        parent_node_id: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[Dict, Dict]:
         try:
             solution = extract_code(action)
         except Exception as e:
@@ -43,9 +53,14 @@ class DummyTask(Task):
             exec_output = ExecutionResult.get_empty()
             exec_output.term_out[0] = f"Invalid solution: {e}"
             return state, {EXECUTION_OUTPUT: exec_output, VALIDATION_FITNESS: None, VALID_SOLUTION: False}
-        
+
+        # Reject the solutions that would certainly fail, without executing them
+        screened = self.screen_solution(solution)
+        if screened is not None:
+            return state, screened
+
         interpreter = state["solver_interpreter"]
-        exec_output: ExecutionResult = interpreter.run(solution, file_name=self._solution_script)
+        exec_output: ExecutionResult = interpreter.run(solution, file_name=self._solution_script, deadline=deadline)
         self.logger.info(f"Execution output: {exec_output}")
         eval_result = {EXECUTION_OUTPUT: exec_output}
 
@@ -82,12 +97,11 @@ class DummyTask(Task):
         # Close the interpreter
         if interpreter.factory:
             interpreter.close()
-        else:
-            # Remove the submission_file from the agent's environment
-            interpreter.run(
-                f"!rm {self.cfg.submission_fname}"
-            )  # remove the submission_file from the agent's environment
-
+        elif not interpreter.local and not getattr(interpreter, "mounted_workspace", False):
+            # remove the submission_file from the agent's environment, in the current kernel: resetting the session
+            # would start a new kernel just to delete a file. A mounted workspace is shared with the host, so the
+            # local removal above is enough
+            interpreter.run(f"!rm -f {self.cfg.submission_fname}", reset_session=False, include_exec_time=False)
             assert interpreter.fetch_file(self._submission_file_path) is None, (
                 "At this point, the submissions file should not exists in the agent's environment!"
             )
@@ -124,3 +138,6 @@ class DummyTask(Task):
             if hasattr(interpreter, "clean_up"):
                 interpreter.clean_up()
 
+            if hasattr(interpreter, "close"):
+                interpreter.close()
+
@@ -9,13 +9,17 @@
 # See THIRD_PARTY_LICENSES.md for the full licence text.
 # https://github.com/openai/mle-bench/blob/main/LICENSE
 
+import copy
 import json
+import time
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Optional
 
 import pandas as pd
 from mlebench.data import get_leaderboard, is_dataset_prepared
-from mlebench.grade_helpers import CompetitionReport
+from mlebench.grade_helpers import CompetitionReport, InvalidSubmissionError
 from mlebench.registry import Competition, Registry, registry
 from mlebench.utils import (
     get_logger,
@@ -42,33 +46,58 @@ def is_lower_better(competition):
     return competition.grader.is_lower_better(leaderboard_df)
 
 
-def evaluate_submission(submission_path: Path, data_dir: Path, competition_id: Path, results_output_dir: Path):
-    # Load competition data
-    new_registry = registry.set_data_dir(data_dir)
-    competition = new_registry.get_competition(competition_id)
-
-    if not is_dataset_prepared(competition, grading_only=True):
-        raise ValueError(
-            f"Dataset for competition `{competition.id}` is not prepared! "
-            f"Please run `mlebench prepare -c {competition.id}` to prepare the dataset."
-        )
-
-    score = None
-    submission_exists = submission_path.is_file() and submission_path.suffix.lower() == ".csv"
-
-    if submission_exists:
-        submission_df = read_csv(submission_path)
-        answers = load_answers(competition.answers)
-        score = competition.grader(submission_df, answers)
-    else:
-        logger.warning(
-            f"Invalid submission file: {submission_path}. Please check that the file exists and it is a CSV."
+@dataclass
+class GradingContext:
+    """
+    Everything needed to grade the submissions of a competition but the submissions themselves: loading the
+    answers and the leaderboard once per run, instead of on every evaluation, saves reading files of up to
+    hundreds of MB on every step.
+    """
+
+    competition: Competition
+    answers: Any
+    leaderboard: pd.DataFrame
+    lower_is_better: bool
+
+    @classmethod
+    def load(cls, data_dir: Path, competition_id: str, with_answers: bool = True) -> "GradingContext":
+        """Load the context of a competition. Without answers, it is only good for reading the leaderboard."""
+        competition = registry.set_data_dir(data_dir).get_competition(competition_id)
+        if not is_dataset_prepared(competition, grading_only=True):
+            raise ValueError(
+                f"Dataset for competition `{competition.id}` is not prepared! "
+                f"Please run `mlebench prepare -c {competition.id}` to prepare the dataset."
+            )
+
+        leaderboard = get_leaderboard(competition)
+        if "score" not in leaderboard.columns:
+            raise Exception("You must run GIT LFS for mlebench.")
+
+        return cls(
+            competition=competition,
+            answers=load_answers(competition.answers) if with_answers else None,
+            leaderboard=leaderboard,
+            lower_is_better=competition.grader.is_lower_better(leaderboard),
         )
 
+    def fresh_answers(self) -> Any:
+        # graders may modify the answers in place (including the values of a frame): give them a deep copy, not the
+        # cached answers
+        if isinstance(self.answers, pd.DataFrame):
+            return self.answers.copy(deep=True)
+        return copy.deepcopy(self.answers)
+
+
+def _write_report(
+    context: GradingContext,
+    score: Optional[float],
+    submission_path: Path,
+    submission_exists: bool,
+    results_output_dir: Path,
+):
+    competition = context.competition
     valid_submission = score is not None
-    competition_leaderboard = get_leaderboard(competition)
-    rank_info = competition.grader.rank_score(score, competition_leaderboard)
-    is_lower_better = competition.grader.is_lower_better(competition_leaderboard)
+    rank_info = competition.grader.rank_score(score, context.leaderboard)
 
     report = CompetitionReport(
         competition_id=competition.id,
@@ -84,7 +113,7 @@ def evaluate_submission(submission_path: Path, data_dir: Path, competition_id: P
         above_median=rank_info["above_median"],
         submission_exists=submission_exists,
         valid_submission=valid_submission,
-        is_lower_better=is_lower_better,
+        is_lower_better=context.lower_is_better,
         created_at=datetime.now(),
         submission_path=str(submission_path),
     )
@@ -98,3 +127,85 @@ def evaluate_submission(submission_path: Path, data_dir: Path, competition_id: P
     score = report.score
     score = float(score) if score is not None else None
     return score, report.to_dict()
+
+
+def evaluate_submission(
+    submission_path: Path,
+    data_dir: Path,
+    competition_id: Path,
+    results_output_dir: Path,
+    context: Optional[GradingContext] = None,
+):
+    # Load competition data, unless the caller keeps it around
+    if context is None:
+        context = GradingContext.load(data_dir, competition_id)
+
+    score = None
+    submission_exists = submission_path.is_file() and submission_path.suffix.lower() == ".csv"
+
+    if submission_exists:
+        submission_df = read_csv(submission_path)
+        score = context.competition.grader(submission_df, context.fresh_answers())
+    else:
+        logger.warning(
+            f"Invalid submission file: {submission_path}. Please check that the file exists and it is a CSV."
+        )
+
+    return _write_report(context, score, submission_path, submission_exists, results_output_dir)
+
+
+@dataclass
+class GradingResult:
+    """Validity verdict of a submission and, if it is valid, its score and grading report."""
+
+    valid: bool
+    message: str
+    score: Optional[float] = None
+    report: Optional[dict] = None
+    # seconds spent reading the submission and running the grader
+    read_time: float = 0.0
+    grade_time: float = 0.0
+
+
+def grade_submission(submission_path: Path, context: GradingContext, results_output_dir: Path) -> GradingResult:
+    """
+    Validate and grade a submission in a single pass: the submission is read and scored once.
+
+    The verdicts and messages are the ones of `mlebench.grade.validate_submission`, and the score and report the
+    ones of `evaluate_submission`, which each read and score the submission.
+    """
+    if not submission_path.is_file():
+        return GradingResult(False, f"Submission invalid! Submission file {submission_path} does not exist.")
+    if submission_path.suffix.lower() != ".csv":
+        return GradingResult(False, "Submission invalid! Submission file must be a CSV file.")
+
+    start = time.perf_counter()
+    submission_df = read_csv(submission_path)
+    read_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        score = context.competition.grader.grade_fn(submission_df, context.fresh_answers())
+    except InvalidSubmissionError as e:
+        return GradingResult(False, str(e), read_time=read_time, grade_time=time.perf_counter() - start)
+    except Exception as e:
+        return GradingResult(
+            False,
+            "Submission invalid! The attempt to grade the submission has resulted in the following error message:"
+            f"\n{e}",
+            read_time=read_time,
+            grade_time=time.perf_counter() - start,
+        )
+    grade_time = time.perf_counter() - start
+
+    # scores are rounded like `Grader.__call__` does
+    score, report = _write_report(context, round(score, 5), submission_path, True, results_output_dir)
+    return GradingResult(True, "Submission is valid.", score, report, read_time, grade_time)
+
+
+def grade_submission_job(context: GradingContext, submission_path: Path, results_output_dir: Path) -> GradingResult:
+    """`grade_submission` as a grading service job, owning (and removing) its copy of the submission."""
+    try:
+        return grade_submission(submission_path, context, results_output_dir)
+    finally:
+        submission_path.unlink(missing_ok=True)
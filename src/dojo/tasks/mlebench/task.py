@@ -5,25 +5,36 @@
 # LICENSE file in the root directory of this source tree.
 
 import os
+import shutil
+import uuid
+from functools import partial
 from pathlib import Path
 from typing import Any, Dict, Optional, Tuple
 
-from mlebench.grade import validate_submission
-from mlebench.registry import registry
 
 import dojo.tasks.mlebench.evaluate as evaluate
+from dojo.config_dataclasses.interpreter.python import PythonInterpreterConfig
+from dojo.core.interpreters.artifact_cache import USAGE_INSTRUCTIONS as ARTIFACT_CACHE_INSTRUCTIONS
 from dojo.core.interpreters.base import ExecutionResult, Interpreter
+from dojo.core.interpreters.python import PythonInterpreter
 from dojo.core.tasks.base import Task
+from dojo.core.tasks.execution_cache import CachedExecution
+from dojo.core.tasks.grading_service import PendingGrading
 from dojo.core.tasks.constants import (
     EXECUTION_OUTPUT,
+    PENDING_GRADING,
     TASK_DESCRIPTION,
+    DATA_PREVIEW,
+    DATA_PREVIEW_FNAME,
     TEST_FITNESS,
     VALID_SOLUTION_FEEDBACK,
     VALIDATION_FITNESS,
     AUX_EVAL_INFO,
     VALID_SOLUTION,
 )
+from dojo.tasks.mlebench.utils.smoke_data import build_subsampled_mirror, is_sample_only_error
 from dojo.utils.code_parsing import extract_code
+from dojo.utils.deadline import Deadline
 
 from dojo.config_dataclasses.task.mlebench import MLEBenchTaskConfig
 
@@ -73,30 +84,60 @@ class MLEBenchTask(Task):
         task_description_path = Path(self.cfg.public_dir).resolve() / "description.md"
         self.task_description = self.instructions + "\n" + task_description_path.read_text()
 
-        # Load competition data
-        new_registry = registry.set_data_dir(Path(self.cfg.cache_dir))
-        self.competition = new_registry.get_competition(self.cfg.name)
+        # Load competition data, with the answers and leaderboard used to grade every submission. With grading
+        # workers, the answers are only loaded by the workers.
+        self.grading_service = self.start_grading_service(
+            partial(evaluate.GradingContext.load, Path(self.cfg.cache_dir), self.cfg.name)
+        )
+        self.grading_context = evaluate.GradingContext.load(
+            Path(self.cfg.cache_dir), self.cfg.name, with_answers=self.grading_service is None
+        )
+        self.competition = self.grading_context.competition
 
         # Resolve paths
         self.public_dir = Path(self.cfg.public_dir).resolve()
         self.private_dir = Path(self.cfg.private_dir).resolve()
 
+        # Interpreter of the smoke runs, created in `prepare` if they are enabled
+        self.smoke_interpreter: Optional[PythonInterpreter] = None
+
     def prepare(self, **task_args):
         state = task_args
         state["init_obs"] = {}
 
         self._submission_file_path = Path(task_args["solver_interpreter"].working_dir) / self.cfg.submission_fname
+        self.start_code_screening(task_args["solver_interpreter"], file_name=self._solution_script)
+        self.start_execution_cache(task_args["solver_interpreter"])
+        if self.cfg.smoke_run:
+            self.smoke_interpreter = self._start_smoke_interpreter(task_args["solver_interpreter"])
+
+        # Let the agent know about the artifact cache if the interpreter exposes one
+        task_description = self.task_description
+        if getattr(task_args["solver_interpreter"], "artifact_cache", None) is not None:
+            task_description += "\n" + ARTIFACT_CACHE_INSTRUCTIONS
 
         # Prepare the task info object
-        lower_is_better = evaluate.is_lower_better(self.competition)
+        lower_is_better = self.grading_context.lower_is_better
         task_info = {
-            TASK_DESCRIPTION: self.task_description,
+            TASK_DESCRIPTION: task_description,
             "lower_is_better": lower_is_better,
         }
+        # Data preview precomputed when preparing the competition (missing for competitions prepared before)
+        data_preview_path = self.public_dir.parent / DATA_PREVIEW_FNAME
+        if data_preview_path.exists():
+            task_info[DATA_PREVIEW] = data_preview_path.read_text()
 
         return state, task_info
 
-    def step_task(self, state: Dict[str, Any], action: Any) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    def step_task(
+        self,
+        state: Dict[str, Any],
+        action: Any,
+        *,
+        node_id: Optional[str] = None,
+        parent_node_id: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """
         Execute a single step of the task.
 
@@ -105,6 +146,11 @@ class MLEBenchTask(Task):
         Args:
             state (Dict[str, Any]): The current state of the task.
             action (Any): The solution code (as a string) to evaluate.
+            node_id (str, optional): Id of the node the solution belongs to. If the interpreter supports
+                per-node workspaces, the solution is executed in the workspace of this node.
+            parent_node_id (str, optional): Id of the node the solution was derived from. Its workspace
+                seeds the workspace of `node_id`.
+            deadline (Deadline, optional): Deadline of the search. The execution timeout is clipped to it.
 
         Returns:
             Tuple[Dict[str, Any], Dict[str, Any]]: A tuple containing the updated state and the outcome.
@@ -117,8 +163,29 @@ class MLEBenchTask(Task):
             exec_output.term_out[0] = f"Invalid solution: {e}"
             return state, {EXECUTION_OUTPUT: exec_output, VALIDATION_FITNESS: None, VALID_SOLUTION: False}
 
+        # Reject the solutions that would certainly fail, without executing them
+        screened = self.screen_solution(solution)
+        if screened is not None:
+            return state, screened
+
+        # Reuse the execution of an identical solution, by this run or another one
+        cache_key = None
+        if self.execution_cache is not None:
+            cache_key = self.execution_cache.key(solution)
+            cached = self.execution_cache.get(cache_key)
+            if cached is not None:
+                return state, self._cached_outcome(cache_key, cached)
+
+        # Catch the crashes in seconds on a sample of the data, rather than after the full training
+        if self.smoke_interpreter is not None:
+            smoke_output = self._smoke_run(solution, deadline)
+            if smoke_output is not None:
+                return state, {EXECUTION_OUTPUT: smoke_output, VALIDATION_FITNESS: None, VALID_SOLUTION: False}
+
         interpreter = state["solver_interpreter"]
-        exec_output: ExecutionResult = interpreter.run(solution, file_name=self._solution_script)
+        self._use_workspace(interpreter, node_id, parent_node_id)
+
+        exec_output: ExecutionResult = interpreter.run(solution, file_name=self._solution_script, deadline=deadline)
         eval_result = {EXECUTION_OUTPUT: exec_output}
 
         # Check if the execution was not successful
@@ -136,38 +203,31 @@ class MLEBenchTask(Task):
             self.logger.info(f"Submission file fetched: {self._submission_file_path}")
 
         has_csv_submission = self._submission_file_path.exists()
-        eval_result[VALID_SOLUTION] = False
-        if has_csv_submission:
-            is_valid_submission, message = validate_submission(self._submission_file_path, self.competition)
-            eval_result[VALID_SOLUTION] = is_valid_submission
-            eval_result[VALID_SOLUTION_FEEDBACK] = message
-            self.logger.info(
-                f"Submission file found: {self._submission_file_path} || Submission valid: {is_valid_submission}"
+        # only cache the executions that ended with the code: a timeout (possibly clipped to the deadline), a memory
+        # limit or the death of the process depend on the environment, and may not happen again
+        if cache_key is not None and not exec_output.ended_by_environment():
+            self.execution_cache.put(
+                cache_key, exec_output, self._submission_file_path if has_csv_submission else None
             )
 
-            if is_valid_submission:
-                self.logger.info(f"Evaluating submission: {self._submission_file_path}")
-                test_fitness, report = evaluate.evaluate_submission(
-                    submission_path=self._submission_file_path,
-                    data_dir=Path(self.cfg.cache_dir),
-                    competition_id=self.cfg.name,
-                    results_output_dir=Path(self.cfg.results_output_dir),
-                )
-                eval_result[TEST_FITNESS] = test_fitness
-                eval_result[AUX_EVAL_INFO] = parse_report(report)
-                self.logger.info(f"Test fitness: {test_fitness} || AUX eval info: {eval_result[AUX_EVAL_INFO]}")
+        eval_result[VALID_SOLUTION] = False
+        if has_csv_submission:
+            self.logger.info(f"Submission file found: {self._submission_file_path}")
+            eval_result.update(self._grade(self._submission_file_path, cache_key))
 
             self._submission_file_path.unlink(missing_ok=True)  # remove the submission_file locally
             assert not self._submission_file_path.exists(), (
                 "At this point, the submissions file should not exists locally!"
             )
 
+        # with a mounted workspace, the agent's environment shares the working dir with the host,
+        # so the local removal above is enough
         if interpreter.factory:
             interpreter.close()
-        else:
-            interpreter.run(
-                f"!rm {self.cfg.submission_fname}"
-            )  # remove the submission_file from the agent's environment
+        elif not interpreter.local and not getattr(interpreter, "mounted_workspace", False):
+            # remove the submission_file from the agent's environment, in the current kernel: resetting the session
+            # would start a new kernel just to delete a file
+            interpreter.run(f"!rm -f {self.cfg.submission_fname}", reset_session=False, include_exec_time=False)
             assert interpreter.fetch_file(self._submission_file_path) is None, (
                 "At this point, the submissions file should not exists in the agent's environment!"
             )
@@ -184,6 +244,7 @@ class MLEBenchTask(Task):
         if self._submission_file_path is None:
             raise Exception("The path to the submission file must be set.")
 
+        self._use_workspace(interpreter, None)
         exec_output = interpreter.run(solution, file_name=self._solution_script)
         eval_result = {EXECUTION_OUTPUT: exec_output}
 
@@ -191,18 +252,166 @@ class MLEBenchTask(Task):
         has_csv_submission = self._submission_file_path.exists()
         assert has_csv_submission, "The final solution is not valid!"
 
-        test_fitness, report = evaluate.evaluate_submission(
-            submission_path=self._submission_file_path,
-            data_dir=Path(self.cfg.cache_dir),
-            competition_id=self.cfg.name,
-            results_output_dir=Path(self.cfg.results_output_dir),
-        )
+        if self.grading_service is None:
+            test_fitness, report = evaluate.evaluate_submission(
+                submission_path=self._submission_file_path,
+                data_dir=Path(self.cfg.cache_dir),
+                competition_id=self.cfg.name,
+                results_output_dir=Path(self.cfg.results_output_dir),
+                context=self.grading_context,
+            )
+        else:
+            grading = self.grading_service.submit(
+                evaluate.grade_submission_job, self._detach_submission(), Path(self.cfg.results_output_dir)
+            ).result()
+            test_fitness, report = grading.score, grading.report or {}
         eval_result[TEST_FITNESS] = test_fitness
         eval_result[AUX_EVAL_INFO] = parse_report(report)
 
         return eval_result
 
+    def _grade(self, submission: Path, cache_key: Optional[str] = None, keep: bool = False) -> Dict[str, Any]:
+        """
+        Grade `submission`, inline or in the background, and store the outcome in the execution cache under
+        `cache_key` (if any). With grading workers, the submission is moved to the grading job, unless `keep`.
+        """
+        if self.grading_service is None:
+            # validate and grade at once: the submission is read and scored a single time
+            grading = evaluate.grade_submission(submission, self.grading_context, Path(self.cfg.results_output_dir))
+            return self._record_grading(cache_key, grading)
+        # grade in the background, the solver collects the outcome once it needs it
+        future = self.grading_service.submit(
+            evaluate.grade_submission_job,
+            self._detach_submission(submission, keep=keep),
+            Path(self.cfg.results_output_dir),
+        )
+        return {PENDING_GRADING: PendingGrading(future, partial(self._record_grading, cache_key))}
+
+    def _record_grading(self, cache_key: Optional[str], grading: evaluate.GradingResult) -> Dict[str, Any]:
+        """`_grading_outcome`, also stored in the execution cache under `cache_key` (if any)."""
+        outcome = self._grading_outcome(grading)
+        if cache_key is not None:
+            self.execution_cache.put_grading(cache_key, outcome)
+        return outcome
+
+    def _cached_outcome(self, cache_key: str, cached: CachedExecution) -> Dict[str, Any]:
+        """Outcome of a step reusing the cached execution of an identical solution."""
+        self.logger.info(f"Reusing the cached execution of an identical solution ({cache_key[:12]})")
+        eval_result = {EXECUTION_OUTPUT: cached.exec_output, VALID_SOLUTION: False}
+        if cached.grading is not None:
+            eval_result.update(cached.grading)
+        elif cached.submission_path is not None:
+            # the grading was never stored (it failed, or the run ended first): grade the cached submission
+            eval_result.update(self._grade(cached.submission_path, cache_key, keep=True))
+        return eval_result
+
+    def _grading_outcome(self, grading: evaluate.GradingResult) -> Dict[str, Any]:
+        """Entries of the evaluation result reporting the grading of a submission."""
+        self.logger.info(
+            f"Submission valid: {grading.valid} || "
+            f"Read in {grading.read_time:.2f}s, graded in {grading.grade_time:.2f}s"
+        )
+        outcome = {VALID_SOLUTION: grading.valid, VALID_SOLUTION_FEEDBACK: grading.message}
+        if grading.valid:
+            outcome[TEST_FITNESS] = grading.score
+            outcome[AUX_EVAL_INFO] = parse_report(grading.report) | {
+                "submission_read_time": grading.read_time,
+                "grading_time": grading.grade_time,
+            }
+            self.logger.info(f"Test fitness: {grading.score} || AUX eval info: {outcome[AUX_EVAL_INFO]}")
+        return outcome
+
+    def _start_smoke_interpreter(self, interpreter: Interpreter) -> Optional[PythonInterpreter]:
+        """Create the interpreter of the smoke runs, bound to the down-sampled mirror of the data."""
+        if not interpreter.local:
+            self.logger.warning("Smoke runs are only supported with local interpreters, they are disabled.")
+            return None
+        data_dir = build_subsampled_mirror(
+            Path(self.cfg.data_dir), Path(self.cfg.smoke_run_data_dir), self.cfg.smoke_run_rows
+        )
+        working_dir = Path(getattr(interpreter, "base_working_dir", interpreter.working_dir))
+        cfg = PythonInterpreterConfig(
+            working_dir=str(working_dir.parent / "workspace_smoke_run"),
+            timeout=self.cfg.smoke_run_timeout,
+            memory_limit_mb=getattr(interpreter, "memory_limit_mb", None),
+            cpu_affinity=getattr(interpreter, "cpu_affinity", None),
+        )
+        return PythonInterpreter(cfg, data_dir=data_dir)
+
+    def _smoke_run(self, solution: str, deadline: Optional[Deadline]) -> Optional[ExecutionResult]:
+        """
+        Run `solution` on the down-sampled data. Returns the execution result if the solution crashed or wrote no
+        submission, to be reported instead of the full run, and None if the full run should proceed.
+        """
+        interpreter = self.smoke_interpreter
+        # start from a clean working dir, the outputs of the previous smoke run must not hide a failure
+        for path in interpreter.working_dir.iterdir():
+            if path.name == "data":
+                continue
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+
+        exec_output = interpreter.run(solution, file_name=self._solution_script, deadline=deadline)
+        # release the memory (and accelerators) held by the smoke run before the full run
+        interpreter.cleanup_session()
+        wrote_submission = (interpreter.working_dir / self.cfg.submission_fname).exists()
+
+        if exec_output.timed_out:
+            # the solution may well be fine, only slow on a table of a thousand rows
+            self.logger.info(f"Smoke run timed out after {exec_output.exec_time:.1f}s - proceeding with the full run")
+            return None
+        if exec_output.exit_code == 0 and wrote_submission:
+            self.logger.info(f"Smoke run passed in {exec_output.exec_time:.1f}s - proceeding with the full run")
+            return None
+        if exec_output.exit_code != 0 and is_sample_only_error("".join(exec_output.term_out)):
+            # e.g. a class missing from the first rows: the solution may well run on the full data
+            self.logger.info("Smoke run failed on an error possibly due to the sample - proceeding with the full run")
+            return None
+
+        self.logger.error(
+            f"Smoke run failed - exit code: {exec_output.exit_code} - submission written: {wrote_submission}"
+        )
+        note = (
+            f"[The solution was first run on a sample of the data (the large tables cut to their first "
+            f"{self.cfg.smoke_run_rows} rows) and failed, so it was not run on the full data.]\n"
+        )
+        if exec_output.exit_code == 0:
+            note += f"[The execution finished without writing ./{self.cfg.submission_fname}.]\n"
+        exec_output.term_out.insert(0, note)
+        exec_output.exit_code = exec_output.exit_code or 1
+        exec_output.exc_info = (exec_output.exc_info or {}) | {"smoke_run": True}
+        return exec_output
+
+    def _detach_submission(self, submission: Optional[Path] = None, keep: bool = False) -> Path:
+        """
+        Move the submission (by default, the one in the working dir) to a file owned by the grading job, or copy it
+        if `keep`.
+        """
+        submission = Path(submission or self._submission_file_path)
+        grading_dir = Path(self.cfg.results_output_dir) / "pending_grading"
+        grading_dir.mkdir(parents=True, exist_ok=True)
+        detached = grading_dir / f"{uuid.uuid4().hex}{submission.suffix}"
+        if keep:
+            shutil.copyfile(submission, detached)
+        else:
+            shutil.move(submission, detached)
+        return detached
+
+    def _use_workspace(self, interpreter: Interpreter, node_id: Optional[str], parent_node_id: Optional[str] = None):
+        """Switch the interpreter to the workspace of `node_id` (if supported) and point the submission path at it."""
+        if not hasattr(interpreter, "use_workspace"):
+            return
+        working_dir = interpreter.use_workspace(node_id, parent_node_id, exclude=[self.cfg.submission_fname])
+        self._submission_file_path = Path(working_dir) / self.cfg.submission_fname
+
     def close(self, state):
+        if self.grading_service is not None:
+            self.grading_service.close()
+        if self.smoke_interpreter is not None:
+            self.smoke_interpreter.close()
+
         for interp_key in ["solver_interpreter", "eval_interpreter"]:
             if interp_key not in state:
                 continue
@@ -213,3 +422,6 @@ class MLEBenchTask(Task):
 
             if hasattr(interpreter, "clean_up"):
                 interpreter.clean_up()
+
+            if hasattr(interpreter, "close"):
+                interpreter.close()
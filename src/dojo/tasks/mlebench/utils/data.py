@@ -4,18 +4,30 @@
 # This source code is licensed under the license found in the
 # LICENSE file in the root directory of this source tree.
 
+import hashlib
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import tarfile
-import zipfile
 import py7zr
 import os
 import shutil
+import tempfile
+
+from dojo.core.interpreters.utils import directory_fingerprint, extract_zip_file
+from dojo.core.solvers.utils import data_preview
+from dojo.core.tasks.constants import DATA_PREVIEW_FNAME
 
 logger = logging.getLogger(__name__)
 
 TASK_DIR = Path(__file__).parent.parent
 
+# written in the directory of a competition once it is fully prepared, see `is_prepared`
+PREPARED_MARKER_FNAME = ".dojo_prepared.json"
+# files derived from the prepared data, which may be (re)generated without preparing the competition again
+DERIVED_FILES = (DATA_PREVIEW_FNAME,)
+
 
 def tar_directory(root_dir, output_file):
     logger.info(f"Creating tarball from {root_dir} to {output_file}")
@@ -26,6 +38,62 @@ def tar_directory(root_dir, output_file):
                 tar.add(file_path, arcname=os.path.relpath(file_path, os.path.dirname(root_dir)))
 
 
+def write_data_preview(public_dir: Path) -> Path:
+    """
+    Generate the data preview of a prepared competition and write it next to its public folder.
+    The preview is generated as the agents see the data, i.e. as `data/` in their working dir.
+    """
+    public_dir = Path(public_dir).resolve()
+    output_file = public_dir.parent / DATA_PREVIEW_FNAME
+    logger.info(f"Generating the data preview of {public_dir} to {output_file}")
+    with tempfile.TemporaryDirectory() as working_dir:
+        (Path(working_dir) / "data").symlink_to(public_dir, target_is_directory=True)
+        preview = data_preview.generate(Path(working_dir), use_cache=False)
+    output_file.write_text(preview)
+    return output_file
+
+
+def file_checksum(path: Path) -> str | None:
+    """SHA-256 of a file, None if it does not exist."""
+    path = Path(path)
+    if not path.is_file():
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(2**20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_prepared(competition_dir: Path, checksum: str | None) -> bool:
+    """
+    Whether a competition was fully prepared from the dataset identified by `checksum` (that of its expected
+    checksums), and its prepared files are unchanged since.
+    """
+    marker_path = Path(competition_dir) / PREPARED_MARKER_FNAME
+    try:
+        marker = json.loads(marker_path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+    prepared_dir = Path(competition_dir) / "prepared"
+    return (
+        marker.get("checksum") == checksum
+        and prepared_dir.is_dir()
+        and marker.get("fingerprint") == directory_fingerprint(prepared_dir, exclude=DERIVED_FILES)
+    )
+
+
+def mark_prepared(competition_dir: Path, checksum: str | None) -> None:
+    """Record that a competition is fully prepared, along with a fingerprint of its prepared files."""
+    fingerprint = directory_fingerprint(Path(competition_dir) / "prepared", exclude=DERIVED_FILES)
+    marker = {"checksum": checksum, "fingerprint": fingerprint}
+    (Path(competition_dir) / PREPARED_MARKER_FNAME).write_text(json.dumps(marker))
+
+
+def unmark_prepared(competition_dir: Path) -> None:
+    (Path(competition_dir) / PREPARED_MARKER_FNAME).unlink(missing_ok=True)
+
+
 def get_competition_ids_in_split(split_id):
     fname = Path(__file__).parent.parent / "splits" / f"{split_id}.txt"
 
@@ -36,9 +104,18 @@ def get_competition_ids_in_split(split_id):
 
 
 def extract_all_from_path(
-    path: Path, already_extracted: set = set(), force: bool = True, delete_compressed: bool = False
+    path: Path,
+    already_extracted: set | None = None,
+    force: bool = True,
+    delete_compressed: bool = False,
+    num_workers: int = 1,
 ) -> None:
-    """Extracts the contents of a compressed file to a destination directory."""
+    """
+    Extracts the contents of a compressed file to a destination directory.
+    With `num_workers` > 1, the archives of a directory, and the members of zip archives, are extracted in parallel.
+    """
+    if already_extracted is None:
+        already_extracted = set()
 
     def extract(file: Path, dst: Path) -> None:
         """Extracts a compressed file to the specified destination."""
@@ -52,8 +129,7 @@ def extract_all_from_path(
                 with py7zr.SevenZipFile(file, mode="r") as ref:
                     ref.extractall(dst)
             elif file.suffix == ".zip":
-                with zipfile.ZipFile(file, "r") as ref:
-                    ref.extractall(dst)
+                extract_zip_file(file, dst, num_workers=num_workers)
             elif file.suffix == ".gz" or file.name.endswith(".tar.gz"):
                 with tarfile.open(file, "r:gz") as ref:
                     ref.extractall(dst)
@@ -95,7 +171,19 @@ def extract_all_from_path(
         return
     to_extract = {fpath for fpath in set(path.iterdir()) - already_extracted if is_compressed(fpath)}
     already_extracted.update(to_extract)
-    for fpath in to_extract:
+
+    def extract_nested(fpath: Path) -> None:
         extract_all_from_path(
-            fpath, already_extracted=already_extracted, force=force, delete_compressed=delete_compressed
+            fpath,
+            already_extracted=already_extracted,
+            force=force,
+            delete_compressed=delete_compressed,
+            num_workers=num_workers,
         )
+
+    if num_workers > 1 and len(to_extract) > 1:
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            list(pool.map(extract_nested, sorted(to_extract)))
+    else:
+        for fpath in to_extract:
+            extract_nested(fpath)
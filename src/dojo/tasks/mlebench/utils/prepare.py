@@ -11,6 +11,7 @@
 
 import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from mlebench.data import (
@@ -25,6 +26,82 @@ import dojo.tasks.mlebench.utils.data as data_utils
 logger = get_logger(__name__)
 
 
+def prepare_competition(competition_id: str, args: argparse.Namespace) -> str:
+    """Prepare a single competition (in a worker process with `--num-workers`). Returns what was done."""
+    competition = registry.set_data_dir(Path(args.data_dir)).get_competition(competition_id)
+    competition_dir = Path(args.data_dir).resolve() / competition.id
+    path_to_public_folder = competition_dir / "prepared" / "public"
+    if args.only_data_preview:
+        data_utils.write_data_preview(path_to_public_folder)
+        return "data preview generated"
+
+    # the expected checksums identify the dataset: skip it if it was already prepared from the same one
+    checksum = data_utils.file_checksum(competition.checksums)
+    if not args.force and data_utils.is_prepared(competition_dir, checksum):
+        logger.info(f"{competition.id} is already prepared, skipping it.")
+        return "already prepared"
+    # if the preparation is interrupted, the competition is prepared again by the next invocation
+    data_utils.unmark_prepared(competition_dir)
+
+    # from mlebench.utils import (
+    #     authenticate_kaggle_api,
+    # )
+    # api = authenticate_kaggle_api()
+
+    # # only import when necessary; otherwise kaggle asks for API key on import
+    # from kaggle.rest import ApiException
+
+    # try:
+    #     api.competition_download_files(
+    #         competition=competition.id,
+    #         path=".",
+    #         quiet=True,
+    #         force=True,
+    #     )
+    # except ApiException as e:
+    #     if _need_to_accept_rules(str(e)):
+    #         logger.warning("You must accept the competition rules before downloading the dataset.")
+    #         _prompt_user_to_accept_rules(competition.id)
+    #         # download_dataset(competition_id, download_dir, quiet, force)
+    #     else:
+    #         raise e
+    # except Exception as e:
+    #     print(e)
+
+    # Support for custom prepare_fn logic
+    # object.__setattr__(competition, "prepare_fn", import_fn("data.mlebench.aptos2019-blindness-detection.prepare:prepare"))
+    download_and_prepare_dataset(
+        competition=competition,
+        keep_raw=args.keep_raw,
+        overwrite_checksums=args.overwrite_checksums,
+        overwrite_leaderboard=args.overwrite_leaderboard,
+        skip_verification=args.skip_verification,
+    )
+
+    raw_zip_path = Path(args.data_dir).resolve() / competition.id / f"{competition.id}.zip"
+
+    if not args.keep_zip and raw_zip_path.exists():
+        os.remove(raw_zip_path)
+
+    # Our Agents expect the data to be already extracted
+    data_utils.extract_all_from_path(
+        path=path_to_public_folder,
+        delete_compressed=not args.keep_zip,
+        num_workers=args.extract_workers,
+    )
+
+    # tarball the public folder
+    tarball_path = path_to_public_folder.parent / "public.tar"
+    data_utils.tar_directory(root_dir=path_to_public_folder, output_file=tarball_path)
+
+    # Precompute the data preview once, rather than in every run
+    data_utils.write_data_preview(path_to_public_folder)
+
+    # with --overwrite-checksums, the preparation rewrote the expected checksums: the next invocation compares to these
+    data_utils.mark_prepared(competition_dir, data_utils.file_checksum(competition.checksums))
+    return "prepared"
+
+
 def main():
     parser_prepare = argparse.ArgumentParser(description="Runs agents on Kaggle competitions.")
     parser_prepare.add_argument(
@@ -82,69 +159,72 @@ def main():
         required=False,
         default=False,
     )
+    parser_prepare.add_argument(
+        "--only-data-preview",
+        help="Only (re)generate the data preview of already prepared competitions.",
+        action="store_true",
+        required=False,
+        default=False,
+    )
+    parser_prepare.add_argument(
+        "--num-workers",
+        help="Number of competitions prepared in parallel, in separate processes.",
+        type=int,
+        required=False,
+        default=1,
+    )
+    parser_prepare.add_argument(
+        "--extract-workers",
+        help="Number of threads extracting the archives of a competition.",
+        type=int,
+        required=False,
+        default=4,
+    )
+    parser_prepare.add_argument(
+        "--force",
+        help="Prepare the competitions again even if they are marked as prepared.",
+        action="store_true",
+        required=False,
+        default=False,
+    )
     args = parser_prepare.parse_args()
 
-    new_registry = registry.set_data_dir(Path(args.data_dir))
-
     if args.split:
         competition_ids = data_utils.get_competition_ids_in_split(args.split)
-        competitions = [new_registry.get_competition(competition_id) for competition_id in competition_ids]
     else:
         if not args.competition_id:
             parser_prepare.error("One of --competition-id or --split must be specified.")
-        competitions = [new_registry.get_competition(args.competition_id)]
-
-    for competition in competitions:
-        # from mlebench.utils import (
-        #     authenticate_kaggle_api,
-        # )
-        # api = authenticate_kaggle_api()
-
-        # # only import when necessary; otherwise kaggle asks for API key on import
-        # from kaggle.rest import ApiException
-
-        # try:
-        #     api.competition_download_files(
-        #         competition=competition.id,
-        #         path=".",
-        #         quiet=True,
-        #         force=True,
-        #     )
-        # except ApiException as e:
-        #     if _need_to_accept_rules(str(e)):
-        #         logger.warning("You must accept the competition rules before downloading the dataset.")
-        #         _prompt_user_to_accept_rules(competition.id)
-        #         # download_dataset(competition_id, download_dir, quiet, force)
-        #     else:
-        #         raise e
-        # except Exception as e:
-        #     print(e)
-
-        # Support for custom prepare_fn logic
-        # object.__setattr__(competition, "prepare_fn", import_fn("data.mlebench.aptos2019-blindness-detection.prepare:prepare"))
-        download_and_prepare_dataset(
-            competition=competition,
-            keep_raw=args.keep_raw,
-            overwrite_checksums=args.overwrite_checksums,
-            overwrite_leaderboard=args.overwrite_leaderboard,
-            skip_verification=args.skip_verification,
-        )
-
-        raw_zip_path = Path(args.data_dir).resolve() / competition.id / f"{competition.id}.zip"
-
-        if not args.keep_zip and raw_zip_path.exists():
-            os.remove(raw_zip_path)
-
-        # Our Agents expect the data to be already extracted
-        path_to_public_folder = Path(args.data_dir).resolve() / competition.id / "prepared" / "public"
-        data_utils.extract_all_from_path(
-            path=path_to_public_folder,
-            delete_compressed=not args.keep_zip,
-        )
-
-        # tarball the public folder
-        tarball_path = path_to_public_folder.parent / "public.tar"
-        data_utils.tar_directory(root_dir=path_to_public_folder, output_file=tarball_path)
+        competition_ids = [args.competition_id]
+
+    if args.num_workers <= 1:
+        outcomes = {}
+        for competition_id in competition_ids:
+            try:
+                outcomes[competition_id] = prepare_competition(competition_id, args)
+            except Exception as e:
+                logger.exception(f"Failed to prepare {competition_id}")
+                outcomes[competition_id] = e
+    else:
+        # competitions are independent: download, prepare and extract several of them at once
+        with ProcessPoolExecutor(max_workers=args.num_workers) as pool:
+            futures = {
+                competition_id: pool.submit(prepare_competition, competition_id, args)
+                for competition_id in competition_ids
+            }
+            outcomes = {}
+            for competition_id, future in futures.items():
+                try:
+                    outcomes[competition_id] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to prepare {competition_id}: {e}")
+                    outcomes[competition_id] = e
+
+    failed = [competition_id for competition_id, outcome in outcomes.items() if isinstance(outcome, Exception)]
+    for competition_id, outcome in outcomes.items():
+        logger.info(f"{competition_id}: {'FAILED: ' if competition_id in failed else ''}{outcome}")
+    if failed:
+        # the competitions that were prepared are marked, re-running only prepares the failed ones
+        raise SystemExit(f"Failed to prepare {len(failed)} competition(s): {', '.join(failed)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,154 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Down-sampled mirror of the public data of a competition, for smoke runs.
+
+Tables (.csv, .tsv, .jsonl) larger than a threshold are cut to their first rows, and so are the smaller tables with as
+many lines as one of them, which are most likely aligned with it (e.g. test.csv and sample_submission.csv). Cutting
+all of them to their first rows is deterministic and keeps them aligned. Every other file, and every directory without
+tables to cut, is symlinked: it is never copied, and files referenced by the tables (images, ...) still exist.
+
+The mirror is built once per competition and data version, and shared by all the runs.
+"""
+
+import csv
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Set
+
+from dojo.core.interpreters.utils import directory_fingerprint
+
+import logging
+
+log = logging.getLogger(__name__)
+
+MIRROR_MARKER_FNAME = ".smoke_mirror.json"
+# bumped when the layout of the mirror changes, to rebuild the existing ones
+MIRROR_VERSION = 2
+TABLE_SUFFIXES = {".csv", ".tsv", ".jsonl"}
+# tables up to this size are symlinked rather than cut, unless aligned with a cut one
+MIN_TABLE_BYTES = 2**20
+# directories with more tables hold per-sample files (e.g. one time series per id), never aligned with a cut table
+MAX_ALIGNED_TABLES_PER_DIR = 20
+
+# errors a correct solution may raise on the sample only: tables of different lengths, classes missing from the first
+# rows, too few samples for the splits, ...
+SAMPLE_ONLY_ERRORS = re.compile(
+    "|".join(
+        [
+            r"Length of values \(\d+\) does not match length of index",
+            r"Length mismatch: Expected axis has \d+ elements",
+            r"Found input variables with inconsistent numbers of samples",
+            r"The least populated class in y has only \d+ member",
+            r"Cannot have number of splits n_splits=\d+ greater than the number of samples",
+            r"n_splits=\d+ cannot be greater than the number of members in each class",
+            r"needs samples of at least 2 classes",
+            r"Only one class present in y_true",
+            r"contains only one class",
+            r"Found array with 0 sample\(s\)",
+            r"y contains previously unseen labels",
+            r"Number of classes in y_true not equal to the number of columns in 'y_score'",
+            r"y_true and y_pred contain different number of classes",
+        ]
+    )
+)
+
+
+def is_sample_only_error(output: str) -> bool:
+    """Whether the output of a failed smoke run ends with an error that may only be due to the sample."""
+    return SAMPLE_ONLY_ERRORS.search(output) is not None
+
+
+def _line_count(path: Path) -> int:
+    count = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            count += chunk.count(b"\n")
+    return count
+
+
+def _tables_to_cut(source: Path) -> Set[Path]:
+    """Paths (relative to `source`) of the large tables, and of the small tables with as many lines as one of them."""
+    large, small = [], []
+    for root, _, files in os.walk(source, followlinks=True):
+        tables = [Path(root) / name for name in files if Path(name).suffix in TABLE_SUFFIXES]
+        for table in tables:
+            if table.stat().st_size > MIN_TABLE_BYTES:
+                large.append(table)
+            elif len(tables) <= MAX_ALIGNED_TABLES_PER_DIR:
+                small.append(table)
+
+    cut = set(large)
+    if large and small:
+        large_lines = {_line_count(table) for table in large}
+        cut.update(table for table in small if _line_count(table) in large_lines)
+    return {table.relative_to(source) for table in cut}
+
+
+def _cut_table(source: Path, destination: Path, max_rows: int) -> None:
+    if source.suffix == ".jsonl":
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            for i, line in enumerate(src):
+                if i >= max_rows:
+                    break
+                dst.write(line)
+        return
+    # parse rather than copy lines, rows may span several lines
+    delimiter = "\t" if source.suffix == ".tsv" else ","
+    with open(source, newline="") as src, open(destination, "w", newline="") as dst:
+        writer = csv.writer(dst, delimiter=delimiter)
+        for i, row in enumerate(csv.reader(src, delimiter=delimiter)):
+            if i > max_rows:  # the header and `max_rows` rows
+                break
+            writer.writerow(row)
+
+
+def _mirror(source: Path, destination: Path, max_rows: int, cut: Set[Path], rel: Path = Path()) -> None:
+    destination.mkdir(parents=True, exist_ok=True)
+    for entry in sorted(source.iterdir()):
+        target, entry_rel = destination / entry.name, rel / entry.name
+        if entry.is_dir():
+            if any(entry_rel in path.parents for path in cut):
+                _mirror(entry, target, max_rows, cut, entry_rel)
+            else:
+                target.symlink_to(entry.resolve(), target_is_directory=True)
+        elif entry_rel in cut:
+            _cut_table(entry, target, max_rows)
+        else:
+            target.symlink_to(entry.resolve())
+
+
+def build_subsampled_mirror(source: Path, destination: Path, max_rows: int) -> Path:
+    """
+    Build (or reuse) the down-sampled mirror of `source` at `destination`, with at most `max_rows` rows per table.
+
+    The mirror is rebuilt if `source` or `max_rows` changed since it was built. It is built aside and moved into
+    place, so that concurrent runs never see a partial mirror.
+    """
+    source, destination = Path(source).resolve(), Path(destination).resolve()
+    expected = {"version": MIRROR_VERSION, "max_rows": max_rows, "fingerprint": directory_fingerprint(source)}
+    try:
+        if json.loads((destination / MIRROR_MARKER_FNAME).read_text()) == expected:
+            return destination
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    log.info(f"Building the down-sampled mirror of {source} at {destination} ({max_rows} rows per table)")
+    tmp = destination.with_name(f".{destination.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    _mirror(source, tmp, max_rows, _tables_to_cut(source))
+    (tmp / MIRROR_MARKER_FNAME).write_text(json.dumps(expected))
+    shutil.rmtree(destination, ignore_errors=True)
+    try:
+        os.replace(tmp, destination)
+    except OSError:
+        # another run moved its mirror into place first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return destination
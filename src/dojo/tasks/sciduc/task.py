@@ -1,10 +1,21 @@
+import contextlib
+import io
+import json
 import os
+import shutil
+import uuid
+from functools import cached_property, partial
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
 
 from dojo.core.tasks.base import Task
+from dojo.core.tasks.constants import AUX_EVAL_INFO, PENDING_GRADING
+from dojo.core.tasks.grading_service import PendingGrading
 from dojo.config_dataclasses.task.sciduc import SciDUCTaskConfig
 from dojo.utils.logger import get_logger
+from dojo.utils.deadline import Deadline
 from dojo.tasks.sciduc.evaluate import evaluate_program
 from sciduc.registry import registry
 
@@ -22,15 +33,33 @@ class SciDUCTask(Task):
         task_description_path = Path(self.cfg.public_dir).resolve() / "description.md"
         self.task_description = self.instructions + "\n" + task_description_path.read_text()
 
-        self.task_data_path = "/....." # HARDCODE for now
+        self.task_data_path = Path(self.cfg.answers_path).resolve()
+
+        # COCO evaluation can be slow: optionally grade in worker processes, with a timeout. Every worker indexes
+        # the ground truth once, as `self.ground_truth` does for inline grading.
+        self.grading_service = self.start_grading_service(partial(load_ground_truth, self.task_data_path))
+
+    @cached_property
+    def ground_truth(self) -> "COCO":
+        """The indexed ground-truth annotations, loaded on first use and reused by every grading."""
+        return load_ground_truth(self.task_data_path)
 
     def prepare(self, **task_args: Optional[Dict]) -> Dict:
         state = task_args
         state["init_obs"] = {}
         self._submission_file_path = Path(task_args["solver_interpreter"].working_dir) / "results.json"
+        self.start_code_screening(task_args["solver_interpreter"])
         return state, {TASK_DESCRIPTION: self.task_description}
 
-    def step_task(self, state: Dict, action: Any) -> Tuple[Dict, Dict]:
+    def step_task(
+        self,
+        state: Dict,
+        action: Any,
+        *,
+        node_id: Optional[str] = None,
+        parent_node_id: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[Dict, Dict]:
         try:
             solution = extract_code(action)
         except Exception as e:
@@ -38,9 +67,14 @@ class SciDUCTask(Task):
             exec_output = ExecutionResult.get_empty()
             exec_output.term_out[0] = f"Invalid solution: {e}"
             return state, {EXECUTION_OUTPUT: exec_output, VALIDATION_FITNESS: None, VALID_SOLUTION: False}
-        
+
+        # Reject the solutions that would certainly fail, without executing them
+        screened = self.screen_solution(solution)
+        if screened is not None:
+            return state, screened
+
         interpreter = state["solver_interpreter"]
-        exec_output: ExecutionResult = interpreter.run(solution, file_name=self._solution_script)
+        exec_output: ExecutionResult = interpreter.run(solution, file_name=self._solution_script, deadline=deadline)
         eval_result = {EXECUTION_OUTPUT: exec_output}
 
         if (not exec_output.exit_code == 0) or exec_output.timed_out:
@@ -56,25 +90,32 @@ class SciDUCTask(Task):
             self.logger.info(f"Submission file fetched: {self._submission_file_path}")
         submission_exists = self._submission_file_path.exists()
         eval_result[VALID_SOLUTION] = False
-        if submission_exists:
-            is_valid_submission, message = validate_submission(self._submission_file_path, self.task_data_path)
-            eval_result[VALID_SOLUTION] = is_valid_submission
-            eval_result[VALID_SOLUTION_FEEDBACK] = message
-            self.logger.info(f"Submission file found: {self._submission_file_path} || Submission valid: {is_valid_submission}")
-            if is_valid_submission:
-                metrics = grade(self._submission_file_path, self.task_data_path)
-                eval_result[TEST_FITNESS] = metrics["AP@0.5"]
-                self.logger.info(f"Test fitness: {eval_result[TEST_FITNESS]}")
-            self._submission_file_path.unlink(missing_ok=True) # remove the submission_file locally
+        if submission_exists and self.grading_service is not None:
+            # validate and grade at once in a worker, the solver collects the outcome once it needs it
+            self.logger.info(f"Submission file found: {self._submission_file_path}")
+            grading_dir = Path(self.cfg.results_output_dir) / "pending_grading"
+            grading_dir.mkdir(parents=True, exist_ok=True)
+            detached = grading_dir / f"{uuid.uuid4().hex}.json"
+            shutil.move(self._submission_file_path, detached)
+            future = self.grading_service.submit(grade_submission_job, detached, self.cfg.coco_iou_thresholds)
+            eval_result[PENDING_GRADING] = PendingGrading(future, self._grading_outcome)
+        elif submission_exists:
+            self.logger.info(f"Submission file found: {self._submission_file_path}")
+            # validate and grade at once: the submission is valid if the grading succeeds. It removes the submission.
+            grading = grade_submission_job(
+                self.ground_truth, self._submission_file_path, self.cfg.coco_iou_thresholds
+            )
+            eval_result.update(self._grading_outcome(grading))
             assert not self._submission_file_path.exists(), (
                 "At this point, the submissions file should not exists locally!"
             )
         if interpreter.factory:
             interpreter.close()
-        else:
-            interpreter.run(
-                f"!rm {self.cfg.submission_fname}"
-            )  # remove the submission_file from the agent's environment
+        elif not interpreter.local and not getattr(interpreter, "mounted_workspace", False):
+            # remove the submission_file from the agent's environment, in the current kernel: resetting the session
+            # would start a new kernel just to delete a file. A mounted workspace is shared with the host, so the
+            # local removal above is enough
+            interpreter.run(f"!rm -f {self.cfg.submission_fname}", reset_session=False, include_exec_time=False)
             assert interpreter.fetch_file(self._submission_file_path) is None, (
                 "At this point, the submissions file should not exists in the agent's environment!"
             )
@@ -92,13 +133,28 @@ class SciDUCTask(Task):
         has_csv_submission = self._submission_file_path.exists()
         assert has_csv_submission, "The final solution is not valid!"
 
-        metrics = grade(self._submission_file_path, self.task_data_path)
+        # the final grading always evaluates all the IoU thresholds, for the full set of stats
+        metrics = grade(self._submission_file_path, self.ground_truth)
         eval_result[TEST_FITNESS] = metrics["AP@0.5"]
-        self.logger.info(f"Test fitness: {eval_result[TEST_FITNESS]}")
+        eval_result[AUX_EVAL_INFO] = metrics
+        self.logger.info(f"Test fitness: {eval_result[TEST_FITNESS]} || AUX eval info: {metrics}")
 
         return eval_result
 
+    def _grading_outcome(self, result: Tuple[bool, str, Optional[Dict]]) -> Dict:
+        is_valid_submission, message, metrics = result
+        self.logger.info(f"Submission valid: {is_valid_submission}")
+        outcome = {VALID_SOLUTION: is_valid_submission, VALID_SOLUTION_FEEDBACK: message}
+        if is_valid_submission:
+            outcome[TEST_FITNESS] = metrics["AP@0.5"]
+            outcome[AUX_EVAL_INFO] = metrics
+            self.logger.info(f"Test fitness: {outcome[TEST_FITNESS]} || AUX eval info: {metrics}")
+        return outcome
+
     def close(self, state: Dict) -> None:
+        if self.grading_service is not None:
+            self.grading_service.close()
+
         for interp_key in ["solver_interpreter", "eval_interpreter"]:
             if interp_key not in state:
                 continue
@@ -110,6 +166,9 @@ class SciDUCTask(Task):
             if hasattr(interpreter, "clean_up"):
                 interpreter.clean_up()
 
+            if hasattr(interpreter, "close"):
+                interpreter.close()
+
 def validate_submission(submission: Path, task: Task) -> tuple[bool, str]:
     """
     Validates a submission for the given competition by actually running the competition grader.
@@ -135,41 +194,101 @@ def validate_submission(submission: Path, task: Task) -> tuple[bool, str]:
 
     return True, "Submission is valid."
 
-from pycocotools.coco import COCO
-from pycocotools.cocoeval import COCOeval
+# faster_coco_eval is a drop-in, vectorized (C++) replacement of pycocotools, used when it is installed
+try:
+    from faster_coco_eval import COCO
+    from faster_coco_eval import COCOeval_faster as COCOeval
+except ImportError:
+    from pycocotools.coco import COCO
+    from pycocotools.cocoeval import COCOeval
+
+# the twelve stats of `COCOeval.summarize`, as (label, AP or AR, IoU threshold or None for .5:.95, area, max dets)
+COCO_STATS = [
+    ("AP@[.5:.95]", "precision", None, "all", 100),
+    ("AP@0.5", "precision", 0.5, "all", 100),
+    ("AP@0.75", "precision", 0.75, "all", 100),
+    ("AP (small)", "precision", None, "small", 100),
+    ("AP (medium)", "precision", None, "medium", 100),
+    ("AP (large)", "precision", None, "large", 100),
+    ("AR@1", "recall", None, "all", 1),
+    ("AR@10", "recall", None, "all", 10),
+    ("AR@100", "recall", None, "all", 100),
+    ("AR (small)", "recall", None, "small", 100),
+    ("AR (medium)", "recall", None, "medium", 100),
+    ("AR (large)", "recall", None, "large", 100),
+]
+
+
+def load_ground_truth(answer) -> COCO:
+    """Parse and index the ground-truth annotations (a COCO JSON file) once, to grade any number of submissions."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return COCO(str(answer))
 
-def grade(submission, answer):
+
+def summarize(evaluator) -> Dict[str, float]:
+    """
+    The stats of `COCOeval.summarize`, computed from the accumulated precision and recall without printing them.
+
+    Stats over IoU=.5:.95 are only reported if all ten thresholds were evaluated, and the stats at IoU=.5 and .75 if
+    these thresholds were evaluated. As in COCO, a stat without any ground truth is -1.
     """
-      Answer is a path to a JSON file containing the ground truth annotations in COCO format.
+    params = evaluator.params
+    iou_thrs = np.asarray(params.iouThrs)
+    full_range = len(iou_thrs) == 10 and np.allclose(iou_thrs, np.linspace(0.5, 0.95, 10))
+    metrics = {}
+    for label, kind, iou_thr, area, max_dets in COCO_STATS:
+        if iou_thr is None:
+            if not full_range:
+                continue
+            t = slice(None)
+        else:
+            matches = np.flatnonzero(np.isclose(iou_thrs, iou_thr))
+            if len(matches) == 0:
+                continue
+            t = matches[:1]
+        a = params.areaRngLbl.index(area)
+        m = params.maxDets.index(max_dets)
+        # precision is [T, R, K, A, M], recall is [T, K, A, M]
+        values = evaluator.eval[kind][t, ..., a, m]
+        values = values[values > -1]
+        metrics[label] = float(values.mean()) if values.size else -1.0
+    return metrics
+
+
+def grade(submission, answer, iou_thresholds: Optional[List[float]] = None) -> Dict[str, float]:
+    """
+      Answer is the ground truth (see `load_ground_truth`), or a path to a JSON file with the annotations in COCO format.
       Submission is a path to a json file containing the predictions in COCO format.
+      Only the IoU thresholds `iou_thresholds` are evaluated (all ten of COCO, .5:.95, by default).
     """
-    coco_gt = COCO(answer)
+    coco_gt = answer if isinstance(answer, COCO) else load_ground_truth(answer)
     with open(submission, "r") as f:
         coco_predictions = json.load(f)
-    coco_dt = coco_gt.loadRes(coco_predictions)
-    evaluator = COCOeval(coco_gt, coco_dt, iou_type="bbox")
-    evaluator.evaluate()
-    evaluator.accumulate()
-    evaluator.summarize()
-    stats = evaluator.stats
-    labels = [
-        "AP@[.5:.95]",
-        "AP@0.5",
-        "AP@0.75",
-        "AP (small)",
-        "AP (medium)",
-        "AP (large)",
-        "AR@1",
-        "AR@10",
-        "AR@100",
-        "AR (small)",
-        "AR (medium)",
-        "AR (large)"
-    ]
-    metrics = {}
-    # print("Evaluation results:")
-    for name, value in zip(labels, stats):
-        # print(f"{name:<15}: {value:.4f}")
-        metrics[name] = value
-    metrics = {"AP@0.5": metrics["AP@0.5"]}
-    return metrics
\ No newline at end of file
+    with contextlib.redirect_stdout(io.StringIO()):
+        coco_dt = coco_gt.loadRes(coco_predictions)
+        evaluator = COCOeval(coco_gt, coco_dt, iouType="bbox")
+        if iou_thresholds is not None:
+            evaluator.params.iouThrs = np.asarray(sorted(iou_thresholds), dtype=float)
+        evaluator.evaluate()
+        evaluator.accumulate()
+    return summarize(evaluator)
+
+
+def grade_submission_job(
+    context, submission: Path, iou_thresholds: Optional[List[float]] = None
+) -> Tuple[bool, str, Optional[Dict]]:
+    """
+    Validate and grade a submission at once, against the ground truth `context` (see `load_ground_truth`), inline or
+    as a grading service job. The submission is removed afterwards.
+    """
+    try:
+        metrics = grade(submission, context, iou_thresholds)
+    except Exception as e:
+        return (
+            False,
+            f"Submission invalid! The attempt to grade the submission has resulted in the following error message:\n{e}",
+            None,
+        )
+    finally:
+        submission.unlink(missing_ok=True)
+    return True, "Submission is valid.", metrics
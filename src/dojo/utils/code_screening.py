@@ -0,0 +1,305 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Static screening of generated code, before it is executed.
+
+Catches the failures that can be told without running the code: syntax errors, imports of modules that are not
+installed where the code runs, and reads of data files that do not exist. Such code is reported as failing with a
+synthetic traceback, which saves its execution and the analysis of its output.
+
+The checks are conservative, they must never reject code that could run: only module-level imports are checked
+(imports in functions or try blocks may be optional), and only literal paths under the data dir read by unconditional
+module-level statements (not in functions, branches, loops or try blocks) are. A path tested for existence anywhere in
+the code is never reported, and neither is any path if the code tests a path that is not a literal.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import pkgutil
+import posixpath
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+import logging
+
+log = logging.getLogger(__name__)
+
+# calls reading their first argument as a file (builtins, pandas, numpy, PIL, cv2, torch, joblib, ...)
+READ_CALLS = {
+    "open",
+    "read_csv",
+    "read_table",
+    "read_parquet",
+    "read_feather",
+    "read_json",
+    "read_excel",
+    "read_pickle",
+    "read_text",
+    "read_bytes",
+    "load",
+    "loadtxt",
+    "genfromtxt",
+    "imread",
+}
+# calls testing whether their first argument exists, whose paths are never reported
+EXISTENCE_CALLS = {"exists", "isfile", "isdir", "is_file", "is_dir", "glob", "iglob", "listdir", "scandir"}
+
+# lists the top-level modules importable by the interpreter, as a JSON list on the last line of the output
+LIST_MODULES_CODE = (
+    "import json, pkgutil, sys\n"
+    "print(json.dumps(sorted({m.name for m in pkgutil.iter_modules()} | set(sys.builtin_module_names)"
+    " | set(getattr(sys, 'stdlib_module_names', ())))))"
+)
+
+_MAGIC_LINE = re.compile(r"^(\s*)[!%].*$", re.MULTILINE)
+_PATTERN_CHARS = set("{}*?[]%")
+
+
+def installed_modules() -> Set[str]:
+    """Top-level modules importable in the current environment."""
+    return (
+        {m.name for m in pkgutil.iter_modules()}
+        | set(sys.builtin_module_names)
+        | set(getattr(sys, "stdlib_module_names", ()))
+    )
+
+
+def list_files(root: Path) -> Set[str]:
+    """Relative (posix) paths of the files and directories under `root`, following symlinks."""
+    paths = set()
+    for dirpath, dirnames, filenames in os.walk(root, followlinks=True):
+        rel = Path(dirpath).relative_to(root).as_posix()
+        prefix = "" if rel == "." else f"{rel}/"
+        paths.update(prefix + name for name in dirnames)
+        paths.update(prefix + name for name in filenames)
+    return paths
+
+
+@dataclass
+class ScreeningFailure:
+    """Why the code would fail, described as the exception it would raise."""
+
+    exc_type: str
+    message: str
+    lineno: Optional[int] = None
+    line: Optional[str] = None
+
+    @property
+    def summary(self) -> str:
+        where = f" (line {self.lineno})" if self.lineno is not None else ""
+        return f"{self.exc_type}: {self.message}{where}"
+
+    def traceback(self, file_name: str) -> str:
+        """The traceback the execution would end with."""
+        # syntax errors are raised before running any code, without a stack
+        syntax = self.exc_type in ("SyntaxError", "IndentationError", "TabError")
+        out = [] if syntax else ["Traceback (most recent call last):"]
+        if self.lineno is not None:
+            out.append(f'  File "{file_name}", line {self.lineno}' + ("" if syntax else ", in <module>"))
+            if self.line:
+                out.append(f"    {self.line.strip()}")
+        out.append(f"{self.exc_type}: {self.message}")
+        return "\n".join(out) + "\n"
+
+
+# module-level statements always executed when reached, unlike branches, loops and definitions
+_UNCONDITIONAL_STMTS = (ast.Expr, ast.Assign, ast.AnnAssign, ast.AugAssign, ast.With)
+
+
+def _call_path(node: ast.Call) -> tuple[Optional[str], Optional[str], bool]:
+    """Name of the function called, literal path it is called on (if any), and whether it is called on anything."""
+    func = node.func
+    name = func.attr if isinstance(func, ast.Attribute) else func.id if isinstance(func, ast.Name) else None
+    if node.args:
+        return name, _literal_path(node.args[0]), True
+    # `Path("data/x.csv").exists()`, `Path("data/x.csv").read_text()`
+    if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Call):
+        inner = func.value
+        if isinstance(inner.func, (ast.Name, ast.Attribute)) and inner.args:
+            return name, _literal_path(inner.args[0]), True
+    return name, None, False
+
+
+class _ExistenceVisitor(ast.NodeVisitor):
+    """Collects the literal paths tested for existence, anywhere in the code."""
+
+    def __init__(self) -> None:
+        self.tested: Set[str] = set()
+        # whether a path that is not a literal is tested, which may be any of the read paths
+        self.dynamic = False
+
+    def visit_Call(self, node: ast.Call) -> None:
+        name, path, has_target = _call_path(node)
+        if name in EXISTENCE_CALLS:
+            if path is not None:
+                self.tested.add(path)
+            elif has_target:
+                self.dynamic = True
+        self.generic_visit(node)
+
+
+class _ReadVisitor(ast.NodeVisitor):
+    """Collects the literal paths read by a statement, skipping the expressions that may not be evaluated."""
+
+    def __init__(self) -> None:
+        self.reads: list[tuple[str, ast.Call]] = []
+
+    def visit_Call(self, node: ast.Call) -> None:
+        name, path, _ = _call_path(node)
+        if path is not None and name in READ_CALLS and not _writes(node, name):
+            self.reads.append((path, node))
+        self.generic_visit(node)
+
+    def visit_IfExp(self, node: ast.IfExp) -> None:
+        self.visit(node.test)
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> None:
+        # short-circuited: only the first operand is always evaluated
+        self.visit(node.values[0])
+
+    def _skip(self, node: ast.AST) -> None:
+        pass
+
+    visit_Lambda = visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = _skip
+    # statements nested in a `with` block
+    visit_If = visit_For = visit_AsyncFor = visit_While = visit_Try = visit_TryStar = visit_Match = _skip
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _skip
+
+
+def _literal_path(node: ast.expr) -> Optional[str]:
+    # `Path("data/x.csv")`
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "Path" and node.args:
+        node = node.args[0]
+    if isinstance(node, ast.Constant) and isinstance(node.value, str) and not (_PATTERN_CHARS & set(node.value)):
+        return node.value
+    return None
+
+
+def _writes(call: ast.Call, name: str) -> bool:
+    """Whether an `open` call opens its file for writing."""
+    if name != "open":
+        return False
+    mode = call.args[1] if len(call.args) > 1 else next((k.value for k in call.keywords if k.arg == "mode"), None)
+    if mode is None:
+        return False
+    if not isinstance(mode, ast.Constant) or not isinstance(mode.value, str):
+        return True  # unknown mode, don't report it
+    return bool(set(mode.value) & set("wax+"))
+
+
+class CodeScreener:
+    """
+    Args:
+        modules (Set[str] | None): Top-level modules importable where the code runs. None skips the import checks.
+        data_files (Set[str] | None): Paths of the data files relative to the data dir. None skips the path checks.
+        data_prefix (str): Path of the data dir relative to the working dir of the code.
+        file_name (str): Name of the script in the synthetic tracebacks.
+        allow_magics (bool): Whether lines starting with `!` or `%` (IPython magics) are allowed.
+    """
+
+    def __init__(
+        self,
+        modules: Optional[Set[str]] = None,
+        data_files: Optional[Set[str]] = None,
+        data_prefix: str = "data",
+        file_name: str = "runfile.py",
+        allow_magics: bool = False,
+    ) -> None:
+        self.modules = modules
+        # an empty data dir most likely means it is not known
+        self.data_files = data_files or None
+        self.data_prefix = data_prefix.strip("/")
+        self.file_name = file_name
+        self.allow_magics = allow_magics
+        self._cache: Dict[str, Optional[ScreeningFailure]] = {}
+
+    @classmethod
+    def for_interpreter(cls, interpreter, file_name: str = "runfile.py") -> "CodeScreener":
+        """A screener for the code run by `interpreter`, which is asked for its modules unless it is local."""
+        if interpreter.local:
+            modules = installed_modules()
+        else:
+            modules = None
+            result = interpreter.run(LIST_MODULES_CODE, include_exec_time=False)
+            lines = "".join(result.term_out).strip().splitlines()
+            try:
+                modules = set(json.loads(lines[-1]))
+            except (IndexError, json.JSONDecodeError, TypeError):
+                log.warning("Could not list the modules of the interpreter, imports will not be screened.")
+
+        data_dir = getattr(interpreter, "data_dir", None)
+        data_files = list_files(Path(data_dir)) if data_dir is not None and Path(data_dir).is_dir() else None
+        return cls(modules, data_files, file_name=file_name, allow_magics=not interpreter.local)
+
+    def screen(self, code: str) -> Optional[ScreeningFailure]:
+        """Why `code` would fail, or None if it may run."""
+        key = hashlib.sha256(code.encode()).hexdigest()
+        if key not in self._cache:
+            self._cache[key] = self._screen(code)
+        return self._cache[key]
+
+    def _screen(self, code: str) -> Optional[ScreeningFailure]:
+        if self.allow_magics:
+            # magics are not python, neutralize them while keeping the line numbers
+            code = _MAGIC_LINE.sub(lambda m: f"{m.group(1)}pass", code)
+        lines = code.splitlines()
+
+        try:
+            tree = ast.parse(code, filename=self.file_name)
+            # some errors (e.g. `return` outside of a function) are only raised when compiling
+            compile(tree, self.file_name, "exec", dont_inherit=True)
+        except SyntaxError as e:
+            return ScreeningFailure(type(e).__name__, e.msg, e.lineno, e.text)
+        except (ValueError, RecursionError) as e:
+            log.debug(f"Could not screen the code: {e}")
+            return None
+
+        def line(node: ast.AST) -> Optional[str]:
+            return lines[node.lineno - 1] if 0 < node.lineno <= len(lines) else None
+
+        if self.modules is not None:
+            for node in tree.body:
+                if isinstance(node, ast.Import):
+                    names = [alias.name for alias in node.names]
+                elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                    names = [node.module]
+                else:
+                    continue
+                for name in names:
+                    top = name.split(".")[0]
+                    if top not in self.modules and top != "__future__":
+                        return ScreeningFailure(
+                            "ModuleNotFoundError", f"No module named '{top}'", node.lineno, line(node)
+                        )
+
+        if self.data_files is not None:
+            existence = _ExistenceVisitor()
+            existence.visit(tree)
+            visitor = _ReadVisitor()
+            if not existence.dynamic:
+                for stmt in tree.body:
+                    if isinstance(stmt, _UNCONDITIONAL_STMTS):
+                        visitor.visit(stmt)
+            for path, node in visitor.reads:
+                if path in existence.tested:
+                    continue
+                normalized = posixpath.normpath(path)
+                if not normalized.startswith(f"{self.data_prefix}/"):
+                    continue
+                if normalized[len(self.data_prefix) + 1 :] not in self.data_files:
+                    return ScreeningFailure(
+                        "FileNotFoundError",
+                        f"[Errno 2] No such file or directory: '{path}'",
+                        node.lineno,
+                        line(node),
+                    )
+        return None
@@ -0,0 +1,74 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Wall-clock deadline of a search, propagated to every stage of a step (operators, execution, analysis) so that each
+of them clips its own timeout to the remaining budget instead of overshooting it.
+
+The deadline is passed explicitly where the signatures are ours (`execute_op_plan_code`, `Task.step_task`,
+`Interpreter.run`), and made ambient with `Deadline.activate` for the LLM clients, which sit deep below the
+operators.
+"""
+
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+_current: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar("dojo_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised by a stage that refuses to start because the deadline has passed."""
+
+
+class Deadline:
+    """
+    A point in time (on the monotonic clock) by which the search must be over.
+
+    Args:
+        seconds (float | None): Time left from now. None means no deadline.
+    """
+
+    def __init__(self, seconds: float | None) -> None:
+        self._end = math.inf if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline, never negative (inf without a deadline)."""
+        return max(0.0, self._end - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self._end
+
+    def clip(self, timeout: float | None) -> float | None:
+        """Clip `timeout` (None meaning unlimited) to the remaining time. Returns None only if both are unlimited."""
+        remaining = self.remaining()
+        if timeout is None:
+            return None if math.isinf(remaining) else remaining
+        return min(timeout, remaining)
+
+    def check(self, what: str = "step") -> None:
+        """Raise `DeadlineExceeded` if the deadline has passed, so that `what` is not started."""
+        if self.expired():
+            raise DeadlineExceeded(f"Time limit reached, not starting the {what}.")
+
+    @contextmanager
+    def activate(self) -> Iterator["Deadline"]:
+        """Make this deadline the one returned by `current_deadline` within the block (and the current thread)."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.1f}s)"
+
+
+def current_deadline() -> Deadline | None:
+    """The deadline activated by the caller, if any."""
+    return _current.get()
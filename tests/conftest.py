@@ -0,0 +1,14 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import tempfile
+
+# the logger and the configs read these at import time: point them somewhere harmless if they are not set
+_scratch = tempfile.mkdtemp(prefix="dojo-tests-")
+for _name in ("LOGGING_DIR", "SUPERIMAGE_DIR", "MLE_BENCH_DATA_DIR"):
+    if not os.environ.get(_name):
+        os.environ[_name] = os.path.join(_scratch, _name.lower())
@@ -0,0 +1,108 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import textwrap
+
+import pytest
+
+from dojo.utils.code_screening import CodeScreener
+
+MODULES = {"os", "json", "pandas", "numpy"}
+DATA_FILES = {"train.csv", "test.csv", "images/0.png"}
+
+
+@pytest.fixture
+def screener():
+    return CodeScreener(MODULES, DATA_FILES)
+
+
+def screen(screener, code):
+    return screener.screen(textwrap.dedent(code))
+
+
+def test_valid_code_passes(screener):
+    assert screen(screener, "import pandas as pd\ndf = pd.read_csv('data/train.csv')\n") is None
+
+
+def test_syntax_error(screener):
+    failure = screen(screener, "x = (1,\n")
+    assert failure.exc_type == "SyntaxError"
+    assert failure.traceback("runfile.py").startswith('  File "runfile.py"')
+
+
+def test_compile_time_error(screener):
+    assert screen(screener, "return 1\n").exc_type == "SyntaxError"
+
+
+def test_missing_module(screener):
+    failure = screen(screener, "import os\nimport lightgbm.sklearn\n")
+    assert failure.exc_type == "ModuleNotFoundError"
+    assert failure.message == "No module named 'lightgbm'"
+    assert failure.lineno == 2
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        # optional imports
+        "try:\n    import lightgbm\nexcept ImportError:\n    lightgbm = None\n",
+        "def f():\n    import lightgbm\n",
+        "from . import lightgbm\n",
+        "from __future__ import annotations\n",
+    ],
+)
+def test_optional_imports_pass(screener, code):
+    assert screen(screener, code) is None
+
+
+def test_missing_data_file(screener):
+    failure = screen(screener, "import pandas as pd\ndf = pd.read_csv('data/train_v2.csv')\n")
+    assert failure.exc_type == "FileNotFoundError"
+    assert "data/train_v2.csv" in failure.message
+    assert failure.lineno == 2
+
+
+def test_nested_data_file(screener):
+    assert screen(screener, "open('./data/images/0.png', 'rb')\n") is None
+    assert screen(screener, "open('data/images/1.png', 'rb')\n").exc_type == "FileNotFoundError"
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        # files outside the data dir, or written rather than read
+        "open('submission.csv')\n",
+        "open('data/new.csv', 'w')\n",
+        # reads that may not happen
+        "import os\nif os.path.exists('data/extra.csv'):\n    open('data/extra.csv')\n",
+        "import os\nx = open('data/extra.csv') if os.path.exists('data/extra.csv') else None\n",
+        "import os\nx = open('data/extra.csv') if False else None\n",
+        "x = None or open('data/extra.csv')\n",
+        "def f():\n    return open('data/extra.csv')\n",
+        "for i in range(0):\n    open('data/extra.csv')\n",
+        "try:\n    open('data/extra.csv')\nexcept OSError:\n    pass\n",
+        "with open('data/train.csv') as f:\n    if False:\n        open('data/extra.csv')\n",
+        "f = lambda: open('data/extra.csv')\n",
+        "xs = [open(p) for p in ['data/extra.csv']]\n",
+        # a path tested for existence anywhere in the code
+        "import os\nprint(os.path.exists('data/extra.csv'))\nopen('data/extra.csv')\n",
+        # a path tested dynamically
+        "import os\nname = 'extra.csv'\nos.path.exists(name)\nopen('data/extra.csv')\n",
+    ],
+)
+def test_reads_that_may_succeed_pass(screener, code):
+    assert screen(screener, code) is None
+
+
+def test_unknown_data_dir_skips_path_checks():
+    assert CodeScreener(MODULES, set()).screen("open('data/anything.csv')\n") is None
+    assert CodeScreener(MODULES, None).screen("open('data/anything.csv')\n") is None
+
+
+def test_magics():
+    code = "!pip install lightgbm\nimport os\n"
+    assert CodeScreener(MODULES, DATA_FILES, allow_magics=True).screen(code) is None
+    assert CodeScreener(MODULES, DATA_FILES).screen(code).exc_type == "SyntaxError"
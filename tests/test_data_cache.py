@@ -0,0 +1,100 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import stat
+import time
+from unittest import mock
+
+import pytest
+
+from dojo.core.interpreters import data_cache
+from dojo.core.interpreters.data_cache import COMPLETED_MARKER, DataCache, link_data_tree
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = tmp_path / "source"
+    (source / "images").mkdir(parents=True)
+    (source / "train.csv").write_text("a,b\n1,2\n")
+    (source / "images" / "0.png").write_bytes(b"\x89PNG")
+    return source
+
+
+def test_stage_copies_read_only(tmp_path, source):
+    cache = DataCache(tmp_path / "cache")
+    lease = cache.stage(source)
+    assert (lease.path / COMPLETED_MARKER).exists()
+    assert (lease.path / "train.csv").read_text() == "a,b\n1,2\n"
+    assert (lease.path / "images" / "0.png").read_bytes() == b"\x89PNG"
+    assert not (lease.path / "train.csv").stat().st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+    lease.release()
+
+
+def test_reuse_without_fingerprinting(tmp_path, source):
+    cache = DataCache(tmp_path / "cache")
+    first = cache.stage(source)
+    first.release()
+    # a hit only looks at the top-level entries of the source
+    with mock.patch.object(data_cache, "directory_fingerprint", side_effect=AssertionError("full walk")):
+        second = cache.stage(source)
+    assert second.path == first.path
+    second.release()
+
+
+def test_touched_source_reuses_unchanged_data(tmp_path, source):
+    cache = DataCache(tmp_path / "cache")
+    first = cache.stage(source)
+    first.release()
+    # a new top-level mtime without changing any file: fingerprinted again, same entry
+    time.sleep(0.01)
+    os.utime(source / "images")
+    second = cache.stage(source)
+    assert second.path == first.path
+    second.release()
+
+
+def test_changed_source_is_staged_again(tmp_path, source):
+    cache = DataCache(tmp_path / "cache")
+    first = cache.stage(source)
+    first.release()
+    time.sleep(0.01)
+    (source / "train.csv").write_text("a,b\n1,2\n3,4\n")
+    second = cache.stage(source)
+    assert second.path != first.path
+    assert (second.path / "train.csv").read_text() == "a,b\n1,2\n3,4\n"
+    second.release()
+
+
+def test_eviction_skips_entries_in_use(tmp_path):
+    cache = DataCache(tmp_path / "cache", max_size_mb=1)
+    sources = []
+    for i in range(3):
+        source = tmp_path / f"source{i}"
+        source.mkdir()
+        (source / "data.bin").write_bytes(b"x" * 600 * 1024)
+        sources.append(source)
+
+    in_use = cache.stage(sources[0])
+    released = cache.stage(sources[1])
+    released.release()
+    latest = cache.stage(sources[2])
+    # the least recently used entry is in use: the next one is evicted instead
+    assert (in_use.path / COMPLETED_MARKER).exists()
+    assert not released.path.exists()
+    assert (latest.path / COMPLETED_MARKER).exists()
+    in_use.release()
+    latest.release()
+
+
+def test_link_data_tree(tmp_path, source):
+    lease = DataCache(tmp_path / "cache").stage(source)
+    destination = tmp_path / "working_dir" / "data"
+    link_data_tree(lease.path, destination)
+    assert not (destination / COMPLETED_MARKER).exists()
+    assert (destination / "images" / "0.png").read_bytes() == b"\x89PNG"
+    assert os.path.samefile(destination / "train.csv", lease.path / "train.csv")
+    lease.release()
@@ -0,0 +1,106 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+from unittest import mock
+
+import pytest
+
+from dojo.core.solvers.utils import data_preview
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    rows = "\n".join(f"{i},{i % 3},label_{i % 2}" for i in range(50))
+    (data_dir / "train.csv").write_text(f"id,fold,label\n{rows}\n")
+    (data_dir / "meta.json").write_text(json.dumps({"classes": ["a", "b"], "version": 1}))
+    (data_dir / "notes.txt").write_text("read me\n")
+    (data_dir / ".hidden.csv").write_text("x\n1\n")
+    return data_dir
+
+
+def test_count_lines(tmp_path):
+    path = tmp_path / "f.txt"
+    path.write_bytes(b"")
+    assert data_preview.count_lines(path) == (0, True)
+    path.write_bytes(b"a\nb\nc")
+    assert data_preview.count_lines(path) == (3, True)
+    path.write_bytes(b"a\nb\n")
+    assert data_preview.count_lines(path) == (2, True)
+
+
+def test_count_lines_estimate(tmp_path, monkeypatch):
+    path = tmp_path / "f.csv"
+    path.write_bytes(b"0123456789\n" * 100_000)
+    monkeypatch.setattr(data_preview, "EXACT_SCAN_MAX_BYTES", 1024)
+    count, exact = data_preview.count_lines(path)
+    assert not exact
+    assert count == pytest.approx(100_000, rel=0.01)
+
+
+def test_sample_lines(tmp_path):
+    path = tmp_path / "f.csv"
+    path.write_text("header\n" + "".join(f"{i}\n" for i in range(100)))
+    lines, complete = data_preview.sample_lines(path, 10, skip_first=True)
+    assert len(lines) == 10 and not complete
+    assert b"header\n" not in lines
+    assert data_preview.sample_lines(path, 10, skip_first=True) == (lines, complete)
+
+    lines, complete = data_preview.sample_lines(path, 1000, skip_first=True)
+    assert len(lines) == 100 and complete
+
+
+def test_preview_csv(data_dir):
+    preview = data_preview.preview_csv(data_dir / "train.csv", "train.csv", simple=False)
+    assert "train.csv has 50 rows and 3 columns" in preview
+    assert "fold (int64) has 3 unique values" in preview
+
+
+def test_preview_sampled_csv(data_dir, monkeypatch):
+    monkeypatch.setattr(data_preview, "SAMPLE_ROWS", 10)
+    preview = data_preview.preview_csv(data_dir / "train.csv", "train.csv", simple=False)
+    assert "train.csv has 50 rows" in preview
+    assert "from a random sample of 10 rows" in preview
+
+
+def test_preview_jsonl(tmp_path):
+    path = tmp_path / "f.jsonl"
+    path.write_text("".join(json.dumps({"id": i, "text": "x"}) + "\n" for i in range(5)))
+    preview = data_preview.preview_json(path, "f.jsonl")
+    assert '"id"' in preview and '"text"' in preview
+
+
+def test_generate(data_dir, tmp_path):
+    preview = data_preview.generate(data_dir, cache_dir=tmp_path / "cache")
+    assert "train.csv (51 lines)" in preview
+    assert "meta.json has auto-generated json schema" in preview
+    assert "notes.txt has content" in preview
+    assert ".hidden.csv" not in preview
+
+
+def test_generate_fits_the_budget(data_dir):
+    preview = data_preview.generate(data_dir, use_cache=False, char_budget=200)
+    assert len(preview) <= 200 + len("\n... (truncated)")
+
+
+def test_generate_is_cached(data_dir, tmp_path):
+    cache_dir = tmp_path / "cache"
+    preview = data_preview.generate(data_dir, cache_dir=cache_dir)
+    with mock.patch.object(data_preview, "_preview_files", side_effect=AssertionError("not cached")):
+        assert data_preview.generate(data_dir, cache_dir=cache_dir) == preview
+
+    # changing the data invalidates the cached preview
+    (data_dir / "notes.txt").write_text("read me first\n")
+    assert "read me first" in data_preview.generate(data_dir, cache_dir=cache_dir)
+
+
+def test_fingerprint(data_dir):
+    fingerprint = data_preview.fingerprint(data_dir)
+    assert data_preview.fingerprint(data_dir) == fingerprint
+    (data_dir / "extra.csv").write_text("a\n")
+    assert data_preview.fingerprint(data_dir) != fingerprint
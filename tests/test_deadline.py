@@ -0,0 +1,51 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import math
+
+import pytest
+
+from dojo.utils.deadline import Deadline, DeadlineExceeded, current_deadline
+
+
+def test_no_deadline():
+    deadline = Deadline(None)
+    assert math.isinf(deadline.remaining())
+    assert not deadline.expired()
+    assert deadline.clip(None) is None
+    assert deadline.clip(30) == 30
+    deadline.check()
+
+
+def test_clip_to_remaining_time():
+    deadline = Deadline(10)
+    assert deadline.clip(5) == 5
+    assert 9 < deadline.clip(60) <= 10
+    assert 9 < deadline.clip(None) <= 10
+
+
+def test_expired():
+    deadline = Deadline(-1)
+    assert deadline.expired()
+    assert deadline.remaining() == 0
+    assert deadline.clip(60) == 0
+    with pytest.raises(DeadlineExceeded, match="not starting the analysis"):
+        deadline.check("analysis")
+
+
+def test_deadline_exceeded_is_a_timeout():
+    assert issubclass(DeadlineExceeded, TimeoutError)
+
+
+def test_activate():
+    outer, inner = Deadline(10), Deadline(5)
+    assert current_deadline() is None
+    with outer.activate():
+        assert current_deadline() is outer
+        with inner.activate():
+            assert current_deadline() is inner
+        assert current_deadline() is outer
+    assert current_deadline() is None
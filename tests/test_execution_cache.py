@@ -0,0 +1,116 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+
+import pytest
+
+from dojo.core.interpreters.base import PROCESS_DIED, ExecutionResult
+from dojo.core.interpreters.resource_limits import MEMORY_LIMIT_EXCEEDED
+from dojo.core.tasks.execution_cache import ExecutionCache, execution_context
+
+
+def result(**kwargs):
+    return ExecutionResult(term_out=["ok\n"], exec_time=1.5, exit_code=0, **kwargs)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExecutionCache(tmp_path / "cache", max_size_mb=1, context="ctx")
+
+
+def test_keys(tmp_path, cache):
+    assert cache.key("print(1)") == cache.key("print(1)")
+    assert cache.key("print(1)") != cache.key("print(2)")
+    other = ExecutionCache(tmp_path / "cache", context="other")
+    assert cache.key("print(1)") != other.key("print(1)")
+
+
+def test_put_and_get(tmp_path, cache):
+    submission = tmp_path / "submission.csv"
+    submission.write_text("id,target\n1,0\n")
+    key = cache.key("print(1)")
+    assert cache.get(key) is None
+
+    cache.put(key, result(), submission)
+    cached = cache.get(key)
+    assert cached.exec_output == result()
+    assert cached.submission_path.read_text() == submission.read_text()
+    assert cached.grading is None
+
+    cache.put_grading(key, {"valid_solution": True})
+    assert cache.get(key).grading == {"valid_solution": True}
+
+
+def test_put_grading_of_missing_entry(cache):
+    cache.put_grading(cache.key("print(1)"), {"valid_solution": True})
+    assert cache.get(cache.key("print(1)")) is None
+
+
+def test_unreadable_entry_is_dropped(cache):
+    key = cache.key("print(1)")
+    cache.put(key, result())
+    (cache._path(key) / "execution.json").write_text("{not json")
+    assert cache.get(key) is None
+    assert not cache._path(key).exists()
+
+
+def test_lru_eviction(tmp_path, cache):
+    submission = tmp_path / "submission.csv"
+    submission.write_bytes(b"x" * 400 * 1024)
+    keys = [cache.key(f"print({i})") for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.put(key, result(), submission)
+        os.utime(cache._path(key), (i, i))
+    # reading the oldest entry makes it the most recently used one
+    assert cache.get(keys[0]) is not None
+
+    cache.put(keys[2], result(), submission)
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+    assert cache.size_bytes() <= cache.max_size_bytes
+
+
+def test_clear(cache):
+    key = cache.key("print(1)")
+    cache.put(key, result())
+    cache.clear()
+    assert cache.get(key) is None
+
+
+def test_execution_context(tmp_path):
+    class Interpreter:
+        superimage_version = "1.0"
+        timeout = 60
+        memory_limit_mb = None
+
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "train.csv").write_text("a\n1\n")
+    context = execution_context(Interpreter(), data, "hash")
+    assert context == execution_context(Interpreter(), data, "hash")
+    assert context != execution_context(Interpreter(), data, "other")
+
+    (data / "train.csv").write_text("a\n1\n2\n")
+    assert context != execution_context(Interpreter(), data, "hash")
+
+
+@pytest.mark.parametrize(
+    "execution, ended_by_environment",
+    [
+        (result(), False),
+        (ExecutionResult(term_out=[], exec_time=1, exit_code=1, exc_type="ValueError"), False),
+        (ExecutionResult(term_out=[], exec_time=1, exit_code=1, exc_type="TimeoutError"), False),
+        (ExecutionResult(term_out=[], exec_time=1, exit_code=1, exc_type="TimeoutError", timed_out=True), True),
+        (ExecutionResult(term_out=[], exec_time=1, exit_code=1, exc_type=MEMORY_LIMIT_EXCEEDED), True),
+        (ExecutionResult(term_out=[], exec_time=1, exit_code=1, exc_type=PROCESS_DIED), True),
+        (ExecutionResult(term_out=[], exec_time=1, exit_code=-9), True),
+    ],
+)
+def test_ended_by_environment(execution, ended_by_environment):
+    # only the executions that ended with the code are stored in the cache
+    assert execution.ended_by_environment() == ended_by_environment
@@ -0,0 +1,84 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import contextlib
+import io
+import json
+
+import numpy as np
+import pytest
+
+sciduc = pytest.importorskip("dojo.tasks.sciduc.task")
+
+# boxes of every area range (small < 32^2 < medium < 96^2 < large)
+GT_BOXES = [[10, 10, 20, 20], [100, 100, 50, 50], [200, 200, 120, 120], [400, 10, 60, 40]]
+
+
+@pytest.fixture
+def ground_truth(tmp_path):
+    annotations = {
+        "images": [{"id": 1, "width": 640, "height": 640}, {"id": 2, "width": 640, "height": 640}],
+        "categories": [{"id": 1, "name": "cell"}, {"id": 2, "name": "nucleus"}],
+        "annotations": [
+            {"id": i + 1, "image_id": 1 + i % 2, "category_id": 1 + i % 2, "bbox": box, "area": box[2] * box[3],
+             "iscrowd": 0}
+            for i, box in enumerate(GT_BOXES)
+        ],
+    }
+    path = tmp_path / "answers.json"
+    path.write_text(json.dumps(annotations))
+    return sciduc.load_ground_truth(path)
+
+
+@pytest.fixture
+def submission(tmp_path):
+    rng = np.random.default_rng(0)
+    predictions = []
+    for i, box in enumerate(GT_BOXES):
+        # shifted boxes, matching at some IoU thresholds only, and a false positive per image
+        shift = 2 * i
+        predictions.append(
+            {"image_id": 1 + i % 2, "category_id": 1 + i % 2, "bbox": [box[0] + shift, box[1], box[2], box[3]],
+             "score": float(rng.uniform(0.5, 1))}
+        )
+    for image_id in (1, 2):
+        predictions.append({"image_id": image_id, "category_id": 1, "bbox": [500, 500, 30, 30], "score": 0.3})
+    path = tmp_path / "results.json"
+    path.write_text(json.dumps(predictions))
+    return path
+
+
+def evaluate(ground_truth, submission, iou_thresholds=None):
+    # the same COCO implementation as the task, which prefers faster_coco_eval when it is installed
+    with contextlib.redirect_stdout(io.StringIO()):
+        evaluator = sciduc.COCOeval(ground_truth, ground_truth.loadRes(str(submission)), iouType="bbox")
+        if iou_thresholds is not None:
+            evaluator.params.iouThrs = np.asarray(iou_thresholds, dtype=float)
+        evaluator.evaluate()
+        evaluator.accumulate()
+    return evaluator
+
+
+def test_summarize_matches_coco(ground_truth, submission):
+    evaluator = evaluate(ground_truth, submission)
+    metrics = sciduc.summarize(evaluator)
+    with contextlib.redirect_stdout(io.StringIO()):
+        evaluator.summarize()
+    assert list(metrics) == [label for label, *_ in sciduc.COCO_STATS]
+    assert list(metrics.values()) == pytest.approx(evaluator.stats.tolist())
+
+
+def test_summarize_subset_of_thresholds(ground_truth, submission):
+    full = sciduc.summarize(evaluate(ground_truth, submission))
+    metrics = sciduc.summarize(evaluate(ground_truth, submission, iou_thresholds=[0.5]))
+    # the stats over .5:.95 need all ten thresholds
+    assert list(metrics) == ["AP@0.5"]
+    assert metrics["AP@0.5"] == pytest.approx(full["AP@0.5"])
+
+
+def test_grade(ground_truth, submission):
+    assert sciduc.grade(submission, ground_truth) == pytest.approx(sciduc.summarize(evaluate(ground_truth, submission)))
+    assert sciduc.grade(submission, ground_truth, iou_thresholds=[0.75, 0.5]).keys() == {"AP@0.5", "AP@0.75"}
@@ -0,0 +1,84 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+
+import pytest
+
+from dojo.core.interpreters.workspace import WorkspaceManager
+
+
+@pytest.fixture
+def base_dir(tmp_path):
+    base_dir = tmp_path / "working_dir"
+    (base_dir / "data").mkdir(parents=True)
+    (base_dir / "data" / "train.csv").write_text("a\n1\n")
+    (base_dir / "submission.csv").write_text("id\n")
+    (base_dir / "utils.py").write_text("X = 1\n")
+    return base_dir
+
+
+@pytest.mark.parametrize("strategy", ["copy", "hardlink", "auto"])
+def test_workspaces_inherit_from_their_parent(tmp_path, base_dir, strategy):
+    workspaces = WorkspaceManager(base_dir, tmp_path / "workspaces", strategy=strategy, shared=("data",))
+    root = workspaces.create("a", exclude=["submission.csv"])
+    assert (root / "utils.py").read_text() == "X = 1\n"
+    assert not (root / "submission.csv").exists()
+    (root / "model.pt").write_text("weights")
+
+    child = workspaces.create("b", parent_node_id="a")
+    assert (child / "model.pt").read_text() == "weights"
+    unrelated = workspaces.create("c")
+    assert not (unrelated / "model.pt").exists()
+
+
+@pytest.mark.parametrize("strategy", ["copy", "hardlink", "auto"])
+def test_shared_data_is_linked(tmp_path, base_dir, strategy):
+    workspaces = WorkspaceManager(base_dir, tmp_path / "workspaces", strategy=strategy, shared=("data",))
+    workspace = workspaces.create("a")
+    child = workspaces.create("b", parent_node_id="a")
+    for path in (workspace, child):
+        assert (path / "data").is_symlink()
+        assert os.readlink(path / "data") == str(base_dir / "data")
+        assert (path / "data" / "train.csv").read_text() == "a\n1\n"
+
+
+def test_existing_workspace_is_reused(tmp_path, base_dir):
+    workspaces = WorkspaceManager(base_dir, tmp_path / "workspaces", strategy="copy")
+    workspace = workspaces.create("a")
+    (workspace / "model.pt").write_text("weights")
+    assert workspaces.create("a") == workspace
+    assert (workspace / "model.pt").exists()
+
+
+def test_unknown_strategy(tmp_path, base_dir):
+    with pytest.raises(ValueError, match="Unknown snapshot strategy"):
+        WorkspaceManager(base_dir, tmp_path / "workspaces", strategy="overlay")
+
+
+def test_lru_eviction_keeps_the_parent(tmp_path, base_dir):
+    workspaces = WorkspaceManager(
+        base_dir, tmp_path / "workspaces", strategy="copy", max_size_mb=1, shared=("data",)
+    )
+    for i, node_id in enumerate(["a", "b"]):
+        workspace = workspaces.create(node_id)
+        (workspace / "model.pt").write_bytes(b"x" * 600 * 1024)
+        os.utime(workspace, (i, i))
+
+    # seeded from the least recently used workspace, which must survive the eviction
+    workspaces.create("c", parent_node_id="a")
+    assert workspaces.exists("a")
+    assert not workspaces.exists("b")
+    assert (workspaces.path("c") / "model.pt").exists()
+
+
+def test_children_of_evicted_workspaces_start_from_the_base_dir(tmp_path, base_dir):
+    workspaces = WorkspaceManager(base_dir, tmp_path / "workspaces", strategy="copy")
+    (workspaces.create("a") / "model.pt").write_text("weights")
+    workspaces.remove("a")
+    child = workspaces.create("b", parent_node_id="a")
+    assert (child / "utils.py").exists()
+    assert not (child / "model.pt").exists()